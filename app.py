@@ -1,15 +1,18 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from haversine import haversine, Unit
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
-import folium
-from streamlit_folium import st_folium
-import time
-from datetime import date, timedelta
-import requests
+from datetime import date, time
 import io
+from resolvedor import NUM_PROCESSOS_PADRAO, CacheResultados
+from decomposicao import MIN_SERVICOS_DECOMPOSICAO, EQUIPES_POR_SUBPROBLEMA
+from prazos_ans import INICIO_JORNADA_PADRAO
+from planejamento_dias import planejar_dias, MAX_DIAS_PLANEJAMENTO
+from mapa_rotas import gerar_mapa_de_rotas, html_do_mapa
+from google_directions import CacheDirections
+from execucao_em_segundo_plano import ExecucaoEmSegundoPlano
+from instrumentacao import Instrumentacao, ETAPAS_GRUPO
+from provedores_distancia import URL_OSRM_PADRAO, ARQUIVO_TABELA_DISTANCIAS
+import motor_roteirizacao as motor
+from motor_roteirizacao import FATOR_CUSTO_DISTANCIA, MINUTOS_POR_KM, ID_RETORNO_DEPOSITO
 
 # ==============================================================================
 # CONFIGURAÇÕES GLOBAIS
@@ -18,9 +21,7 @@ try:
     CHAVE_API_GOOGLE = st.secrets["GOOGLE_API_KEY"]
 except (KeyError, FileNotFoundError):
     CHAVE_API_GOOGLE = ""
-
-FATOR_CUSTO_DISTANCIA = 50
-MINUTOS_POR_KM = 3
+INTERVALO_ATUALIZACAO_S = 1.0  # Atualização do resultado parcial enquanto a roteirização roda
 
 # ==============================================================================
 # FUNÇÃO DE LOGIN
@@ -58,16 +59,10 @@ def check_password():
 # ==============================================================================
 
 @st.cache_data
-def carregar_dados_config():
-    """Carrega todos os arquivos de configuração estáticos."""
+def carregar_dados_config(assinatura_config):
+    """Carrega todos os arquivos de configuração estáticos (relidos quando a assinatura muda)."""
     try:
-        df_polos = pd.read_csv("polos.csv", encoding='utf-8', sep=';')
-        colunas_equipes = ['Centro Operativo', 'Quantidade_equipes_Leves', 'Capacidade_maxima_Leves', 'Quantidades_equipes_Cesto', 'Capacidade_maxima_Cesto']
-        df_equipes = pd.read_csv("equipes.csv", encoding='utf-8', sep=';', header=None, names=colunas_equipes, skiprows=1, on_bad_lines='skip')
-        df_feriados = pd.read_excel("feriados.xlsx")
-        df_tempos = pd.read_csv("Tempos.csv", encoding='utf-8', sep=';')
-        df_fator_k = pd.read_csv("fator_k.csv", encoding='utf-8', sep=';')
-        return df_polos, df_equipes, df_feriados, df_tempos, df_fator_k
+        return motor.carregar_dados_config()
     except FileNotFoundError as e:
         st.error(f"ERRO CRÍTICO: Arquivo de configuração não encontrado: {e.filename}. Verifique se todos os arquivos de base estão no repositório do GitHub.")
         return None, None, None, None, None
@@ -75,327 +70,143 @@ def carregar_dados_config():
         st.error(f"ERRO ao carregar os dados de configuração: {e}")
         return None, None, None, None, None
 
-def carregar_dados_servicos(uploaded_file):
-    """Carrega o arquivo de serviços enviado pelo usuário."""
-    if uploaded_file is None:
-        return None
-    try:
-        colunas_servicos = ['CODIGO_EXTERNO', 'TDC', 'FECHA_CREACION_ORDEN_SIS_EXT', 'FECHA_CREACION_TDC_EORDER', 'ESTADO', 'CODIGO_PROCESO', 'DESCRIPCION_PROCESO', 'CODIGO_ORDEN', 'DESCRIPCION_ORDEN', 'CICLO', 'FECHA_ACTUALIZACION', 'ETL_TIME', 'CODIGO_CENTRO_OPERATIVO', 'CENTRO_OPERATIVO_TDC', 'LONGITUD', 'LATITUD', 'CODIGO_CLIENTE', 'LOCALIDAD', 'CALLE', 'NUMERO_CALLE', 'MUNICIPIO', 'BARRIO', 'CODIGO_ZIP', 'COMPLEMENTO', 'MOTIVO_INSPECION', 'CODE_NOTA', 'DESCRIPCION_CODE_NOTA', 'MEDIDA', 'DESCIPCION_MEDIDA', 'TEXTO_DIRECCION_COMPLETA', 'ALOC_RECURSOS', 'RESIDUAL', 'TDC_FIM', 'ANS_LEGAL', 'ANS_LEGAL_CALCULADO', 'CODIGO_EXTERNO_SAP_CONCAT', 'TIPO_REMESSA', 'NUMERO_PROTOCOLO', 'valor_factura_sum', 'TIPO_CORTE', 'Trâmite_Solicitado', 'Executor_Solicitado', 'Polo', 'Centro Operativo', 'UT', 'tipo_servico']
-        df_servicos_raw = pd.read_csv(uploaded_file, encoding='utf-8', sep=';', header=None, names=colunas_servicos, skiprows=1, low_memory=False, on_bad_lines='skip')
-        return df_servicos_raw
-    except Exception as e:
-        st.error(f"ERRO ao ler o arquivo 'servicos.csv' enviado. Verifique o formato e o separador (deve ser ';'). Detalhe: {e}")
-        return None
-
-@st.cache_data
-def preparar_dados(df_polos, df_equipes, df_servicos_raw, df_feriados, df_tempos, df_fator_k):
-    """Prepara e padroniza os dataframes para a roteirização."""
-    try:
-        df_polos.columns = [str(col).strip() for col in df_polos.columns]
-        df_fator_k.columns = [str(col).strip() for col in df_fator_k.columns]
-        df_fator_k.rename(columns={'Fator K Estimado': 'Fator_K_Estimado'}, inplace=True)
-
-        df_tempos_execucao = df_tempos[['Equipe', 'Serviço', 'Mix_solic', 'Tempo Execução']].copy().dropna()
-        df_tempos_execucao['Tempo_Execucao_Min'] = pd.to_timedelta(df_tempos_execucao['Tempo Execução']).dt.total_seconds() / 60
-        tempo_total_str = df_tempos.loc[0, 'Total']
-        tempo_total_timedelta = pd.to_timedelta(tempo_total_str + ':00' if len(tempo_total_str) <= 5 else tempo_total_str)
-        JORNADA_TRABALHO_MIN = tempo_total_timedelta.total_seconds() / 60
-        SERVICOS_EXTRAS_IMPRODUTIVIDADE = float(str(df_tempos.loc[0, 'Improdutividade_serviços_extras']).replace(',', '.'))
-
-        df_fator_k['Centro Operativo'] = df_fator_k['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_fator_k['Fator_K_Estimado'] = pd.to_numeric(df_fator_k['Fator_K_Estimado'].astype(str).str.replace(',', '.'), errors='coerce')
-
-        df_polos['Centro Operativo'] = df_polos['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_polos = pd.merge(df_polos, df_fator_k[['Centro Operativo', 'Fator_K_Estimado']], on='Centro Operativo', how='left')
-        
-        polos_sem_k = df_polos[df_polos['Fator_K_Estimado'].isnull()]
-        if not polos_sem_k.empty:
-            st.warning(f"AVISO: Os polos {polos_sem_k['Centro Operativo'].tolist()} não foram encontrados em 'fator_k.csv' e usarão um Fator K padrão de 1.4.")
-            df_polos['Fator_K_Estimado'] = df_polos['Fator_K_Estimado'].fillna(1.4)
-
-        colunas_necessarias = {'TDC': 'ID_Servico', 'Centro Operativo': 'Polo', 'LATITUD': 'Latitude', 'LONGITUD': 'Longitude', 'valor_factura_sum': 'Valor_Divida', 'tipo_servico': 'Tipo_Servico', 'MUNICIPIO': 'Municipio', 'Executor_Solicitado': 'Tipo_Equipe_Requerida', 'Trâmite_Solicitado': 'Mix_Solic'}
-        df_servicos = df_servicos_raw[list(colunas_necessarias.keys())].rename(columns=colunas_necessarias)
-
-        for col in ['Polo', 'Municipio', 'Tipo_Servico', 'Tipo_Equipe_Requerida', 'Mix_Solic']:
-            df_servicos[col] = df_servicos[col].astype(str).str.strip().str.upper()
-        for col_tempo in ['Equipe', 'Serviço', 'Mix_solic']:
-            df_tempos_execucao[col_tempo] = df_tempos_execucao[col_tempo].astype(str).str.strip().str.upper()
-        
-        df_servicos = df_servicos[df_servicos['Polo'] != 'NAN'].copy()
-
-        df_servicos = pd.merge(df_servicos, df_tempos_execucao[['Equipe', 'Serviço', 'Mix_solic', 'Tempo_Execucao_Min']], left_on=['Tipo_Equipe_Requerida', 'Tipo_Servico', 'Mix_Solic'], right_on=['Equipe', 'Serviço', 'Mix_solic'], how='left')
-
-        servicos_sem_tempo = df_servicos[df_servicos['Tempo_Execucao_Min'].isnull()]
-        if not servicos_sem_tempo.empty:
-            st.warning(f"AVISO: {len(servicos_sem_tempo)} serviços não encontraram tempo de execução em Tempos.csv e foram removidos da roteirização.")
-            df_servicos.dropna(subset=['Tempo_Execucao_Min'], inplace=True)
-        
-        df_equipes['Centro Operativo'] = df_equipes['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_feriados.columns = [str(col).strip() for col in df_feriados.columns]
-        df_feriados['Municipio'] = df_feriados['Municipio'].astype(str).str.strip().str.upper()
-        df_feriados['FECHA'] = pd.to_datetime(df_feriados['FECHA'], errors='coerce')
-        df_servicos.dropna(subset=['Polo', 'Municipio', 'Latitude', 'Longitude'], inplace=True)
-
-        df_polos['latitude'] = pd.to_numeric(df_polos['latitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_polos['longitude'] = pd.to_numeric(df_polos['longitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Latitude'] = pd.to_numeric(df_servicos['Latitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Longitude'] = pd.to_numeric(df_servicos['Longitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Valor_Divida'] = pd.to_numeric(df_servicos['Valor_Divida'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-        
-        df_polos_completo = pd.merge(df_polos, df_equipes, on="Centro Operativo")
-
-        return df_servicos, df_polos_completo, df_feriados, JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE
-    except Exception as e:
-        st.error(f"ERRO ao preparar os dados: {e}")
-        return None, None, None, None, None
-
-def verificar_dia_restrito(data_atual, municipios_do_polo, df_feriados):
-    df_feriados.columns = [str(col).strip() for col in df_feriados.columns]
-    if data_atual.weekday() in [4, 5, 6]:
-        dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
-        return True, f"{dias_semana[data_atual.weekday()]}"
-    
-    feriados_gerais = set(df_feriados[df_feriados['COD_MUNICIPIO'] == 0]['FECHA'])
-    feriados_municipais = set(df_feriados[df_feriados['Municipio'].isin(municipios_do_polo)]['FECHA'])
-    todos_os_feriados = feriados_gerais.union(feriados_municipais)
-    datas_restritas = set()
-    for feriado in todos_os_feriados:
-        if pd.notna(feriado):
-            datas_restritas.add(feriado.date())
-            datas_restritas.add(feriado.date() - timedelta(days=1))
-    if data_atual in datas_restritas:
-        return True, "Feriado ou Véspera de Feriado"
-    return False, ""
-
-def obter_distancia_real_google(origem_coords, destino_coords, waypoints_coords, chave_api):
-    if not chave_api: return None
-    base_url = "https://maps.googleapis.com/maps/api/directions/json"
-    origin_str = f"{origem_coords[0]},{origem_coords[1]}"
-    destination_str = f"{destino_coords[0]},{destino_coords[1]}"
-    
-    waypoints_str = "|".join([f"{lat},{lon}" for lat, lon in waypoints_coords])
-    params = {"origin": origin_str, "destination": destination_str, "waypoints": f"optimize:true|{waypoints_str}", "key": chave_api}
-    
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] == 'OK': return data['routes'][0]['legs']
-        else: return None
-    except requests.exceptions.RequestException:
-        return None
-
-def executar_roteirizacao(params):
-    polos_para_processar = params["polos_para_processar"]
-    df_servicos_filtrado = params["df_servicos_filtrado"]
-    df_polos_completo = params["df_polos_completo"]
-    escolha_estrategia = params["estrategia"]
-    escolha_restricao = params["restricao"]
+@st.cache_resource
+def obter_cache_dados_preparados():
+    """Dados preparados por conteúdo do arquivo enviado, compartilhados entre as sessões do app."""
+    return motor.CacheDadosPreparados()
+
+def preparar_dados_enviados(uploaded_file, dados_config, assinatura_config):
+    """
+    Lê e prepara o arquivo de serviços enviado. O resultado fica em cache pelo hash do conteúdo
+    e pela assinatura da configuração, então as interações seguintes não releem o arquivo.
+    """
+    conteudo = uploaded_file.getvalue()
+    cache = obter_cache_dados_preparados()
+    chave = motor.chave_dados_preparados(conteudo, assinatura_config)
+    preparados = cache.obter(chave)
+    if preparados is None:
+        df_polos, df_equipes, df_feriados, df_tempos, df_fator_k = dados_config
+        leitura, avisos = [], []
+        try:
+            df_servicos_raw = motor.carregar_dados_servicos(io.BytesIO(conteudo), registrar=leitura.append)
+        except Exception as e:
+            st.error(f"ERRO ao ler o arquivo 'servicos.csv' enviado. Verifique o formato e o separador (deve ser ';'). Detalhe: {e}")
+            return None
+        try:
+            dados = motor.preparar_dados(df_polos, df_equipes, df_servicos_raw, df_feriados, df_tempos, df_fator_k, avisar=avisos.append)
+        except Exception as e:
+            st.error(f"ERRO ao preparar os dados: {e}")
+            return None
+        preparados = cache.guardar(chave, (dados, avisos, leitura))
+
+    dados, avisos, leitura = preparados
+    for aviso in avisos:
+        st.warning(aviso)
+    estatisticas = cache.estatisticas()
+    st.sidebar.caption(f"{' '.join(leitura)} Dados preparados em cache: {estatisticas['itens']} arquivo(s), {estatisticas['memoria_mb']} MB.")
+    return dados
+
+@st.cache_resource
+def obter_cache_directions(modo_offline):
+    """Cache das consultas à Directions API, compartilhado entre as sessões do app."""
+    return CacheDirections(modo_offline=modo_offline)
+
+@st.cache_resource
+def obter_cache_resultados():
+    """Rotas já calculadas por impressão digital do grupo, compartilhadas entre as sessões do app."""
+    return CacheResultados()
+
+def iniciar_roteirizacao(params):
+    """Dispara a roteirização numa thread de trabalho; a página acompanha os eventos em acompanhar_execucao()."""
     consultar_google_api = params["usar_google_api"]
-    JORNADA_TRABALHO_MIN = params["JORNADA_TRABALHO_MIN"]
-    SERVICOS_EXTRAS_IMPRODUTIVIDADE = params["SERVICOS_EXTRAS_IMPRODUTIVIDADE"]
-    
-    todas_as_rotas_df = pd.DataFrame()
-    servicos_nao_atendidos_df = pd.DataFrame()
-    dados_relatorio = []
-
-    progress_bar = st.progress(0)
-    total_polos = len(polos_para_processar)
-
-    for i, nome_polo_atual in enumerate(polos_para_processar):
-        progress_bar.progress((i) / total_polos, text=f"Processando Polo: {nome_polo_atual}...")
-        
-        polo_filtrado = df_polos_completo[df_polos_completo['Centro Operativo'] == nome_polo_atual]
-        if polo_filtrado.empty:
-            servicos_do_polo = df_servicos_filtrado[df_servicos_filtrado['Polo'] == nome_polo_atual]
-            if not servicos_do_polo.empty:
-                servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, servicos_do_polo])
-            continue
-
-        info_polo = polo_filtrado.iloc[0]
-        fator_k_polo = info_polo['Fator_K_Estimado']
-        
-        for tipo_equipe in ["LEVE", "CESTO"]:
-            if tipo_equipe == "LEVE":
-                num_equipes = int(info_polo.get('Quantidade_equipes_Leves', 0))
-                capacidade_base = int(info_polo.get('Capacidade_maxima_Leves', 0))
-            else:
-                num_equipes = int(info_polo.get('Quantidades_equipes_Cesto', 0))
-                capacidade_base = int(info_polo.get('Capacidade_maxima_Cesto', 0))
-
-            grupo_servicos = df_servicos_filtrado[(df_servicos_filtrado['Polo'] == nome_polo_atual) & (df_servicos_filtrado['Tipo_Equipe_Requerida'] == tipo_equipe)].copy()
-
-            if grupo_servicos.empty or num_equipes == 0:
-                if not grupo_servicos.empty:
-                     servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos])
-                continue
-
-            locations = [(info_polo['latitude'], info_polo['longitude'])] + list(zip(grupo_servicos['Latitude'], grupo_servicos['Longitude']))
-            manager = pywrapcp.RoutingIndexManager(len(locations), num_equipes, 0)
-            routing = pywrapcp.RoutingModel(manager)
-
-            def distance_callback(from_index, to_index):
-                from_node, to_node = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
-                distancia = int(haversine(locations[from_node], locations[to_node], unit=Unit.METERS) * fator_k_polo)
-                if escolha_estrategia == '2': return distancia * FATOR_CUSTO_DISTANCIA
-                return distancia
-
-            transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-            routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-            if escolha_restricao == '1':
-                capacidade_servicos_ajustada = int(capacidade_base + SERVICOS_EXTRAS_IMPRODUTIVIDADE)
-                routing.AddDimensionWithVehicleCapacity(routing.RegisterUnaryTransitCallback(lambda from_index: 1), 0, [capacidade_servicos_ajustada] * num_equipes, True, 'Capacity')
-            elif escolha_restricao == '2':
-                def time_callback(from_index, to_index):
-                    from_node, to_node = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
-                    dist_metros = haversine(locations[from_node], locations[to_node], unit=Unit.METERS) * fator_k_polo
-                    tempo_deslocamento = (dist_metros / 1000) * MINUTOS_POR_KM
-                    tempo_execucao = grupo_servicos.iloc[from_node - 1]['Tempo_Execucao_Min'] if from_node > 0 else 0
-                    return int(tempo_deslocamento + tempo_execucao)
-                time_callback_index = routing.RegisterTransitCallback(time_callback)
-                routing.AddDimension(time_callback_index, 0, int(JORNADA_TRABALHO_MIN), True, 'Time')
-            
-            for node_idx in range(1, len(locations)):
-                penalty = 0
-                valor_divida_atual = grupo_servicos.iloc[node_idx - 1]['Valor_Divida']
-                if escolha_estrategia == '1': penalty = 15000
-                elif escolha_estrategia == '2': penalty = int(valor_divida_atual * 100)
-                elif escolha_estrategia == '3':
-                    dist_do_polo = int(haversine(locations[0], locations[node_idx], unit=Unit.METERS) * fator_k_polo)
-                    penalty = int((valor_divida_atual * 10000) / (dist_do_polo if dist_do_polo > 0 else 1))
-                routing.AddDisjunction([manager.NodeToIndex(node_idx)], penalty if penalty > 0 else 1)
-
-            search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-            search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-            search_parameters.local_search_metaheuristic = (routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-            search_parameters.time_limit.FromSeconds(30)
-            solution = routing.SolveWithParameters(search_parameters)
-
-            if solution:
-                polo_rotas_list, servicos_atendidos_indices = [], set()
-                valor_total_polo, equipes_usadas = 0, 0
-                for vehicle_id in range(num_equipes):
-                    index = routing.Start(vehicle_id)
-                    pontos_da_rota_indices = []
-                    while not routing.IsEnd(index):
-                        node_index = manager.IndexToNode(index)
-                        if node_index > 0:
-                            pontos_da_rota_indices.append(node_index - 1)
-                            servicos_atendidos_indices.add(node_index - 1)
-                        index = solution.Value(routing.NextVar(index))
-
-                    if pontos_da_rota_indices:
-                        equipes_usadas += 1
-                        gmaps_url, legs_info = "N/A", None
-                        
-                        if consultar_google_api == '1':
-                            pontos_coords = [locations[idx + 1] for idx in pontos_da_rota_indices]
-                            depot_coords = locations[0]
-                            full_path_points = [depot_coords] + pontos_coords + [depot_coords]
-                            
-                            chunk_size = 27
-                            all_legs_info = []
-
-                            if len(full_path_points) > chunk_size:
-                                for i in range(0, len(full_path_points) - 1, chunk_size - 1):
-                                    chunk = full_path_points[i : i + chunk_size]
-                                    if len(chunk) < 2: continue
-                                    
-                                    chunk_origin, chunk_destination, chunk_waypoints = chunk[0], chunk[-1], chunk[1:-1]
-                                    chunk_legs = obter_distancia_real_google(chunk_origin, chunk_destination, chunk_waypoints, CHAVE_API_GOOGLE)
-                                    
-                                    if chunk_legs:
-                                        all_legs_info.extend(chunk_legs)
-                                    else:
-                                        all_legs_info = None; break
-                                legs_info = all_legs_info
-                            else:
-                                legs_info = obter_distancia_real_google(depot_coords, depot_coords, pontos_coords, CHAVE_API_GOOGLE)
-
-                            if legs_info:
-                                origin_url, waypoints_url = f"{depot_coords[0]},{depot_coords[1]}", "/".join([f"{lat},{lon}" for lat,lon in pontos_coords])
-                                gmaps_url = f"https://www.google.com/maps/dir/{origin_url}/{waypoints_url}/{origin_url}"
-                        
-                        ponto_anterior_loc = locations[0]
-                        for i, serv_idx in enumerate(pontos_da_rota_indices):
-                            servico_atual = grupo_servicos.iloc[serv_idx]
-                            ponto_atual_loc = locations[serv_idx + 1]
-                            dist_trecho_metros = haversine(ponto_anterior_loc, ponto_atual_loc, unit=Unit.METERS) * fator_k_polo
-                            km_trecho_estimado = dist_trecho_metros / 1000
-                            tempo_deslocamento_estimado = km_trecho_estimado * MINUTOS_POR_KM
-                            km_trecho_google, tempo_trecho_google = "N/A", "N/A"
-                            if legs_info and i < len(legs_info):
-                                leg = legs_info[i]
-                                km_trecho_google, tempo_trecho_google = round(leg['distance']['value'] / 1000, 2), round(leg['duration']['value'] / 60, 2)
-                            
-                            polo_rotas_list.append({'Polo': nome_polo_atual, 'Equipe': f"Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}", 'Tipo_Equipe': tipo_equipe.capitalize(), 'Ordem_Visita': i + 1, 'ID_Servico': servico_atual['ID_Servico'], 'Valor_Divida': servico_atual['Valor_Divida'], 'Tempo_Execucao_Min': servico_atual['Tempo_Execucao_Min'], 'KM_Trecho_Estimado': round(km_trecho_estimado, 2), 'Tempo_Trecho_Estimado_Min': round(tempo_deslocamento_estimado, 2), 'KM_Trecho_Google': km_trecho_google, 'Tempo_Trecho_Google_Min': tempo_trecho_google, 'Link_Google_Maps': gmaps_url})
-                            ponto_anterior_loc = ponto_atual_loc
-                        
-                        dist_retorno_metros = haversine(ponto_anterior_loc, locations[0], unit=Unit.METERS) * fator_k_polo
-                        km_retorno_estimado, tempo_retorno_estimado = dist_retorno_metros / 1000, (dist_retorno_metros / 1000) * MINUTOS_POR_KM
-                        km_retorno_google, tempo_retorno_google = "N/A", "N/A"
-                        if legs_info and len(legs_info) == len(pontos_da_rota_indices) + 1:
-                            leg = legs_info[-1]
-                            km_retorno_google, tempo_retorno_google = round(leg['distance']['value'] / 1000, 2), round(leg['duration']['value'] / 60, 2)
-                        polo_rotas_list.append({'Polo': nome_polo_atual, 'Equipe': f"Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}", 'Tipo_Equipe': tipo_equipe.capitalize(), 'Ordem_Visita': len(pontos_da_rota_indices) + 1, 'ID_Servico': 'RETORNO_AO_DEPOSITO', 'Valor_Divida': 0, 'Tempo_Execucao_Min': 0, 'KM_Trecho_Estimado': round(km_retorno_estimado, 2), 'Tempo_Trecho_Estimado_Min': round(tempo_retorno_estimado, 2), 'KM_Trecho_Google': km_retorno_google, 'Tempo_Trecho_Google_Min': tempo_retorno_google, 'Link_Google_Maps': gmaps_url})
-                
-                if polo_rotas_list: todas_as_rotas_df = pd.concat([todas_as_rotas_df, pd.DataFrame(polo_rotas_list)])
-                nao_atendidos_indices = set(range(len(grupo_servicos))) - servicos_atendidos_indices
-                if nao_atendidos_indices: servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos.iloc[list(nao_atendidos_indices)]])
-                dados_relatorio.append({'Polo': f"{nome_polo_atual} - {tipo_equipe}", 'Data': time.strftime("%Y-%m-%d"), 'Total_Servicos_Disponiveis': len(grupo_servicos), 'Servicos_Roteirizados': len(servicos_atendidos_indices), 'Servicos_Nao_Roteirizados': len(nao_atendidos_indices), 'Aproveitamento_%': f"{(len(servicos_atendidos_indices) / len(grupo_servicos) * 100):.2f}" if len(grupo_servicos) > 0 else "0.00", 'Valor_Total_Roteirizado_R$': grupo_servicos.iloc[list(servicos_atendidos_indices)]['Valor_Divida'].sum()})
-            else:
-                if not grupo_servicos.empty: servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos])
-
-    progress_bar.progress(1.0, text="Processo concluído!")
-    
-    resumo_equipes_df = pd.DataFrame()
-    if not todas_as_rotas_df.empty:
-        df_resumo = todas_as_rotas_df.groupby('Equipe').agg(
-            Quantidade_servicos_alocados=('ID_Servico', lambda x: (x != 'RETORNO_AO_DEPOSITO').sum()),
-            Valor_Total_Divida=('Valor_Divida', 'sum'),
-            KM_percorridos=('KM_Trecho_Estimado', 'sum'),
-            Tempo_total_deslocamento=('Tempo_Trecho_Estimado_Min', 'sum'),
-            Tempo_total_servicos=('Tempo_Execucao_Min', 'sum')
-        ).reset_index()
-        df_resumo.rename(columns={'Valor_Total_Divida': 'Valor_Total_Divida_R$'}, inplace=True)
-        df_resumo['Tempo_total_rota'] = df_resumo['Tempo_total_deslocamento'] + df_resumo['Tempo_total_servicos']
-        resumo_equipes_df = df_resumo
-    
-    return todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, pd.DataFrame(dados_relatorio)
+    cache_directions = obter_cache_directions(consultar_google_api == '3') if consultar_google_api in ['1', '3'] else None
+    parametros = {'estrategia': params["estrategia"], 'restricao': params["restricao"], 'JORNADA_TRABALHO_MIN': params["JORNADA_TRABALHO_MIN"], 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': params["SERVICOS_EXTRAS_IMPRODUTIVIDADE"], 'MINUTOS_POR_KM': MINUTOS_POR_KM, 'FATOR_CUSTO_DISTANCIA': FATOR_CUSTO_DISTANCIA, 'num_processos': params.get("num_processos", 1), 'provedor_distancia': params.get("provedor_distancia"), 'decomposicao': params.get("decomposicao"), 'data_despacho': params.get("data_despacho"), 'INICIO_JORNADA': params.get("inicio_jornada")}
 
-def gerar_mapa_de_rotas(df_rotas, df_polos_info, polos_processados):
-    if df_rotas.empty: return None
-    polos_filtrados = df_polos_info[df_polos_info['Centro Operativo'].isin(polos_processados)]
-    if polos_filtrados.empty: return None
-    
-    mapa = folium.Map(location=[polos_filtrados['latitude'].mean(), polos_filtrados['longitude'].mean()], zoom_start=10)
-    cores = ['blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue', 'red', 'lightblue', 'lightgreen', 'gray', 'pink', 'lightgray']
-    mapa_cores_equipe = {equipe: cores[i % len(cores)] for i, equipe in enumerate(df_rotas['Equipe'].unique())}
-    
-    for _, polo in polos_filtrados.iterrows():
-        folium.Marker(location=[polo['latitude'], polo['longitude']], popup=f"<strong>Polo: {polo['Centro Operativo']}</strong>", icon=folium.Icon(color='black', icon='industry', prefix='fa')).add_to(mapa)
-    
-    for equipe_unica in df_rotas['Equipe'].unique():
-        rota_da_equipe = df_rotas[df_rotas['Equipe'] == equipe_unica].sort_values(by='Ordem_Visita')
-        if rota_da_equipe.empty: continue
-        
-        polo_da_rota = rota_da_equipe['Polo'].iloc[0]
-        info_polo = df_polos_info[df_polos_info['Centro Operativo'] == polo_da_rota].iloc[0]
-        polo_coords = (info_polo['latitude'], info_polo['longitude'])
-        
-        rota_com_coords = pd.merge(rota_da_equipe, st.session_state.df_servicos[['ID_Servico', 'Latitude', 'Longitude']], on='ID_Servico', how='left')
-        
-        pontos_da_rota = [polo_coords] + list(zip(rota_com_coords['Latitude'], rota_com_coords['Longitude'])) + [polo_coords]
-        
-        cor_da_rota = mapa_cores_equipe[equipe_unica]
-        folium.PolyLine(pontos_da_rota, color=cor_da_rota, weight=3, opacity=0.8, tooltip=f"<strong>{equipe_unica}</strong>").add_to(mapa)
-        
-        for _, servico in rota_com_coords.iterrows():
-            popup_html = f"<strong>Equipe:</strong> {servico['Equipe']}<br><strong>Ordem:</strong> {servico['Ordem_Visita']}<br><strong>ID Serviço:</strong> {servico['ID_Servico']}"
-            folium.Marker(location=[servico['Latitude'], servico['Longitude']], popup=folium.Popup(popup_html, max_width=300), icon=folium.Icon(color=cor_da_rota, icon='info-sign')).add_to(mapa)
-            
-    return mapa
+    instrumentacao = Instrumentacao()
+    if params.get("dias", 1) > 1:
+        execucao = ExecucaoEmSegundoPlano(planejar_dias, params["df_servicos_filtrado"], params["df_polos_completo"], parametros, params["data_despacho"], params["dias"], params["df_feriados"], chave_api=CHAVE_API_GOOGLE, cache_directions=cache_directions, cache_resultados=obter_cache_resultados(), instrumentacao=instrumentacao)
+    else:
+        execucao = ExecucaoEmSegundoPlano(motor.executar_roteirizacao, params["df_servicos_filtrado"], params["df_polos_completo"], parametros, chave_api=CHAVE_API_GOOGLE, cache_directions=cache_directions, cache_resultados=obter_cache_resultados(), plano_anterior=params.get("plano_anterior"), instrumentacao=instrumentacao)
+    st.session_state.execucao = execucao
+    st.session_state.instrumentacao = instrumentacao
+    st.session_state.cache_directions_execucao = cache_directions
+    st.session_state.parcial = {'grupos': [], 'progresso': (0.0, "Aguarde... Otimizando as rotas."), 'primeiro_grupo_s': None, 'avisos': []}
+    st.session_state.results = None
+    st.session_state.resumo_execucao = None
+
+def concluir_execucao(evento):
+    """Guarda o resultado final (ou o erro) da thread de trabalho e encerra o acompanhamento."""
+    parcial = st.session_state.parcial
+    st.session_state.execucao = None
+    st.session_state.instrumentacao.concluir()
+    if evento['tipo'] == 'erro':
+        st.session_state.resumo_execucao = {'erro': evento['mensagem']}
+        return
+    st.session_state.results = evento['resultados']
+    cache_directions = st.session_state.pop('cache_directions_execucao', None)
+    st.session_state.estatisticas_cache_google = cache_directions.estatisticas() if cache_directions is not None else None
+    st.session_state.resumo_execucao = {'primeiro_grupo_s': parcial['primeiro_grupo_s'], 'total_s': evento['segundos'], 'cancelado': evento['cancelado'],
+                                        'avisos': parcial['avisos']}
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_S)
+def acompanhar_execucao(df_polos_completo, df_servicos):
+    """
+    Resultado parcial da execução em segundo plano, atualizado a cada INTERVALO_ATUALIZACAO_S sem recarregar a
+    página: o progresso, o botão de cancelar, o resumo dos grupos já resolvidos e, do grupo escolhido, as rotas,
+    o mapa e a evolução do custo na busca.
+    """
+    execucao = st.session_state.get('execucao')
+    if execucao is None: return
+    parcial = st.session_state.parcial
+    for evento in execucao.novos_eventos():
+        if evento['tipo'] == 'progresso':
+            parcial['progresso'] = (evento['fracao'], evento['texto'])
+        elif evento['tipo'] == 'grupo':
+            registro = evento['registro']
+            parcial['avisos'] += [f"{registro['polo']} - {registro['tipo_equipe']}: {aviso}" for aviso in registro.get('avisos', [])]
+            if registro['relatorio'] is not None:
+                parcial['grupos'].append(registro)
+                if parcial['primeiro_grupo_s'] is None: parcial['primeiro_grupo_s'] = evento['segundos']
+        elif evento['tipo'] in ('concluido', 'erro'):
+            concluir_execucao(evento)
+            st.rerun(scope="app")
+
+    fracao, texto = parcial['progresso']
+    st.progress(min(max(fracao, 0.0), 1.0), text=texto)
+    col_cancelar, col_tempo = st.columns([1, 4])
+    if col_cancelar.button("Cancelar roteirização", disabled=execucao.cancelamento.is_set()):
+        execucao.cancelar()
+    if execucao.cancelamento.is_set():
+        col_tempo.info("Cancelando: os grupos em andamento ficam com a melhor solução já encontrada e os seguintes ficam de fora.")
+    else:
+        col_tempo.caption(f"Em execução há {execucao.segundos_decorridos:.0f}s.")
+    for aviso in parcial['avisos']:
+        st.warning(aviso)
+
+    grupos = parcial['grupos']
+    if not grupos:
+        st.caption("Aguardando o primeiro grupo...")
+        return
+    st.caption(f"{len(grupos)} grupo(s) resolvido(s); o primeiro ficou pronto em {parcial['primeiro_grupo_s']:.1f}s.")
+    st.dataframe(pd.DataFrame([registro['relatorio'] for registro in grupos])[['Polo', 'Servicos_Roteirizados', 'Total_Servicos_Disponiveis', 'Valor_Total_Roteirizado_R$', 'Servicos_Dentro_ANS', 'Tempo_Solver_s']])
+
+    # No planejamento de vários dias o mesmo polo aparece uma vez por dia: a escolha é pela posição
+    nomes = [f"{posicao + 1}. {registro['relatorio']['Polo']}" for posicao, registro in enumerate(grupos)]
+    escolhido = st.selectbox("Ver o grupo:", nomes, index=len(nomes) - 1, key='grupo_parcial')
+    registro = grupos[nomes.index(escolhido)]
+    rotas_grupo = pd.DataFrame(registro['linhas_rotas'])
+    col_mapa, col_custo = st.columns([3, 2])
+    with col_mapa:
+        if not rotas_grupo.empty:
+            mapa_folium, _ = gerar_mapa_de_rotas(rotas_grupo[rotas_grupo['ID_Servico'] != ID_RETORNO_DEPOSITO], df_polos_completo, df_servicos, [registro['polo']])
+            if mapa_folium: st.iframe(html_do_mapa(mapa_folium), height=400)
+    with col_custo:
+        st.markdown("**Custo da melhor solução durante a busca**")
+        if registro['evolucao_objetivo']:
+            st.line_chart(pd.DataFrame(registro['evolucao_objetivo'], columns=['Segundos', 'Custo']), x='Segundos', y='Custo')
+        else:
+            st.caption("Sem busca registrada (resultado do cache ou de subproblemas).")
+    st.dataframe(rotas_grupo)
 
 # ==============================================================================
 # INTERFACE DA APLICAÇÃO WEB (STREAMLIT)
@@ -417,85 +228,99 @@ if not check_password():
 
 if 'results' not in st.session_state:
     st.session_state.results = None
+if 'execucao' not in st.session_state:
+    st.session_state.execucao = None
 
-dados_config_carregados = carregar_dados_config()
+assinatura_config = motor.assinatura_config()
+dados_config_carregados = carregar_dados_config(assinatura_config)
 
 if all(df is not None for df in dados_config_carregados):
-    df_polos, df_equipes, df_feriados, df_tempos, df_fator_k = dados_config_carregados
-
     st.sidebar.header("Parâmetros da Roteirização")
     uploaded_file = st.sidebar.file_uploader("1. Carregue o arquivo 'servicos.csv' do dia", type=["csv"])
 
     if uploaded_file is not None:
-        df_servicos_raw = carregar_dados_servicos(uploaded_file)
-        
-        if df_servicos_raw is not None:
-            dados_preparados = preparar_dados(df_polos, df_equipes, df_servicos_raw, df_feriados, df_tempos, df_fator_k)
-
-            if all(dp is not None for dp in dados_preparados):
-                df_servicos, df_polos_completo, df_feriados, JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE = dados_preparados
-                st.session_state.df_servicos = df_servicos
-
-                hoje, dia_semana = date.today(), date.today().weekday()
-                if dia_semana in [0, 1, 2, 3]: data_despacho = hoje + timedelta(days=1)
-                elif dia_semana == 4: data_despacho = hoje + timedelta(days=3)
-                elif dia_semana == 5: data_despacho = hoje + timedelta(days=2)
-                else: data_despacho = hoje + timedelta(days=1)
-                dias_pt = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
-
-                st.sidebar.info(f"""**Data de Hoje:** {hoje.strftime('%d/%m/%Y')} ({dias_pt[hoje.weekday()]})  
-                **Roteirizando para:** {data_despacho.strftime('%d/%m/%Y')} ({dias_pt[data_despacho.weekday()]})""")
-
-                polos_disponiveis = ["Processar TODOS"] + sorted(df_servicos['Polo'].unique())
-                polo_selecionado_ui = st.sidebar.selectbox("2. Escolha o Polo", polos_disponiveis)
-                
-                tipo_servico_ui = st.sidebar.radio("3. Escolha o Tipo de Serviço", ('Cortes + Recortes (Todos)', 'Apenas Cortes', 'Apenas Recortes'), horizontal=True)
-                estrategia_ui = st.sidebar.radio("4. Escolha a Estratégia", ('Rota mais CURTA', 'Rota mais VALIOSA', 'Rota mais EFICIENTE'))
-                restricao_ui = st.sidebar.radio("5. Escolha a Restrição Principal", ('Por TEMPO de trabalho', 'Por CAPACIDADE de serviços'), horizontal=True)
-                usar_google_api_ui = st.sidebar.radio("6. Enriqueçer com Google Maps?", ('NÃO (mais rápido)', 'SIM (custo por consulta)'), horizontal=True)
+        dados_preparados = preparar_dados_enviados(uploaded_file, dados_config_carregados, assinatura_config)
 
-                if st.sidebar.button(" Gerar Rotas ", use_container_width=True, type="primary"):
-                    
-                    polos_para_processar = polos_disponiveis[1:] if polo_selecionado_ui == "Processar TODOS" else [polo_selecionado_ui]
-                    st.session_state.polos_processados = polos_para_processar # Salva para uso no mapa
+        if dados_preparados is not None:
+            df_servicos, df_polos_completo, df_feriados, JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE = dados_preparados
+            st.session_state.df_servicos = df_servicos
+
+            hoje = date.today()
+            data_despacho = motor.calcular_data_despacho(hoje)
+            dias_pt = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
+
+            st.sidebar.info(f"""**Data de Hoje:** {hoje.strftime('%d/%m/%Y')} ({dias_pt[hoje.weekday()]})  
+            **Roteirizando para:** {data_despacho.strftime('%d/%m/%Y')} ({dias_pt[data_despacho.weekday()]})""")
+
+            polos_disponiveis = ["Processar TODOS"] + sorted(df_servicos['Polo'].unique())
+            polo_selecionado_ui = st.sidebar.selectbox("2. Escolha o Polo", polos_disponiveis)
+                
+            tipo_servico_ui = st.sidebar.radio("3. Escolha o Tipo de Serviço", ('Cortes + Recortes (Todos)', 'Apenas Cortes', 'Apenas Recortes'), horizontal=True)
+            estrategia_ui = st.sidebar.radio("4. Escolha a Estratégia", ('Rota mais CURTA', 'Rota mais VALIOSA', 'Rota mais EFICIENTE'))
+            restricao_ui = st.sidebar.radio("5. Escolha a Restrição Principal", ('Por TEMPO de trabalho', 'Por CAPACIDADE de serviços'), horizontal=True)
+            usar_google_api_ui = st.sidebar.radio("6. Enriqueçer com Google Maps?", ('NÃO (mais rápido)', 'SIM (custo por consulta)', 'SOMENTE CACHE (sem custo)'), horizontal=True)
+            num_processos_ui = st.sidebar.number_input("7. Processos em paralelo", min_value=1, max_value=NUM_PROCESSOS_PADRAO, value=NUM_PROCESSOS_PADRAO, help="Quantidade de grupos (polo + tipo de equipe) resolvidos ao mesmo tempo.")
+            provedor_distancia_ui = st.sidebar.selectbox("8. Fonte das distâncias", ('Linha reta x Fator K', 'Fator K por faixa de distância', 'Tabela de distâncias reais', 'Servidor OSRM'), help="Distâncias usadas pelo otimizador. A opção por faixa usa o K sugerido na análise por distância (faixas com poucas amostras usam o K do polo). A tabela usa pares já conhecidos e completa o resto com linha reta x Fator K.")
+            url_osrm_ui = st.sidebar.text_input("URL do servidor OSRM", value=URL_OSRM_PADRAO) if provedor_distancia_ui == 'Servidor OSRM' else None
+            plano_anterior_ui = st.sidebar.file_uploader("9. Reotimizar a partir de um plano (opcional)", type=["csv"], key="plano_anterior", help="Um 'rotas_otimizadas.csv' já gerado. As rotas dele são o ponto de partida: serviços novos são encaixados, os que saíram do arquivo são retirados e equipes a menos são desfeitas. A otimização leva bem menos tempo.")
+            decomposicao_ui = st.sidebar.selectbox("10. Grupos grandes", ('Resolver cada grupo inteiro', 'Dividir em setores ao redor do polo', 'Dividir por proximidade (k-means)'), help=f"Grupos com {MIN_SERVICOS_DECOMPOSICAO} serviços ou mais podem ser divididos em subproblemas de {EQUIPES_POR_SUBPROBLEMA} equipes, resolvidos em paralelo e depois ajustados juntos por uma busca local curta.")
+            inicio_jornada_ui = st.sidebar.time_input("11. Início da jornada", value=time.fromisoformat(INICIO_JORNADA_PADRAO), help="Horário de saída das equipes. Os prazos do ANS (ANS_LEGAL_CALCULADO ou ANS_LEGAL) e as janelas dos clientes (colunas opcionais JANELA_INICIO e JANELA_FIM) são contados a partir dele: serviços com o ANS vencendo têm prioridade e os do dia só entram na rota se puderem ser concluídos no prazo.")
+            dias_ui = st.sidebar.number_input("12. Dias de planejamento", min_value=1, max_value=MAX_DIAS_PLANEJAMENTO, value=1, help="Com mais de um dia, a carteira é distribuída pelos próximos dias de trabalho: o que não couber em um dia passa para o seguinte e os cortes esperam os dias permitidos (fora de sexta, feriados e vésperas do município).")
+
+            if st.sidebar.button(" Gerar Rotas ", use_container_width=True, type="primary", disabled=st.session_state.execucao is not None):
                     
-                    municipios_a_processar = df_servicos[df_servicos['Polo'].isin(polos_para_processar)]['Municipio'].unique()
-                    restrito, motivo = verificar_dia_restrito(data_despacho, municipios_a_processar, df_feriados)
+                polos_para_processar = polos_disponiveis[1:] if polo_selecionado_ui == "Processar TODOS" else [polo_selecionado_ui]
+                st.session_state.polos_processados = polos_para_processar # Salva para uso no mapa
                     
-                    servicos_a_processar = df_servicos[df_servicos['Polo'].isin(polos_para_processar)]
-                    df_servicos_filtrado = pd.DataFrame()
+                tipo_filtro = {'Apenas Cortes': 'CORTE', 'Apenas Recortes': 'RECORTE'}.get(tipo_servico_ui, 'TODOS')
+                try:
+                    if dias_ui > 1:  # Os cortes esperam os dias permitidos dentro do planejamento
+                        df_servicos_filtrado = motor.servicos_dos_polos(df_servicos, polos_para_processar, tipo_filtro)
+                    else:
+                        df_servicos_filtrado = motor.filtrar_servicos(df_servicos, polos_para_processar, tipo_filtro, data_despacho, df_feriados)
+                except ValueError as e:
+                    st.error(f"ERRO: {e}")
+                else:
+                    if df_servicos_filtrado.empty:
+                        st.warning("Nenhum serviço encontrado para os filtros selecionados.")
+                        st.session_state.results = None
+                    else:
+                        plano_anterior = None
+                        if plano_anterior_ui is not None:
+                            try:
+                                plano_anterior = motor.carregar_plano_anterior(plano_anterior_ui)
+                            except Exception as e:
+                                st.warning(f"AVISO: O plano anterior não pôde ser lido e será ignorado. Detalhe: {e}")
+                        params = {
+                            "polos_para_processar": polos_para_processar,
+                            "df_servicos_filtrado": df_servicos_filtrado,
+                            "df_polos_completo": df_polos_completo,
+                            "estrategia": {'Rota mais CURTA': '1', 'Rota mais VALIOSA': '2', 'Rota mais EFICIENTE': '3'}[estrategia_ui],
+                            "restricao": {'Por CAPACIDADE de serviços': '1', 'Por TEMPO de trabalho': '2'}[restricao_ui],
+                            "usar_google_api": {'SIM (custo por consulta)': '1', 'NÃO (mais rápido)': '2', 'SOMENTE CACHE (sem custo)': '3'}[usar_google_api_ui],
+                            "JORNADA_TRABALHO_MIN": JORNADA_TRABALHO_MIN,
+                            "SERVICOS_EXTRAS_IMPRODUTIVIDADE": SERVICOS_EXTRAS_IMPRODUTIVIDADE,
+                            "num_processos": int(num_processos_ui),
+                            "data_despacho": data_despacho,
+                            "dias": int(dias_ui),
+                            "df_feriados": df_feriados,
+                            "inicio_jornada": inicio_jornada_ui.strftime('%H:%M'),
+                            "plano_anterior": plano_anterior,
+                            "decomposicao": {'Dividir em setores ao redor do polo': 'varredura', 'Dividir por proximidade (k-means)': 'kmeans'}.get(decomposicao_ui),
+                            "provedor_distancia": {'Linha reta x Fator K': {'tipo': 'haversine'}, 'Fator K por faixa de distância': {'tipo': 'faixas_k'}, 'Tabela de distâncias reais': {'tipo': 'tabela'}, 'Servidor OSRM': {'tipo': 'osrm', 'url': url_osrm_ui, 'caminho_tabela': ARQUIVO_TABELA_DISTANCIAS}}[provedor_distancia_ui]
+                        }
+                            
+                        iniciar_roteirizacao(params)
 
-                    if tipo_servico_ui == 'Apenas Cortes': tipo_filtro = 'CORTE'
-                    elif tipo_servico_ui == 'Apenas Recortes': tipo_filtro = 'RECORTE'
-                    else: tipo_filtro = 'TODOS'
+            if st.session_state.execucao is not None:
+                acompanhar_execucao(df_polos_completo, df_servicos)
 
-                    if restrito and tipo_filtro in ['CORTE', 'TODOS']:
-                        st.error(f"ERRO: Roteirização de CORTES não é permitida para o dia {data_despacho.strftime('%d/%m/%Y')} ({motivo}).")
-                    else:
-                        if tipo_filtro == 'CORTE': df_servicos_filtrado = servicos_a_processar[servicos_a_processar['Tipo_Servico'] == 'CORTE'].copy()
-                        elif tipo_filtro == 'RECORTE': df_servicos_filtrado = servicos_a_processar[servicos_a_processar['Tipo_Servico'] == 'RECORTE'].copy()
-                        else: df_servicos_filtrado = servicos_a_processar.copy()
-
-                        if df_servicos_filtrado.empty:
-                            st.warning("Nenhum serviço encontrado para os filtros selecionados.")
-                            st.session_state.results = None
-                        else:
-                            with st.spinner('Aguarde... Otimizando as rotas. Isso pode levar alguns minutos.'):
-                                params = {
-                                    "polos_para_processar": polos_para_processar,
-                                    "df_servicos_filtrado": df_servicos_filtrado,
-                                    "df_polos_completo": df_polos_completo,
-                                    "estrategia": {'Rota mais CURTA': '1', 'Rota mais VALIOSA': '2', 'Rota mais EFICIENTE': '3'}[estrategia_ui],
-                                    "restricao": {'Por CAPACIDADE de serviços': '1', 'Por TEMPO de trabalho': '2'}[restricao_ui],
-                                    "usar_google_api": {'SIM (custo por consulta)': '1', 'NÃO (mais rápido)': '2'}[usar_google_api_ui],
-                                    "JORNADA_TRABALHO_MIN": JORNADA_TRABALHO_MIN,
-                                    "SERVICOS_EXTRAS_IMPRODUTIVIDADE": SERVICOS_EXTRAS_IMPRODUTIVIDADE
-                                }
-                                
-                                st.session_state.results = executar_roteirizacao(params)
+resumo_execucao = st.session_state.get('resumo_execucao')
+if resumo_execucao and 'erro' in resumo_execucao:
+    st.error(f"ERRO durante a roteirização: {resumo_execucao['erro']}")
 
 if st.session_state.results:
-    todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, _ = st.session_state.results
+    todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df = st.session_state.results
 
     def format_and_prepare_csv(df, columns_to_format):
         df_display = df.copy()
@@ -508,18 +333,32 @@ if st.session_state.results:
     resumo_display, resumo_csv = format_and_prepare_csv(resumo_equipes_df, resumo_cols_format)
     
     rotas_cols_format = ['Valor_Divida', 'Tempo_Execucao_Min', 'KM_Trecho_Estimado', 'Tempo_Trecho_Estimado_Min', 'KM_Trecho_Google', 'Tempo_Trecho_Google_Min']
-    rotas_display, rotas_csv = format_and_prepare_csv(todas_as_rotas_df[todas_as_rotas_df['ID_Servico'] != 'RETORNO_AO_DEPOSITO'], rotas_cols_format)
+    rotas_display, rotas_csv = format_and_prepare_csv(todas_as_rotas_df[todas_as_rotas_df['ID_Servico'] != ID_RETORNO_DEPOSITO], rotas_cols_format)
     
     nao_atendidos_display, nao_atendidos_csv = format_and_prepare_csv(servicos_nao_atendidos_df, {})
 
     st.success("Roteirização concluída!")
+    if resumo_execucao:
+        if resumo_execucao['cancelado']:
+            st.warning("Roteirização cancelada: os grupos que não chegaram a ser resolvidos estão em 'Serviços Não Roteirizados'.")
+        for aviso in resumo_execucao['avisos']:
+            st.warning(aviso)
+        primeiro_grupo = f"Primeiro grupo pronto em {resumo_execucao['primeiro_grupo_s']:.1f}s; " if resumo_execucao['primeiro_grupo_s'] is not None else ""
+        st.caption(f"{primeiro_grupo}execução completa em {resumo_execucao['total_s']:.1f}s.")
+    estatisticas_resultados = obter_cache_resultados().estatisticas()
+    st.caption(f"Cache de rotas: {estatisticas_resultados['acertos']} grupo(s) reaproveitado(s) e {estatisticas_resultados['falhas']} resolvido(s) desde o início do servidor ({estatisticas_resultados['taxa_acerto_%']}% de acerto, {estatisticas_resultados['tempo_solver_poupado_s']}s de solver poupados), {estatisticas_resultados['itens']} grupo(s) guardado(s).")
+    estatisticas_cache = st.session_state.get('estatisticas_cache_google')
+    if estatisticas_cache:
+        st.caption(f"Cache Google Directions: {estatisticas_cache['acertos']} acertos, {estatisticas_cache['falhas']} falhas ({estatisticas_cache['taxa_acerto_%']}% de acerto), {estatisticas_cache['entradas']} rotas armazenadas.")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Resumo das Equipes", "🗺️ Mapa das Rotas", "📋 Rotas Detalhadas", "🚫 Serviços Não Roteirizados"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Resumo das Equipes", "🗺️ Mapa das Rotas", "📋 Rotas Detalhadas", "🚫 Serviços Não Roteirizados", "⏱️ Instrumentação"])
 
     with tab1:
         st.subheader("Resumo por Equipe")
         st.dataframe(resumo_display)
         st.download_button("Download Resumo (CSV)", resumo_csv, "resumo_equipes.csv", "text/csv", key='download-resumo')
+        st.subheader("Resumo por Polo (tempo usado pelo solver)")
+        st.dataframe(resumo_dia_df)
 
     with tab2:
         st.subheader("Mapa Interativo das Rotas")
@@ -527,18 +366,28 @@ if st.session_state.results:
             equipes_disponiveis = sorted(resumo_equipes_df['Equipe'].unique())
             equipes_selecionadas = st.multiselect("Filtrar Equipes no Mapa:", options=["Todas as Equipes"] + equipes_disponiveis, default="Todas as Equipes")
             
+            rotas_do_dia = todas_as_rotas_df
+            if 'Data_Despacho' in todas_as_rotas_df.columns:  # Planejamento de vários dias: um dia por vez no mapa
+                dia_mapa = st.selectbox("Dia:", sorted(todas_as_rotas_df['Data_Despacho'].unique()))
+                rotas_do_dia = todas_as_rotas_df[todas_as_rotas_df['Data_Despacho'] == dia_mapa]
+            col_modo, col_simplificar = st.columns(2)
+            modo_mapa_ui = col_modo.radio("Montagem do mapa:", ('Rápido (camadas por polo)', 'Marcadores detalhados'), horizontal=True, help="O modo rápido desenha as rotas e os serviços de cada polo numa camada que pode ser ligada e desligada; os marcadores detalhados (um por serviço) deixam o mapa pesado com muitos polos.")
+            simplificar_ui = col_simplificar.slider("Simplificar as linhas das rotas (metros)", 0, 500, 0, step=50, disabled=modo_mapa_ui != 'Rápido (camadas por polo)')
             if "Todas as Equipes" in equipes_selecionadas or not equipes_selecionadas:
-                rotas_para_mapa = todas_as_rotas_df
+                rotas_para_mapa = rotas_do_dia
             else:
-                rotas_para_mapa = todas_as_rotas_df[todas_as_rotas_df['Equipe'].isin(equipes_selecionadas)]
+                rotas_para_mapa = rotas_do_dia[rotas_do_dia['Equipe'].isin(equipes_selecionadas)]
             
             # ATUALIZAÇÃO: Filtra o 'RETORNO_AO_DEPOSITO' antes de passar para o mapa
-            rotas_para_mapa_sem_retorno = rotas_para_mapa[rotas_para_mapa['ID_Servico'] != 'RETORNO_AO_DEPOSITO']
+            rotas_para_mapa_sem_retorno = rotas_para_mapa[rotas_para_mapa['ID_Servico'] != ID_RETORNO_DEPOSITO]
             
             polos_para_processar = st.session_state.get('polos_processados', [])
-            mapa_folium = gerar_mapa_de_rotas(rotas_para_mapa_sem_retorno, df_polos_completo, polos_para_processar)
+            modo_mapa = 'rapido' if modo_mapa_ui == 'Rápido (camadas por polo)' else 'marcadores'
+            mapa_folium, tempo_montagem = gerar_mapa_de_rotas(rotas_para_mapa_sem_retorno, df_polos_completo, st.session_state.df_servicos, polos_para_processar, modo_mapa, simplificar_ui)
             if mapa_folium:
-                st_folium(mapa_folium, width=1200, height=600, returned_objects=[])
+                html_mapa = html_do_mapa(mapa_folium)
+                st.iframe(html_mapa, height=600)
+                st.caption(f"Mapa montado em {tempo_montagem:.2f}s, {len(html_mapa.encode('utf-8')) / 2 ** 20:.1f} MB de HTML.")
             else:
                 st.warning("Nenhuma rota para exibir no mapa com os filtros atuais.")
         else:
@@ -553,3 +402,26 @@ if st.session_state.results:
         st.subheader("Serviços Não Roteirizados")
         st.dataframe(nao_atendidos_display)
         st.download_button("Download Não Roteirizados (CSV)", nao_atendidos_csv, "servicos_nao_roteirizados.csv", "text/csv", key='download-nao-roteirizados')
+
+    with tab5:
+        st.subheader("Onde o tempo foi gasto")
+        instrumentacao = st.session_state.get('instrumentacao')
+        if instrumentacao is not None and instrumentacao.grupos:
+            grupos_df = instrumentacao.tabela_grupos()
+            col_duracao, col_grupos, col_busca, col_descartados = st.columns(4)
+            col_duracao.metric("Execução", f"{instrumentacao.relatorio()['duracao_s']:.1f}s")
+            col_grupos.metric("Grupos resolvidos", f"{int((~grupos_df['reaproveitado']).sum())} de {len(grupos_df)}")
+            col_busca.metric("Busca (soma dos grupos)", f"{grupos_df['busca_parede_s'].sum():.1f}s")
+            col_descartados.metric("Descartados pelo solver", int(grupos_df['servicos_descartados_solver'].sum()))
+            st.caption("Tempos de parede e de CPU por etapa. 'espera_resultado' é a montagem aguardando o solver: no mesmo processo, ela contém as etapas do solver; com processos em paralelo, a CPU do solver aparece só nas etapas dos grupos.")
+            st.dataframe(instrumentacao.tabela_etapas())
+            st.markdown("**Tempo de parede por etapa em cada grupo (s)**")
+            etapas_por_grupo = grupos_df.assign(Grupo=grupos_df['polo'] + " - " + grupos_df['tipo_equipe'] + " " + grupos_df['data_despacho'])
+            st.bar_chart(etapas_por_grupo.set_index('Grupo')[[f'{etapa}_parede_s' for etapa in ETAPAS_GRUPO if etapa != 'espera_resultado']])
+            st.markdown("**Grupos: tamanho do modelo, status do OR-Tools e estatísticas da busca**")
+            st.dataframe(grupos_df)
+            col_json, col_csv = st.columns(2)
+            col_json.download_button("Download relatório (JSON)", instrumentacao.relatorio_json(), "relatorio_execucao.json", "application/json", key='download-relatorio-json')
+            col_csv.download_button("Download relatório por grupo (CSV)", grupos_df.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'), "relatorio_execucao.csv", "text/csv", key='download-relatorio-csv')
+        else:
+            st.info("Nenhum grupo foi roteirizado nesta execução.")
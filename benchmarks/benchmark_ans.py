@@ -0,0 +1,73 @@
+"""
+Benchmark dos prazos de ANS no modelo x roteirização que ignora os prazos.
+
+Gera um grupo sintético com prazos de ANS variados (vencidos, vencendo no dia, nos próximos dias
+e sem prazo) e resolve o mesmo grupo duas vezes: sem os prazos (como antes) e com eles (janelas no
+CumulVar da dimensão Time e penalidades por urgência). As duas soluções são avaliadas com os
+prazos reais: serviços concluídos dentro do ANS, os do dia cumpridos, equipe-horas e a vazão
+(serviços dentro do ANS por equipe-hora).
+
+Uso: python benchmarks/benchmark_ans.py [servicos] [equipes] [restricao]
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark_callbacks import gerar_grupo_sintetico, FATOR_K, MINUTOS_POR_KM, POLO_NITEROI
+from prazos_ans import horarios_da_rota, dentro_do_ans
+from resolvedor import montar_problema_grupo, resolver_grupo
+
+JORNADA_MIN = 480
+
+
+def gerar_prazos(quantidade, semente=7):
+    """Prazo do ANS em minutos desde o início da jornada: 10% vencidos, 25% no dia, 35% nos próximos dias e 30% sem prazo."""
+    rng = np.random.default_rng(semente)
+    faixa = rng.choice(4, quantidade, p=[0.10, 0.25, 0.35, 0.30])
+    prazos = np.select([faixa == 0, faixa == 1, faixa == 2],
+                       [-rng.uniform(60, 2 * 1440, quantidade), rng.uniform(120, JORNADA_MIN, quantidade), rng.uniform(1440, 5 * 1440, quantidade)], np.nan)
+    return prazos
+
+
+def avaliar(problema, resultado, prazos):
+    """(dentro do ANS, do dia cumpridos, equipe-horas) das rotas, com os prazos reais."""
+    dentro, do_dia, minutos = 0, 0, 0
+    execucao = problema['dados_grupo']['tempos_execucao']
+    for rota, trechos_m in zip(resultado['rotas'], resultado['trechos_m']):
+        if not rota: continue
+        chegadas = horarios_da_rota(trechos_m, execucao[rota], np.full(len(rota), np.nan), MINUTOS_POR_KM)
+        no_prazo = dentro_do_ans(chegadas[:-1], execucao[rota], prazos[rota])
+        dentro += int(no_prazo.sum())
+        do_dia += int((no_prazo & (prazos[rota] >= 0) & (prazos[rota] < JORNADA_MIN)).sum())
+        minutos += chegadas[-1]
+    return dentro, do_dia, minutos / 60
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    num_equipes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    restricao = sys.argv[3] if len(sys.argv) > 3 else '2'
+    info_polo = {**POLO_NITEROI, 'Fator_K_Estimado': FATOR_K}
+    servicos = gerar_grupo_sintetico(quantidade)
+    prazos = gerar_prazos(quantidade)
+    do_dia = int(((prazos >= 0) & (prazos < JORNADA_MIN)).sum())
+    print(f"{quantidade} serviços ({do_dia} com ANS vencendo no dia, {int((prazos < 0).sum())} vencidos), {num_equipes} equipes, restrição {restricao}.\n")
+
+    print(f"{'Modelo':<14}{'Estratégia':>11}{'Solver':>9}{'Atendidos':>11}{'Dentro ANS':>12}{'Do dia ok':>11}{'Equipe-h':>10}{'Por equipe-h':>14}")
+    for estrategia in ('1', '2', '3'):
+        for com_prazos in (False, True):
+            grupo = servicos.assign(Prazo_ANS_Min=prazos) if com_prazos else servicos
+            parametros = {'estrategia': estrategia, 'restricao': restricao, 'JORNADA_TRABALHO_MIN': JORNADA_MIN, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': 8,
+                          'MINUTOS_POR_KM': MINUTOS_POR_KM, 'FATOR_CUSTO_DISTANCIA': 50}
+            problema = montar_problema_grupo('NITERÓI', 'LEVE', info_polo, grupo, num_equipes, 15, parametros)
+            resultado = resolver_grupo(problema)
+            dentro, cumpridos, equipe_horas = avaliar(problema, resultado, prazos)
+            print(f"{'com ANS' if com_prazos else 'sem ANS':<14}{estrategia:>11}{resultado['tempo_solver_s']:>8.1f}s{sum(map(len, resultado['rotas'])):>11}"
+                  f"{dentro:>12}{f'{cumpridos}/{do_dia}':>11}{equipe_horas:>10.1f}{dentro / max(equipe_horas, 1e-9):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark do custo por avaliação dos callbacks de trânsito do OR-Tools.
+
+Compara a implementação antiga (haversine + grupo_servicos.iloc por arco, em Python)
+com as matrizes pré-calculadas registradas via RegisterTransitMatrix, avaliando os
+mesmos arcos aleatórios através da dimensão 'Time' do modelo. Também mede o laço de
+penalidades do AddDisjunction.
+
+Uso: python benchmarks/benchmark_callbacks.py [quantidade_servicos] [avaliacoes]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from haversine import haversine, Unit
+from ortools.constraint_solver import pywrapcp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from matrizes import extrair_dados_grupo, construir_matrizes_grupo, calcular_penalidades, registrar_matriz
+
+MINUTOS_POR_KM = 3
+FATOR_K = 2.19
+POLO_NITEROI = {'latitude': -22.90684155, 'longitude': -43.06050544}
+
+
+def gerar_grupo_sintetico(quantidade, semente=42):
+    """Serviços aleatórios em torno do polo de Niterói, no formato de 'grupo_servicos'."""
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'ID_Servico': np.arange(quantidade).astype(str),
+        'Latitude': POLO_NITEROI['latitude'] + rng.normal(0, 0.03, quantidade),
+        'Longitude': POLO_NITEROI['longitude'] + rng.normal(0, 0.03, quantidade),
+        'Tempo_Execucao_Min': rng.choice([12.0, 28.0, 40.0], quantidade),
+        'Valor_Divida': rng.uniform(50, 6000, quantidade),
+    })
+
+
+def modelo_antigo(grupo_servicos):
+    """Reproduz os callbacks Python anteriores (haversine + iloc a cada avaliação)."""
+    locations = [(POLO_NITEROI['latitude'], POLO_NITEROI['longitude'])] + list(zip(grupo_servicos['Latitude'], grupo_servicos['Longitude']))
+    manager = pywrapcp.RoutingIndexManager(len(locations), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def time_callback(from_index, to_index):
+        from_node, to_node = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
+        dist_metros = haversine(locations[from_node], locations[to_node], unit=Unit.METERS) * FATOR_K
+        tempo_deslocamento = (dist_metros / 1000) * MINUTOS_POR_KM
+        tempo_execucao = grupo_servicos.iloc[from_node - 1]['Tempo_Execucao_Min'] if from_node > 0 else 0
+        return int(tempo_deslocamento + tempo_execucao)
+
+    routing.AddDimension(routing.RegisterTransitCallback(time_callback), 0, 10**9, True, 'Time')
+    return routing, manager, time_callback
+
+
+def modelo_novo(grupo_servicos):
+    """Matrizes construídas em uma passada NumPy e registradas no solver."""
+    dados_grupo = extrair_dados_grupo(POLO_NITEROI, grupo_servicos)
+    manager = pywrapcp.RoutingIndexManager(len(dados_grupo['latitudes']), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    matrizes = construir_matrizes_grupo(dados_grupo, FATOR_K, MINUTOS_POR_KM, incluir_tempo=True)
+    routing.AddDimension(registrar_matriz(routing, matrizes['tempo']), 0, 10**9, True, 'Time')
+    return routing, manager
+
+
+def medir_avaliacoes(routing, pares):
+    dimensao = routing.GetDimensionOrDie('Time')
+    inicio = time.perf_counter()
+    total = 0
+    for from_index, to_index in pares:
+        total += dimensao.GetTransitValue(from_index, to_index, 0)
+    return (time.perf_counter() - inicio) / len(pares), total
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 672
+    avaliacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    grupo_servicos = gerar_grupo_sintetico(quantidade)
+    print(f"Grupo sintético: {quantidade} serviços, {avaliacoes} avaliações de arco aleatórias.\n")
+
+    inicio = time.perf_counter()
+    routing_antigo, manager_antigo, time_callback = modelo_antigo(grupo_servicos)
+    tempo_modelo_antigo = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    routing_novo, manager_novo = modelo_novo(grupo_servicos)
+    tempo_modelo_novo = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(0)
+    nos = rng.integers(0, quantidade + 1, size=(avaliacoes, 2))
+    pares_antigo = [(manager_antigo.NodeToIndex(int(a)), manager_antigo.NodeToIndex(int(b))) for a, b in nos]
+    pares_novo = [(manager_novo.NodeToIndex(int(a)), manager_novo.NodeToIndex(int(b))) for a, b in nos]
+
+    inicio = time.perf_counter()
+    for from_index, to_index in pares_antigo:
+        time_callback(from_index, to_index)
+    custo_python_puro = (time.perf_counter() - inicio) / avaliacoes
+
+    custo_antigo, soma_antigo = medir_avaliacoes(routing_antigo, pares_antigo)
+    custo_novo, soma_novo = medir_avaliacoes(routing_novo, pares_novo)
+
+    inicio = time.perf_counter()
+    locations = [(POLO_NITEROI['latitude'], POLO_NITEROI['longitude'])] + list(zip(grupo_servicos['Latitude'], grupo_servicos['Longitude']))
+    for node_idx in range(1, len(locations)):
+        valor_divida_atual = grupo_servicos.iloc[node_idx - 1]['Valor_Divida']
+        dist_do_polo = int(haversine(locations[0], locations[node_idx], unit=Unit.METERS) * FATOR_K) or 1
+        int((valor_divida_atual * 10000) / dist_do_polo)
+    tempo_penalidades_antigo = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    dados_grupo = extrair_dados_grupo(POLO_NITEROI, grupo_servicos)
+    matrizes = construir_matrizes_grupo(dados_grupo, FATOR_K, MINUTOS_POR_KM)
+    calcular_penalidades(dados_grupo, matrizes['distancia'], '3')
+    tempo_penalidades_novo = time.perf_counter() - inicio
+
+    print(f"{'Medição':<45}{'Antes':>14}{'Depois':>14}")
+    print(f"{'Callback de tempo (chamada Python direta)':<45}{custo_python_puro * 1e6:>11.2f} us{'-':>14}")
+    print(f"{'Callback de tempo (via dimensão do solver)':<45}{custo_antigo * 1e6:>11.2f} us{custo_novo * 1e6:>11.2f} us")
+    print(f"{'Construção do modelo (registro dos callbacks)':<45}{tempo_modelo_antigo * 1e3:>11.2f} ms{tempo_modelo_novo * 1e3:>11.2f} ms")
+    print(f"{'Penalidades (estratégia EFICIENTE)':<45}{tempo_penalidades_antigo * 1e3:>11.2f} ms{tempo_penalidades_novo * 1e3:>11.2f} ms")
+    print(f"\nGanho por avaliação: {custo_antigo / custo_novo:.1f}x (somas conferidas: {'OK' if soma_antigo == soma_novo else 'DIVERGENTES'})")
+
+
+if __name__ == "__main__":
+    main()
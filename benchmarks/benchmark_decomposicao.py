@@ -0,0 +1,84 @@
+"""
+Benchmark da decomposição espacial de grupos grandes x um único modelo OR-Tools por grupo.
+
+Reconstrói os grupos de NITERÓI a partir dos dados de exemplo do repositório (serviços não
+roteirizados + serviços das rotas, com as coordenadas tiradas dos links do Google Maps; as
+rotas sem link ficam de fora) e resolve cada grupo inteiro, por setores (varredura) e por
+k-means, comparando tempo de relógio, função objetivo (custo dos arcos + penalidades dos não
+atendidos), serviços atendidos e km.
+
+Uso: python benchmarks/benchmark_decomposicao.py [estrategia] [restricao] [processos] [equipes_por_subproblema]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from matrizes import construir_matrizes_grupo, calcular_penalidades
+from resolvedor import montar_problema_grupo, resolver_grupos, NUM_PROCESSOS_PADRAO
+
+POLO = 'NITERÓI'
+EQUIPES = {'LEVE': ('Quantidade_equipes_Leves', 'Capacidade_maxima_Leves'), 'CESTO': ('Quantidades_equipes_Cesto', 'Capacidade_maxima_Cesto')}
+
+
+def carregar_grupos_exemplo():
+    """Serviços de cada tipo de equipe do polo, juntando os não roteirizados e os das rotas de exemplo."""
+    nao_roteirizados = pd.read_csv(os.path.join(RAIZ, 'servicos_nao_roteirizados.csv'), sep=';', encoding='utf-8-sig', dtype={'ID_Servico': str})
+    rotas = pd.read_csv(os.path.join(RAIZ, 'rotas_otimizadas.csv'), sep=';', encoding='utf-8-sig', dtype={'ID_Servico': str})
+    rotas = rotas[(rotas['ID_Servico'] != 'RETORNO_DEPOSITO') & rotas['Link_Google_Maps'].notna()].sort_values(['Equipe', 'Ordem_Visita'])
+    coordenadas = []
+    for _, rota in rotas.groupby('Equipe', sort=False):
+        pontos = rota['Link_Google_Maps'].iloc[0].split('/maps/dir/')[1].split('/')[1:-1]
+        coordenadas += [tuple(map(float, ponto.split(','))) for ponto in pontos[:len(rota)]]
+    rotas[['Latitude', 'Longitude']] = coordenadas
+    rotas['Tipo_Equipe_Requerida'] = rotas['Tipo_Equipe'].str.upper()
+    colunas = ['ID_Servico', 'Latitude', 'Longitude', 'Valor_Divida', 'Tempo_Execucao_Min', 'Tipo_Equipe_Requerida']
+    servicos = pd.concat([nao_roteirizados[nao_roteirizados['Polo'] == POLO][colunas], rotas[colunas]], ignore_index=True)
+    return {tipo: grupo.reset_index(drop=True) for tipo, grupo in servicos.groupby('Tipo_Equipe_Requerida')}
+
+
+def carregar_polo():
+    polos = pd.read_csv(os.path.join(RAIZ, 'polos.csv'), sep=';', encoding='utf-8-sig', decimal=',')
+    equipes = pd.read_csv(os.path.join(RAIZ, 'equipes.csv'), sep=';', encoding='utf-8-sig')
+    info_polo = polos[polos['Centro Operativo'] == POLO].iloc[0].copy()
+    info_polo['Fator_K_Estimado'] = float(info_polo['fator_k'])
+    return info_polo, equipes[equipes['Centro Operativo'] == POLO].iloc[0]
+
+
+def objetivo(problema, resultado):
+    """Valor da função objetivo do modelo: custo dos arcos das rotas + penalidades dos serviços não atendidos."""
+    matrizes = construir_matrizes_grupo(problema['dados_grupo'], problema['fator_k'], problema['minutos_por_km'],
+                                        fator_custo=problema['fator_custo_distancia'] if problema['estrategia'] == '2' else 1)
+    custo = sum(int(matrizes['custo'][[0] + [no + 1 for no in rota], [no + 1 for no in rota] + [0]].sum()) for rota in resultado['rotas'] if rota)
+    return custo + int(calcular_penalidades(problema['dados_grupo'], matrizes['distancia'], problema['estrategia'])[resultado['nao_atendidos']].sum())
+
+
+def main():
+    estrategia = sys.argv[1] if len(sys.argv) > 1 else '1'
+    restricao = sys.argv[2] if len(sys.argv) > 2 else '2'
+    num_processos = int(sys.argv[3]) if len(sys.argv) > 3 else NUM_PROCESSOS_PADRAO
+    equipes_por_subproblema = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+    grupos, (info_polo, equipes) = carregar_grupos_exemplo(), carregar_polo()
+    print(f"{POLO}: estratégia {estrategia}, restrição {restricao}, {num_processos} processo(s), {equipes_por_subproblema} equipe(s) por subproblema.\n")
+
+    print(f"{'Grupo':<16}{'Método':<12}{'Relógio':>9}{'Objetivo':>13}{'Atendidos':>11}{'km':>9}{'Subproblemas':>14}")
+    for tipo_equipe, servicos in grupos.items():
+        coluna_equipes, coluna_capacidade = EQUIPES[tipo_equipe]
+        for metodo in (None, 'varredura', 'kmeans'):
+            parametros = {'estrategia': estrategia, 'restricao': restricao, 'JORNADA_TRABALHO_MIN': 480, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': 8,
+                          'MINUTOS_POR_KM': 3, 'FATOR_CUSTO_DISTANCIA': 50, 'decomposicao': metodo, 'equipes_por_subproblema': equipes_por_subproblema}
+            problema = montar_problema_grupo(POLO, tipo_equipe, info_polo, servicos, int(equipes[coluna_equipes]), int(equipes[coluna_capacidade]), parametros)
+            inicio = time.perf_counter()
+            resultado = next(resolver_grupos([problema], num_processos))
+            relogio = time.perf_counter() - inicio
+            decomposicao = resultado['decomposicao']
+            print(f"{f'{tipo_equipe} ({len(servicos)})':<16}{metodo or 'inteiro':<12}{relogio:>8.1f}s{objetivo(problema, resultado):>13}"
+                  f"{sum(map(len, resultado['rotas'])):>11}{sum(map(sum, resultado['trechos_m'])) / 1000:>9.1f}"
+                  f"{decomposicao['subproblemas'] if decomposicao else '-':>14}")
+
+
+if __name__ == "__main__":
+    main()
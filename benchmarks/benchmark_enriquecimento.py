@@ -0,0 +1,75 @@
+"""
+Benchmark do enriquecimento das rotas com a Directions API.
+
+Compara a consulta sequencial anterior (uma chamada por trecho, equipe após equipe,
+sem sessão compartilhada) com 'enriquecer_rotas' (todas as consultas em paralelo,
+sessão keep-alive e limite de taxa) contra o servidor falso local com latência
+injetada. Confere também se os trechos de cada rota voltam na mesma ordem.
+
+Uso: python benchmarks/benchmark_enriquecimento.py [equipes] [servicos_por_equipe] [latencia_s]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from google_directions import obter_distancia_real_google, dividir_em_consultas, enriquecer_rotas
+from servidor_directions_falso import iniciar_servidor
+
+POLO_NITEROI = (-22.90684155, -43.06050544)
+CHAVE_FALSA = "chave-de-teste"
+
+
+def gerar_rotas(equipes, servicos_por_equipe, semente=42):
+    rng = np.random.default_rng(semente)
+    rotas = []
+    for _ in range(equipes):
+        pontos = rng.normal(0, 0.03, size=(servicos_por_equipe, 2)) + np.array(POLO_NITEROI)
+        rotas.append((POLO_NITEROI, [tuple(p) for p in pontos.tolist()]))
+    return rotas
+
+
+def enriquecer_sequencial(rotas, url):
+    """Reproduz o laço anterior: uma rota por vez e um trecho de 27 pontos por vez."""
+    resultado = []
+    for deposito, pontos in rotas:
+        legs_rota = []
+        for trecho in dividir_em_consultas([deposito] + pontos + [deposito]):
+            legs = obter_distancia_real_google(trecho[0], trecho[-1], trecho[1:-1], CHAVE_FALSA, url_base=url, tentativas=1)
+            if not legs:
+                legs_rota = None
+                break
+            legs_rota.extend(legs)
+        resultado.append(legs_rota)
+    return resultado
+
+
+def main():
+    equipes = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    servicos_por_equipe = int(sys.argv[2]) if len(sys.argv) > 2 else 35
+    latencia = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    rotas = gerar_rotas(equipes, servicos_por_equipe)
+    servidor, url = iniciar_servidor(latencia_s=latencia)
+    print(f"{equipes} rotas com {servicos_por_equipe} serviços, latência simulada de {latencia}s por consulta.\n")
+
+    inicio = time.perf_counter()
+    legs_sequencial = enriquecer_sequencial(rotas, url)
+    tempo_sequencial = time.perf_counter() - inicio
+    consultas = servidor.requisicoes
+
+    inicio = time.perf_counter()
+    legs_paralelo = enriquecer_rotas(rotas, CHAVE_FALSA, url_base=url)
+    tempo_paralelo = time.perf_counter() - inicio
+    servidor.shutdown()
+
+    ordem_ok = legs_sequencial == legs_paralelo and all(legs is not None and len(legs) == servicos_por_equipe + 1 for legs in legs_paralelo)
+    print(f"{'Medição':<30}{'Sequencial':>14}{'Paralelo':>14}")
+    print(f"{'Tempo total':<30}{tempo_sequencial:>12.2f} s{tempo_paralelo:>12.2f} s")
+    print(f"{'Consultas à API':<30}{consultas:>14}{servidor.requisicoes - consultas:>14}")
+    print(f"\nGanho: {tempo_sequencial / tempo_paralelo:.1f}x (trechos por rota: {'OK' if ordem_ok else 'DIVERGENTES'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark das consultas de dia restrito: conjuntos remontados do DataFrame a cada consulta (como
+antes) x IndiceFeriados pré-calculado.
+
+Usa o feriados.xlsx do repositório e consulta todos os dias de um ano para os municípios de todos
+os polos (como faria um planejamento de vários dias), conferindo que as formas concordam.
+
+Uso: python benchmarks/benchmark_feriados.py [ano]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from motor_roteirizacao import verificar_dia_restrito, IndiceFeriados
+
+
+def dia_restrito_antigo(data_atual, municipios_do_polo, df_feriados):
+    """verificar_dia_restrito anterior ao IndiceFeriados: monta os conjuntos a partir do DataFrame em cada chamada."""
+    if data_atual.weekday() in [4, 5, 6]:
+        dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+        return True, f"{dias_semana[data_atual.weekday()]}"
+    feriados_gerais = set(df_feriados[df_feriados['COD_MUNICIPIO'] == 0]['FECHA'])
+    feriados_municipais = set(df_feriados[df_feriados['Municipio'].isin(municipios_do_polo)]['FECHA'])
+    datas_restritas = set()
+    for feriado in feriados_gerais.union(feriados_municipais):
+        if pd.notna(feriado):
+            datas_restritas.add(feriado.date())
+            datas_restritas.add(feriado.date() - timedelta(days=1))
+    if data_atual in datas_restritas:
+        return True, "Feriado ou Véspera de Feriado"
+    return False, ""
+
+
+def main():
+    ano = int(sys.argv[1]) if len(sys.argv) > 1 else 2026
+    df_feriados = pd.read_excel(os.path.join(RAIZ, 'feriados.xlsx'))
+    df_feriados['Municipio'] = df_feriados['Municipio'].astype(str).str.strip().str.upper()
+    df_feriados['FECHA'] = pd.to_datetime(df_feriados['FECHA'], errors='coerce')
+    municipios = sorted(set(df_feriados['Municipio']) - {'TODOS'})
+    dias = [date(ano, 1, 1) + timedelta(days=dia) for dia in range(365)]
+    print(f"{len(df_feriados)} feriados, {len(municipios)} municípios, {len(dias)} dias de {ano}.\n")
+
+    inicio = time.perf_counter()
+    antigo = [dia_restrito_antigo(dia, municipios, df_feriados) for dia in dias]
+    tempo_antigo = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    pelo_dataframe = [verificar_dia_restrito(dia, municipios, df_feriados) for dia in dias]
+    tempo_dataframe = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice = IndiceFeriados(df_feriados)
+    tempo_indice_montagem = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    pelo_indice = [verificar_dia_restrito(dia, municipios, indice) for dia in dias]
+    tempo_indice = time.perf_counter() - inicio
+
+    print(f"{'Antigo':<22}{tempo_antigo:>9.3f}s  ({tempo_antigo / len(dias) * 1000:.2f} ms por dia)")
+    print(f"{'Índice a cada chamada':<22}{tempo_dataframe:>9.3f}s  ({tempo_dataframe / len(dias) * 1000:.2f} ms por dia)")
+    print(f"{'IndiceFeriados':<22}{tempo_indice:>9.3f}s  ({tempo_indice / len(dias) * 1000:.3f} ms por dia, montagem {tempo_indice_montagem * 1000:.1f} ms)")
+    print(f"\nResultados iguais: {antigo == pelo_dataframe == pelo_indice} ({sum(restrito for restrito, _ in pelo_indice)} dias restritos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark do histórico de trechos do Fator K: CSV (';' com BOM) x armazém colunar.
+
+Gera um ano sintético de trechos (polos x dias úteis x trechos por dia), grava como
+CSV e no armazém Parquet (uma gravação por dia, como na operação) e mede a leitura
+completa e a consulta "polo X nos últimos 30 dias", antes e depois da compactação.
+
+Uso: python benchmarks/benchmark_historico.py [polos] [dias] [trechos_por_dia]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from historico_colunar import ArmazemHistorico
+
+
+def gerar_historico(polos, dias, trechos_por_dia, semente=0):
+    rng = np.random.default_rng(semente)
+    nomes_polos = [f"POLO {i}" for i in range(polos)]
+    datas = pd.bdate_range('2025-01-01', periods=dias).strftime('%Y-%m-%d')
+    total = polos * dias * trechos_por_dia
+    df = pd.DataFrame({
+        'Polo': np.repeat(nomes_polos, dias * trechos_por_dia),
+        'Data': np.tile(np.repeat(datas, trechos_por_dia), polos),
+        'Distancia_Reta_m': rng.uniform(50, 20000, total),
+    })
+    df['Distancia_Real_m'] = (df['Distancia_Reta_m'] * rng.uniform(1.1, 3.0, total)).astype(np.int64)
+    return df, pd.Timestamp(datas[-1]).date()
+
+
+def medir(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return (time.perf_counter() - inicio) * 1000, resultado
+
+
+def main():
+    polos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    dias = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    trechos_por_dia = int(sys.argv[3]) if len(sys.argv) > 3 else 150
+    df, ultima_data = gerar_historico(polos, dias, trechos_por_dia)
+    print(f"Histórico sintético: {len(df)} trechos ({polos} polos x {dias} dias x {trechos_por_dia}).\n")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = os.path.join(pasta, 'historico_trechos_k.csv')
+        df.to_csv(caminho_csv, sep=';', index=False, encoding='utf-8-sig')
+        armazem = ArmazemHistorico(os.path.join(pasta, 'historico_k'))
+        tempo_gravacao, _ = medir(lambda: [armazem.acrescentar('trechos', grupo) for _, grupo in df.groupby('Data')])
+        arquivos_diarios = len(armazem.dataset('trechos').files)
+
+        def consulta_csv():
+            historico = pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig')
+            return historico[(historico['Polo'] == 'POLO 3') & (historico['Data'] > (ultima_data - pd.Timedelta(days=30)).strftime('%Y-%m-%d'))]
+
+        tempo_csv_total, _ = medir(lambda: pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig'))
+        tempo_csv_filtro, filtrado_csv = medir(consulta_csv)
+        tempo_diario_total, _ = medir(lambda: armazem.ler('trechos'))
+        tempo_diario_filtro, filtrado = medir(lambda: armazem.ler('trechos', 'POLO 3', 30, data_referencia=ultima_data))
+        tempo_compactacao, _ = medir(lambda: armazem.compactar('trechos'))
+        tempo_compactado_total, total = medir(lambda: armazem.ler('trechos'))
+        tempo_compactado_filtro, _ = medir(lambda: armazem.ler('trechos', 'POLO 3', 30, data_referencia=ultima_data))
+
+    print(f"Gravação diária no armazém: {tempo_gravacao / dias:.1f} ms/dia ({arquivos_diarios} arquivos); compactação: {tempo_compactacao / 1000:.1f}s\n")
+    print(f"{'Leitura':<32}{'CSV':>10}{'Parquet diário':>16}{'Compactado':>13}")
+    print(f"{'Histórico completo':<32}{tempo_csv_total:>7.0f} ms{tempo_diario_total:>13.0f} ms{tempo_compactado_total:>10.0f} ms")
+    print(f"{'Polo X, últimos 30 dias':<32}{tempo_csv_filtro:>7.0f} ms{tempo_diario_filtro:>13.0f} ms{tempo_compactado_filtro:>10.0f} ms")
+    print(f"\nLinhas conferidas: {'OK' if len(total) == len(df) and len(filtrado) == len(filtrado_csv) else 'DIVERGENTES'}")
+
+
+if __name__ == "__main__":
+    main()
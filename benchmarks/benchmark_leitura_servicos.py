@@ -0,0 +1,82 @@
+"""
+Benchmark da leitura de servicos.csv: as 46 colunas como texto (leitura antiga) x só as
+colunas usadas, com tipos e vírgula decimal, pelo leitor C do pandas e pelo pyarrow.
+
+Gera um arquivo sintético no formato do sistema comercial (';', vírgula decimal) e mede
+a leitura e a leitura + preparar_dados para cada leitor.
+
+Uso: python benchmarks/benchmark_leitura_servicos.py [linhas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_roteirizacao import COLUNAS_SERVICOS, carregar_dados_servicos, preparar_dados, pa_csv
+
+POLOS = {'NITERÓI': (-22.9068, -43.0605, 'NITEROI'), 'MARICÁ': (-22.9346, -42.8293, 'MARICA'), 'ANGRA': (-22.9852, -44.2972, 'ANGRA DOS REIS')}
+
+
+def gerar_servicos(linhas, caminho, semente=0):
+    rng = np.random.default_rng(semente)
+    indices_polo = np.arange(linhas) % len(POLOS)
+    centros = np.array([coordenadas[:2] for coordenadas in POLOS.values()])
+    df = pd.DataFrame('', index=range(linhas), columns=COLUNAS_SERVICOS)
+    df['TDC'] = (34000000 + np.arange(linhas)).astype(str)
+    df['Centro Operativo'] = df['Polo'] = np.array(list(POLOS))[indices_polo]
+    df['MUNICIPIO'] = np.array([municipio for *_, municipio in POLOS.values()])[indices_polo]
+    df['LATITUD'] = pd.Series(centros[indices_polo, 0] + rng.normal(0, 0.03, linhas)).map('{:.4f}'.format).str.replace('.', ',')
+    df['LONGITUD'] = pd.Series(centros[indices_polo, 1] + rng.normal(0, 0.03, linhas)).map('{:.4f}'.format).str.replace('.', ',')
+    df['valor_factura_sum'] = pd.Series(rng.uniform(50, 6000, linhas)).map('{:.2f}'.format).str.replace('.', ',')
+    df['tipo_servico'] = rng.choice(['Corte', 'Recorte'], linhas)
+    df['Executor_Solicitado'] = rng.choice(['Leve', 'Leve', 'Cesto'], linhas)
+    df['Trâmite_Solicitado'] = rng.choice(['Medidor', 'Poste', 'Ramal'], linhas)
+    df['TEXTO_DIRECCION_COMPLETA'] = 'RUA DE TESTE, ' + df['TDC'] + ' - CENTRO'
+    df.to_csv(caminho, sep=';', index=False)
+
+
+def configuracao_sintetica():
+    df_polos = pd.DataFrame({'Centro Operativo': list(POLOS), 'latitude': [str(c[0]).replace('.', ',') for c in POLOS.values()], 'longitude': [str(c[1]).replace('.', ',') for c in POLOS.values()]})
+    df_equipes = pd.DataFrame({'Centro Operativo': list(POLOS), 'Quantidade_equipes_Leves': 10, 'Capacidade_maxima_Leves': 15, 'Quantidades_equipes_Cesto': 5, 'Capacidade_maxima_Cesto': 10})
+    df_feriados = pd.DataFrame({'FECHA': ['2025-12-25'], 'Municipio': ['NITEROI'], 'COD_MUNICIPIO': [0]})
+    combinacoes = [(equipe, servico, mix) for equipe in ('Leve', 'Cesto') for servico in ('Corte', 'Recorte') for mix in ('Medidor', 'Poste', 'Ramal')]
+    df_tempos = pd.DataFrame(combinacoes, columns=['Equipe', 'Serviço', 'Mix_solic'])
+    df_tempos['Tempo Execução'] = '00:30:00'
+    df_tempos['Total'] = '08:00'
+    df_tempos['Improdutividade_serviços_extras'] = '2'
+    df_fator_k = pd.DataFrame({'Centro Operativo': list(POLOS), 'Fator K Estimado': '1,5'})
+    return df_polos, df_equipes, df_feriados, df_tempos, df_fator_k
+
+
+def medir(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    df_polos, df_equipes, df_feriados, df_tempos, df_fator_k = configuracao_sintetica()
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'servicos.csv')
+        gerar_servicos(linhas, caminho)
+        print(f"servicos.csv sintético: {linhas} linhas, {os.path.getsize(caminho) / 1e6:.1f} MB\n")
+
+        leituras = {'46 colunas (antigo)': lambda: pd.read_csv(caminho, encoding='utf-8', sep=';', header=None, names=COLUNAS_SERVICOS, skiprows=1, low_memory=False, on_bad_lines='skip'),
+                    'projeção + tipos, leitor C': lambda: carregar_dados_servicos(caminho, leitor='c')}
+        if pa_csv is not None:
+            leituras['projeção + tipos, pyarrow'] = lambda: carregar_dados_servicos(caminho, leitor='pyarrow')
+
+        print(f"{'Leitura':<30}{'Ler':>9}{'Linhas/s':>12}{'Ler + preparar':>17}")
+        for nome, ler in leituras.items():
+            tempo_leitura, _ = medir(ler)
+            tempo_total, (df_servicos, *_) = medir(lambda: preparar_dados(df_polos, df_equipes, ler(), df_feriados, df_tempos, df_fator_k, avisar=lambda aviso: None))
+            print(f"{nome:<30}{tempo_leitura:>8.2f}s{linhas / tempo_leitura:>12,.0f}{tempo_total:>16.2f}s   ({len(df_servicos)} serviços preparados)")
+
+
+if __name__ == "__main__":
+    main()
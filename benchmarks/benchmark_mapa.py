@@ -0,0 +1,94 @@
+"""
+Benchmark da montagem do mapa das rotas: mapa antigo (iterrows, um folium.Marker com popup HTML por
+serviço e um filtro da tabela por equipe) x modos de mapa_rotas.gerar_mapa_de_rotas.
+
+Gera rotas sintéticas em torno de cada polo de polos.csv (como num mapa de TODOS os polos) e mede,
+para cada forma, o tempo de montagem do mapa, o tempo de gerar o HTML e o tamanho do HTML.
+
+Uso: python benchmarks/benchmark_mapa.py [equipes_por_polo] [servicos_por_equipe] [simplificar_m]
+"""
+import os
+import sys
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from mapa_rotas import gerar_mapa_de_rotas, html_do_mapa, CORES_EQUIPES
+
+
+def gerar_rotas_sinteticas(df_polos, equipes_por_polo, servicos_por_equipe, semente=42):
+    """(rotas no formato de rotas_otimizadas.csv, coordenadas dos serviços como em df_servicos)."""
+    rng = np.random.default_rng(semente)
+    por_polo = equipes_por_polo * servicos_por_equipe
+    total = len(df_polos) * por_polo
+    rotas = pd.DataFrame({
+        'Polo': np.repeat(df_polos['Centro Operativo'].to_numpy(), por_polo),
+        'Equipe': np.tile(np.repeat([f"Equipe Leve {equipe + 1}" for equipe in range(equipes_por_polo)], servicos_por_equipe), len(df_polos)),
+        'Ordem_Visita': np.tile(np.arange(1, servicos_por_equipe + 1), len(df_polos) * equipes_por_polo),
+        'ID_Servico': np.arange(total).astype(str),
+        'Valor_Divida': rng.uniform(50, 6000, total),
+    })
+    servicos = pd.DataFrame({
+        'ID_Servico': rotas['ID_Servico'],
+        'Latitude': np.repeat(df_polos['latitude'].to_numpy(), por_polo) + rng.normal(0, 0.03, total),
+        'Longitude': np.repeat(df_polos['longitude'].to_numpy(), por_polo) + rng.normal(0, 0.03, total),
+    })
+    return rotas, servicos
+
+
+def mapa_antigo(df_rotas, df_polos_info, df_servicos_info, polos_processados):
+    """Reproduz o gerar_mapa_de_rotas anterior do roteirizador_com_regras.py (sem gravar o arquivo)."""
+    polos_filtrados = df_polos_info[df_polos_info['Centro Operativo'].isin(polos_processados)]
+    mapa = folium.Map(location=[polos_filtrados['latitude'].mean(), polos_filtrados['longitude'].mean()], zoom_start=10)
+    df_rotas_com_coords = pd.merge(df_rotas, df_servicos_info[['ID_Servico', 'Latitude', 'Longitude']], on='ID_Servico')
+    df_rotas_com_coords.rename(columns={'Latitude': 'LATITUD', 'Longitude': 'LONGITUD'}, inplace=True)
+    df_rotas_com_coords['Equipe_Unica'] = df_rotas_com_coords['Polo'] + " - " + df_rotas_com_coords['Equipe']
+    equipes_unicas = df_rotas_com_coords['Equipe_Unica'].unique()
+    mapa_cores_equipe = {equipe_unica: CORES_EQUIPES[i % len(CORES_EQUIPES)] for i, equipe_unica in enumerate(equipes_unicas)}
+    for _, polo in polos_filtrados.iterrows():
+        folium.Marker(location=[polo['latitude'], polo['longitude']], popup=f"<strong>Polo: {polo['Centro Operativo']}</strong>", icon=folium.Icon(color='black', icon='industry', prefix='fa')).add_to(mapa)
+    for equipe_unica in equipes_unicas:
+        rota_da_equipe = df_rotas_com_coords[df_rotas_com_coords['Equipe_Unica'] == equipe_unica].sort_values(by='Ordem_Visita')
+        polo_coords = df_polos_info[df_polos_info['Centro Operativo'] == rota_da_equipe['Polo'].iloc[0]][['latitude', 'longitude']].iloc[0]
+        pontos_da_rota = [tuple(polo_coords)] + list(zip(rota_da_equipe['LATITUD'], rota_da_equipe['LONGITUD'])) + [tuple(polo_coords)]
+        cor_da_rota = mapa_cores_equipe[equipe_unica]
+        folium.PolyLine(pontos_da_rota, color=cor_da_rota, weight=3, opacity=0.8, tooltip=f"<strong>{equipe_unica}</strong>").add_to(mapa)
+        for _, servico in rota_da_equipe.iterrows():
+            popup_html = (f"<strong>Equipe:</strong> {servico['Equipe']}<br><strong>Polo:</strong> {servico['Polo']}<br><strong>Ordem:</strong> {servico['Ordem_Visita']}<br>"
+                          f"<strong>ID Serviço:</strong> {servico['ID_Servico']}<br><strong>Dívida:</strong> R$ {servico['Valor_Divida']:.2f}")
+            folium.Marker(location=[servico['LATITUD'], servico['LONGITUD']], popup=folium.Popup(popup_html, max_width=300), icon=folium.Icon(color=cor_da_rota, icon='info-sign')).add_to(mapa)
+    return mapa
+
+
+def main():
+    equipes_por_polo = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    servicos_por_equipe = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    simplificar_m = float(sys.argv[3]) if len(sys.argv) > 3 else 150
+    df_polos = pd.read_csv(os.path.join(RAIZ, 'polos.csv'), sep=';', encoding='utf-8-sig', decimal=',', usecols=['Centro Operativo', 'latitude', 'longitude'])
+    polos = df_polos['Centro Operativo'].tolist()
+    rotas, servicos = gerar_rotas_sinteticas(df_polos, equipes_por_polo, servicos_por_equipe)
+    print(f"{len(polos)} polos x {equipes_por_polo} equipes x {servicos_por_equipe} serviços = {len(rotas)} serviços no mapa.\n")
+
+    formas = [
+        ('Antigo', lambda: (mapa_antigo(rotas, df_polos, servicos, polos), None)),
+        ('Marcadores', lambda: gerar_mapa_de_rotas(rotas, df_polos, servicos, polos, modo='marcadores')),
+        ('Rápido', lambda: gerar_mapa_de_rotas(rotas, df_polos, servicos, polos, modo='rapido')),
+        (f'Rápido ({simplificar_m:g} m)', lambda: gerar_mapa_de_rotas(rotas, df_polos, servicos, polos, modo='rapido', simplificar_m=simplificar_m)),
+    ]
+    print(f"{'Mapa':<20}{'Montagem':>10}{'HTML':>10}{'Tamanho':>12}")
+    for nome, montar in formas:
+        inicio = time.perf_counter()
+        mapa, _ = montar()
+        tempo_montagem = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        html = html_do_mapa(mapa)
+        tempo_html = time.perf_counter() - inicio
+        print(f"{nome:<20}{tempo_montagem:>9.2f}s{tempo_html:>9.2f}s{len(html.encode('utf-8')) / 2 ** 20:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
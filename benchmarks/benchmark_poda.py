@@ -0,0 +1,37 @@
+"""
+Benchmark da poda de candidatos antes do modelo x todos os serviços no modelo.
+
+Usa os grupos de NITERÓI reconstruídos dos dados de exemplo (ver benchmark_decomposicao.py) e
+resolve cada um com e sem poda, para as três estratégias, comparando serviços no modelo,
+tempo de solver, função objetivo (sobre o grupo inteiro) e serviços atendidos.
+
+Uso: python benchmarks/benchmark_poda.py [restricao]
+"""
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark_decomposicao import POLO, EQUIPES, carregar_grupos_exemplo, carregar_polo, objetivo
+from resolvedor import montar_problema_grupo, resolver_grupo
+
+
+def main():
+    restricao = sys.argv[1] if len(sys.argv) > 1 else '2'
+    grupos, (info_polo, equipes) = carregar_grupos_exemplo(), carregar_polo()
+    print(f"{POLO}: restrição {restricao}.\n")
+    print(f"{'Grupo':<14}{'Estratégia':>11}{'Poda':>6}{'No modelo':>11}{'Solver':>9}{'Objetivo':>13}{'Atendidos':>11}  Motivos")
+    for tipo_equipe, servicos in grupos.items():
+        coluna_equipes, coluna_capacidade = EQUIPES[tipo_equipe]
+        for estrategia in ('1', '2', '3'):
+            for podar in (False, True):
+                parametros = {'estrategia': estrategia, 'restricao': restricao, 'JORNADA_TRABALHO_MIN': 480, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': 8,
+                              'MINUTOS_POR_KM': 3, 'FATOR_CUSTO_DISTANCIA': 50, 'podar_candidatos': podar}
+                problema = montar_problema_grupo(POLO, tipo_equipe, info_polo, servicos, int(equipes[coluna_equipes]), int(equipes[coluna_capacidade]), parametros)
+                resultado = resolver_grupo(problema)
+                print(f"{f'{tipo_equipe} ({len(servicos)})':<14}{estrategia:>11}{'sim' if podar else 'não':>6}{len(servicos) - len(resultado['podados']):>11}"
+                      f"{resultado['tempo_solver_s']:>8.1f}s{objetivo(problema, resultado):>13}{sum(map(len, resultado['rotas'])):>11}  {dict(Counter(resultado['podados'].values()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark da reotimização a partir de um plano anterior (warm start) x resolver do zero.
+
+Resolve um grupo sintético, altera o dia (serviços novos, serviços cancelados e equipes
+a menos) e resolve o grupo alterado das duas formas, comparando tempo de solver,
+serviços atendidos e km das rotas.
+
+Uso: python benchmarks/benchmark_reotimizacao.py [servicos] [equipes] [novos] [cancelados] [equipes_a_menos]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resolvedor import montar_problema_grupo, resolver_grupo
+
+DEPOSITO = (-22.9068, -43.0605)
+PARAMETROS = {'estrategia': '1', 'restricao': '2', 'JORNADA_TRABALHO_MIN': 480, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': 2,
+              'MINUTOS_POR_KM': 3, 'FATOR_CUSTO_DISTANCIA': 50}
+
+
+def gerar_servicos(quantidade, rng, primeiro_id=0):
+    return pd.DataFrame({
+        'ID_Servico': [str(34000000 + primeiro_id + i) for i in range(quantidade)],
+        'Latitude': DEPOSITO[0] + rng.normal(0, 0.04, quantidade),
+        'Longitude': DEPOSITO[1] + rng.normal(0, 0.04, quantidade),
+        'Tempo_Execucao_Min': rng.choice([15.0, 20.0, 30.0], quantidade),
+        'Valor_Divida': rng.uniform(50, 6000, quantidade),
+    })
+
+
+def montar(servicos, num_equipes):
+    info_polo = pd.Series({'latitude': DEPOSITO[0], 'longitude': DEPOSITO[1], 'Fator_K_Estimado': 1.5})
+    return montar_problema_grupo('POLO', 'LEVE', info_polo, servicos, num_equipes, 20, PARAMETROS)
+
+
+def resumo(resultado):
+    return f"{resultado['tempo_solver_s']:>6.1f}s de {resultado['tempo_limite_s']:>5.1f}s   atendidos {sum(map(len, resultado['rotas'])):>4}   km {sum(map(sum, resultado['trechos_m'])) / 1000:>7.1f}"
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    num_equipes = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    novos = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+    cancelados = int(sys.argv[4]) if len(sys.argv) > 4 else 15
+    equipes_a_menos = int(sys.argv[5]) if len(sys.argv) > 5 else 2
+    rng = np.random.default_rng(0)
+
+    servicos = gerar_servicos(quantidade, rng)
+    plano = resolver_grupo(montar(servicos, num_equipes))
+    print(f"Plano original ({quantidade} serviços, {num_equipes} equipes): {resumo(plano)}")
+    rotas_plano = [servicos['ID_Servico'].iloc[rota].tolist() for rota in plano['rotas']]
+
+    servicos_dia = pd.concat([servicos.drop(rng.choice(quantidade, cancelados, replace=False)), gerar_servicos(novos, rng, quantidade)], ignore_index=True)
+    equipes_dia = num_equipes - equipes_a_menos
+    print(f"Alterações: {novos} serviços novos, {cancelados} cancelados, {equipes_a_menos} equipe(s) a menos.\n")
+
+    do_zero = resolver_grupo(montar(servicos_dia, equipes_dia))
+    problema = montar(servicos_dia, equipes_dia)
+    posicoes = {id_servico: posicao for posicao, id_servico in enumerate(servicos_dia['ID_Servico'])}
+    problema['rotas_iniciais'] = [[posicoes[i] for i in rota if i in posicoes] for rota in rotas_plano]
+    reotimizado = resolver_grupo(problema)
+    print(f"{'Do zero':<24}{resumo(do_zero)}")
+    print(f"{'A partir do plano':<24}{resumo(reotimizado)}{'' if reotimizado['partiu_do_plano_anterior'] else '   (plano inviável, resolvido do zero)'}")
+
+
+if __name__ == "__main__":
+    main()
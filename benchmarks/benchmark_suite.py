@@ -0,0 +1,224 @@
+"""
+Suíte de benchmark reprodutível da roteirização completa, com linha de base e checagem de regressão.
+
+Gera instâncias sintéticas de servicos.csv (semente fixa) em torno dos depósitos reais de polos.csv, nos
+tamanhos pedidos, e roda o pipeline inteiro sem rede (leitura, preparar_dados, filtro do dia e
+executar_roteirizacao, sem Google Directions) para cada combinação de estratégia x restrição e cada
+configuração de equipes: a de equipes.csv ('real') ou LEVESxCESTO equipes por polo (ex.: '6x3'), com as
+capacidades de equipes.csv. Cada caso roda num processo novo e registra tempo de relógio, pico de memória
+(RSS máximo do processo; só onde o módulo 'resource' existe), serviços roteirizados, km, km por serviço e a
+função objetivo (soma dos custos finais do OR-Tools nos grupos).
+
+Com --gravar-baseline os resultados viram a linha de base (JSON); com --comparar, cada caso é comparado ao da
+linha de base e o código de saída é 1 se algum piorar além do limite (tempo e memória: --limite-desempenho;
+objetivo, serviços e km por serviço: --limite-qualidade). O solver tem limite de tempo, então tempo e
+objetivo variam um pouco entre rodadas: compare na mesma máquina.
+
+Uso: python benchmarks/benchmark_suite.py [--tamanhos 50 500 5000] [--estrategias 1 2 3] [--restricoes 1 2]
+     [--equipes real 6x3] [--polos ANGRA MARICÁ NITERÓI] [--semente 0] [--processos 1] [--instancias PASTA]
+     [--saida resultados.json] [--gravar-baseline ARQUIVO] [--comparar ARQUIVO]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from motor_roteirizacao import (COLUNAS_SERVICOS, ID_RETORNO_DEPOSITO, MINUTOS_POR_KM, FATOR_CUSTO_DISTANCIA, carregar_dados_config,
+                                carregar_dados_servicos, preparar_dados, filtrar_servicos, executar_roteirizacao)
+from instrumentacao import Instrumentacao
+
+TAMANHOS_PADRAO = [50, 500]
+POLOS_PADRAO = ['ANGRA', 'MARICÁ', 'NITERÓI']
+DATA_DESPACHO = pd.Timestamp('2026-10-20').date()  # Terça-feira sem feriado: cortes e recortes saem
+ESPALHAMENTO_GRAUS = 0.03  # Desvio das coordenadas em torno do depósito (~3 km)
+FRACAO_COM_ANS = 0.3  # Serviços com prazo do ANS no fim do dia do despacho
+LIMITE_REGRESSAO_DESEMPENHO = 0.25  # Tempo e memória: piora relativa tolerada
+LIMITE_REGRESSAO_QUALIDADE = 0.05  # Objetivo, serviços roteirizados e km por serviço
+# Métrica: True se maior é melhor
+METRICAS_DESEMPENHO = {'tempo_s': False, 'memoria_pico_mb': False}
+METRICAS_QUALIDADE = {'objetivo': False, 'servicos_roteirizados': True, 'km_por_servico': False}
+
+
+def gerar_instancia(df_polos, polos, quantidade, caminho, semente=0):
+    """servicos.csv sintético no formato do sistema comercial (';', vírgula decimal), repartido entre 'polos'."""
+    rng = np.random.default_rng(semente)
+    depositos = df_polos.set_index('Centro Operativo').loc[polos, ['latitude', 'longitude']]
+    depositos = depositos.apply(lambda coluna: pd.to_numeric(coluna.astype(str).str.replace(',', '.'))).to_numpy()
+    indices_polo = np.arange(quantidade) % len(polos)
+    df = pd.DataFrame('', index=range(quantidade), columns=COLUNAS_SERVICOS)
+    df['TDC'] = (34000000 + np.arange(quantidade)).astype(str)
+    df['Centro Operativo'] = df['Polo'] = np.array(polos)[indices_polo]
+    df['MUNICIPIO'] = df['Polo']
+    formatar = lambda valores, casas: pd.Series(valores).map(f'{{:.{casas}f}}'.format).str.replace('.', ',')
+    df['LATITUD'] = formatar(depositos[indices_polo, 0] + rng.normal(0, ESPALHAMENTO_GRAUS, quantidade), 5)
+    df['LONGITUD'] = formatar(depositos[indices_polo, 1] + rng.normal(0, ESPALHAMENTO_GRAUS, quantidade), 5)
+    df['valor_factura_sum'] = formatar(rng.uniform(50, 6000, quantidade), 2)
+    df['tipo_servico'] = rng.choice(['Corte', 'Recorte'], quantidade)
+    df['Executor_Solicitado'] = rng.choice(['Leve', 'Leve', 'Cesto'], quantidade)
+    df['Trâmite_Solicitado'] = rng.choice(['Medidor', 'Poste', 'Ramal'], quantidade)
+    df.loc[rng.random(quantidade) < FRACAO_COM_ANS, 'ANS_LEGAL'] = f"{DATA_DESPACHO.isoformat()} 18:00:00"
+    df['TEXTO_DIRECCION_COMPLETA'] = 'RUA DE TESTE, ' + df['TDC'] + ' - CENTRO'
+    df.to_csv(caminho, sep=';', index=False)
+
+
+def aplicar_equipes(df_equipes, configuracao):
+    """'real': equipes.csv como está; 'LxC': L equipes leves e C de cesto em todos os polos (capacidades de equipes.csv)."""
+    if configuracao == 'real': return df_equipes
+    leves, cesto = (int(quantidade) for quantidade in configuracao.lower().split('x'))
+    return df_equipes.assign(Quantidade_equipes_Leves=leves, Quantidades_equipes_Cesto=cesto)
+
+
+def rodar_caso(caso):
+    """Roda um caso no processo atual (um processo novo por caso, para o pico de memória ser só dele)."""
+    os.chdir(RAIZ)  # Arquivos de configuração
+    inicio = time.perf_counter()
+    df_polos, df_equipes, df_feriados, df_tempos, df_fator_k = carregar_dados_config()
+    df_servicos_raw = carregar_dados_servicos(caso['instancia'])
+    df_servicos, df_polos_completo, df_feriados, jornada_min, servicos_extras = preparar_dados(
+        df_polos, aplicar_equipes(df_equipes, caso['equipes']), df_servicos_raw, df_feriados, df_tempos, df_fator_k, avisar=lambda aviso: None)
+    df_filtrado = filtrar_servicos(df_servicos, caso['polos'], 'TODOS', DATA_DESPACHO, df_feriados)
+    parametros = {'estrategia': caso['estrategia'], 'restricao': caso['restricao'], 'JORNADA_TRABALHO_MIN': jornada_min,
+                  'SERVICOS_EXTRAS_IMPRODUTIVIDADE': servicos_extras, 'MINUTOS_POR_KM': MINUTOS_POR_KM, 'FATOR_CUSTO_DISTANCIA': FATOR_CUSTO_DISTANCIA,
+                  'num_processos': caso['processos'], 'data_despacho': DATA_DESPACHO}
+    instrumentacao = Instrumentacao()
+    rotas, _, _, _ = executar_roteirizacao(df_filtrado, df_polos_completo, parametros, instrumentacao=instrumentacao)
+    tempo_s = time.perf_counter() - inicio
+
+    servicos_roteirizados = int((rotas['ID_Servico'] != ID_RETORNO_DEPOSITO).sum()) if not rotas.empty else 0
+    km_total = float(rotas['KM_Trecho_Estimado'].sum()) if not rotas.empty else 0.0
+    custos = [grupo['custo_final'] for grupo in instrumentacao.grupos if grupo['custo_final'] is not None]
+    # ru_maxrss: KB no Linux, bytes no macOS
+    memoria_pico_mb = None
+    if resource is not None:
+        memoria_pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+    return {
+        'tempo_s': round(tempo_s, 2), 'memoria_pico_mb': round(memoria_pico_mb, 1) if memoria_pico_mb is not None else None,
+        'servicos_na_carteira': len(df_filtrado), 'servicos_roteirizados': servicos_roteirizados,
+        'km_total': round(km_total, 2), 'km_por_servico': round(km_total / servicos_roteirizados, 3) if servicos_roteirizados else None,
+        'objetivo': int(sum(custos)) if custos else None, 'grupos': len(instrumentacao.grupos),
+        'tempo_solver_s': round(sum(grupo['tempo_solver_s'] for grupo in instrumentacao.grupos), 2),
+        'status_solver': sorted({grupo['status_solver'] for grupo in instrumentacao.grupos if grupo['status_solver']}),
+    }
+
+
+def chave_do_caso(caso):
+    return f"n{caso['tamanho']}_equipes-{caso['equipes']}_estrategia-{caso['estrategia']}_restricao-{caso['restricao']}"
+
+
+def ambiente():
+    import ortools
+    return {'python': platform.python_version(), 'ortools': ortools.__version__, 'numpy': np.__version__, 'pandas': pd.__version__,
+            'plataforma': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def comparar(resultados, baseline, limite_desempenho, limite_qualidade):
+    """Linhas (caso, métrica, base, atual, variação, regressão) dos casos presentes nos dois arquivos."""
+    linhas = []
+    for chave, atual in resultados['casos'].items():
+        base = baseline['casos'].get(chave)
+        if base is None: continue
+        for metricas, limite in ((METRICAS_DESEMPENHO, limite_desempenho), (METRICAS_QUALIDADE, limite_qualidade)):
+            for metrica, maior_melhor in metricas.items():
+                valor_base, valor_atual = base.get(metrica), atual.get(metrica)
+                if not valor_base or valor_atual is None: continue
+                variacao = (valor_atual - valor_base) / abs(valor_base)
+                piora = -variacao if maior_melhor else variacao
+                linhas.append({'caso': chave, 'metrica': metrica, 'base': valor_base, 'atual': valor_atual,
+                               'variacao_%': round(100 * variacao, 1), 'regressao': piora > limite})
+    return pd.DataFrame(linhas, columns=['caso', 'metrica', 'base', 'atual', 'variacao_%', 'regressao'])
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Suíte de benchmark da roteirização com instâncias sintéticas.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help="Serviços por instância (ex.: 50 500 5000).")
+    parser.add_argument('--estrategias', nargs='+', choices=['1', '2', '3'], default=['1', '2', '3'], help="1 curta, 2 valiosa, 3 eficiente.")
+    parser.add_argument('--restricoes', nargs='+', choices=['1', '2'], default=['1', '2'], help="1 capacidade, 2 tempo.")
+    parser.add_argument('--equipes', nargs='+', default=['real'], help="'real' (equipes.csv) ou LEVESxCESTO por polo (ex.: 6x3).")
+    parser.add_argument('--polos', nargs='+', default=POLOS_PADRAO, help="Polos de polos.csv que recebem os serviços.")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--processos', type=int, default=1, help="num_processos da roteirização em cada caso.")
+    parser.add_argument('--instancias', help="Pasta onde gravar os servicos.csv sintéticos (padrão: pasta temporária).")
+    parser.add_argument('--saida', help="Grava os resultados desta rodada (JSON).")
+    parser.add_argument('--gravar-baseline', help="Grava os resultados como linha de base (JSON).")
+    parser.add_argument('--comparar', help="Linha de base (JSON) para a checagem de regressão.")
+    parser.add_argument('--limite-desempenho', type=float, default=LIMITE_REGRESSAO_DESEMPENHO, help="Piora relativa tolerada em tempo e memória.")
+    parser.add_argument('--limite-qualidade', type=float, default=LIMITE_REGRESSAO_QUALIDADE, help="Piora relativa tolerada em objetivo, serviços e km por serviço.")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    df_polos = pd.read_csv(os.path.join(RAIZ, 'polos.csv'), sep=';', encoding='utf-8-sig')
+    desconhecidos = set(args.polos) - set(df_polos['Centro Operativo'])
+    if desconhecidos:
+        print(f"Polos fora de polos.csv: {', '.join(sorted(desconhecidos))}")
+        return 2
+
+    pasta_temporaria = None if args.instancias else tempfile.TemporaryDirectory()
+    pasta = args.instancias or pasta_temporaria.name
+    os.makedirs(pasta, exist_ok=True)
+    resultados = {'ambiente': ambiente(), 'configuracao': {'polos': args.polos, 'semente': args.semente, 'processos': args.processos,
+                                                           'data_despacho': DATA_DESPACHO.isoformat()}, 'casos': {}}
+    print(f"{'Caso':<48}{'Tempo':>9}{'Memória':>11}{'Roteirizados':>14}{'Km':>10}{'Objetivo':>12}")
+    contexto = multiprocessing.get_context('spawn')
+    try:
+        for tamanho in args.tamanhos:
+            instancia = os.path.join(pasta, f"servicos_{tamanho}_semente{args.semente}.csv")
+            gerar_instancia(df_polos, args.polos, tamanho, instancia, args.semente + tamanho)
+            for equipes in args.equipes:
+                for estrategia in args.estrategias:
+                    for restricao in args.restricoes:
+                        caso = {'tamanho': tamanho, 'equipes': equipes, 'estrategia': estrategia, 'restricao': restricao,
+                                'polos': args.polos, 'processos': args.processos, 'instancia': instancia}
+                        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                            medidas = executor.submit(rodar_caso, caso).result()
+                        chave = chave_do_caso(caso)
+                        resultados['casos'][chave] = {'tamanho': tamanho, 'equipes': equipes, 'estrategia': estrategia, 'restricao': restricao, **medidas}
+                        memoria = f"{medidas['memoria_pico_mb']:.0f} MB" if medidas['memoria_pico_mb'] is not None else "n/d"
+                        print(f"{chave:<48}{medidas['tempo_s']:>8.1f}s{memoria:>11}{medidas['servicos_roteirizados']:>8} de {medidas['servicos_na_carteira']:<4}"
+                              f"{medidas['km_total']:>10.1f}{medidas['objetivo'] if medidas['objetivo'] is not None else 'n/d':>12}")
+    finally:
+        if pasta_temporaria is not None: pasta_temporaria.cleanup()
+
+    for caminho in (args.saida, args.gravar_baseline):
+        if caminho:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+            print(f"\nResultados gravados em '{caminho}'.")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)
+        if baseline.get('ambiente') != resultados['ambiente']:
+            print("\nAVISO: a linha de base foi gravada em outro ambiente; tempo e memória podem não ser comparáveis.")
+        comparacao = comparar(resultados, baseline, args.limite_desempenho, args.limite_qualidade)
+        if comparacao.empty:
+            print(f"\nNenhum caso em comum com '{args.comparar}'.")
+            return 0
+        print(f"\nComparação com '{args.comparar}' (limites: {args.limite_desempenho:.0%} desempenho, {args.limite_qualidade:.0%} qualidade):")
+        print(comparacao.to_string(index=False))
+        regressoes = comparacao[comparacao['regressao']]
+        if not regressoes.empty:
+            print(f"\nREGRESSÃO em {regressoes['caso'].nunique()} caso(s): {', '.join(sorted(set(regressoes['metrica'])))}.")
+            return 1
+        print("\nSem regressões além dos limites.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
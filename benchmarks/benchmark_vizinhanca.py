@@ -0,0 +1,71 @@
+"""
+Benchmark do grafo de vizinhança (k vizinhos por serviço) x matrizes NxN.
+
+Para grupos sintéticos de tamanhos crescentes, mede o tempo e o pico de memória (tracemalloc)
+para montar as estruturas de custo e tempo entregues ao OR-Tools: as matrizes completas mais as
+listas de RegisterTransitMatrix, contra o grafo de vizinhança e os dicionários dos callbacks.
+Depois resolve um grupo menor dos dois jeitos e compara tempo, função objetivo e atendidos.
+
+Uso: python benchmarks/benchmark_vizinhanca.py [vizinhos] [tamanho_resolucao] [tamanhos...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark_callbacks import gerar_grupo_sintetico, FATOR_K, MINUTOS_POR_KM, POLO_NITEROI
+from benchmark_decomposicao import objetivo
+from matrizes import extrair_dados_grupo, construir_matrizes_grupo, construir_grafo_vizinhanca
+from provedores_distancia import ProvedorHaversineK
+from resolvedor import montar_problema_grupo, resolver_grupo
+
+
+def medir(funcao):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico / 2 ** 20, resultado
+
+
+def estruturas_densas(dados_grupo):
+    matrizes = construir_matrizes_grupo(dados_grupo, FATOR_K, MINUTOS_POR_KM, incluir_tempo=True)
+    return matrizes, matrizes['custo'].tolist(), matrizes['tempo'].tolist()
+
+
+def estruturas_grafo(dados_grupo, vizinhos):
+    grafo = construir_grafo_vizinhanca(dados_grupo, vizinhos, MINUTOS_POR_KM, ProvedorHaversineK(FATOR_K), incluir_tempo=True)
+    return grafo, grafo.valores_por_origem('custo'), grafo.valores_por_origem('tempo')
+
+
+def main():
+    vizinhos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tamanho_resolucao = int(sys.argv[2]) if len(sys.argv) > 2 else 600
+    tamanhos = [int(tamanho) for tamanho in sys.argv[3:]] or [1000, 2000, 4000, 8000]
+    info_polo = {**POLO_NITEROI, 'Fator_K_Estimado': FATOR_K}
+
+    print(f"Estruturas de custo + tempo ({vizinhos} vizinhos por serviço)\n")
+    print(f"{'Serviços':>9}{'Arcos NxN':>13}{'Montagem':>10}{'Memória':>11}{'Arcos grafo':>13}{'Montagem':>10}{'Memória':>11}")
+    for tamanho in tamanhos:
+        dados_grupo = extrair_dados_grupo(info_polo, gerar_grupo_sintetico(tamanho))
+        tempo_denso, memoria_densa, _ = medir(lambda: estruturas_densas(dados_grupo))
+        tempo_grafo, memoria_grafo, (grafo, _, _) = medir(lambda: estruturas_grafo(dados_grupo, vizinhos))
+        print(f"{tamanho:>9}{(tamanho + 1) * tamanho:>13}{tempo_denso:>9.2f}s{memoria_densa:>8.0f} MB{len(grafo):>13}{tempo_grafo:>9.2f}s{memoria_grafo:>8.0f} MB")
+
+    print(f"\nResolução de um grupo de {tamanho_resolucao} serviços, 10 equipes, restrição por tempo:\n")
+    servicos = gerar_grupo_sintetico(tamanho_resolucao)
+    for k in (None, vizinhos):
+        parametros = {'estrategia': '1', 'restricao': '2', 'JORNADA_TRABALHO_MIN': 480, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': 8,
+                      'MINUTOS_POR_KM': MINUTOS_POR_KM, 'FATOR_CUSTO_DISTANCIA': 50, 'vizinhos_por_servico': k}
+        problema = montar_problema_grupo('NITERÓI', 'LEVE', info_polo, servicos, 10, 15, parametros)
+        resultado = resolver_grupo(problema)
+        print(f"{'Matriz NxN' if k is None else f'{k} vizinhos':<14}{resultado['tempo_solver_s']:>6.1f}s de {resultado['tempo_limite_s']:.1f}s"
+              f"   objetivo {objetivo(problema, resultado):>10}   atendidos {sum(map(len, resultado['rotas'])):>4}   arcos {resultado['arcos_no_modelo']}")
+
+
+if __name__ == "__main__":
+    main()
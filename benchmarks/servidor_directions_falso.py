@@ -0,0 +1,78 @@
+"""
+Servidor HTTP local que imita a Google Directions API, para testar o cache e o
+enriquecimento de rotas sem custo e sem rede.
+
+Os trechos são calculados em linha reta x 1,5 a 30 km/h. Uma latência artificial
+pode ser injetada em cada resposta. Uso isolado:
+    python benchmarks/servidor_directions_falso.py [porta] [latencia_s]
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from haversine import haversine, Unit
+
+FATOR_DISTANCIA = 1.5
+VELOCIDADE_M_POR_S = 30 / 3.6
+
+
+def _ponto(texto):
+    lat, lon = texto.split(",")
+    return float(lat), float(lon)
+
+
+def calcular_legs(origem, destino, waypoints):
+    pontos = [origem] + waypoints + [destino]
+    legs = []
+    for a, b in zip(pontos[:-1], pontos[1:]):
+        distancia = int(haversine(a, b, unit=Unit.METERS) * FATOR_DISTANCIA)
+        legs.append({'distance': {'value': distancia}, 'duration': {'value': int(distancia / VELOCIDADE_M_POR_S)}})
+    return legs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.requisicoes += 1
+        if servidor.latencia_s:
+            time.sleep(servidor.latencia_s)
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        if not params.get('key'):
+            corpo = {'status': 'REQUEST_DENIED', 'error_message': 'Chave ausente.'}
+        else:
+            waypoints_str = params.get('waypoints', '').replace('optimize:true|', '').replace('optimize:true', '')
+            waypoints = [_ponto(p) for p in waypoints_str.split('|') if p]
+            corpo = {'status': 'OK', 'routes': [{'legs': calcular_legs(_ponto(params['origin']), _ponto(params['destination']), waypoints)}]}
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor(porta=0, latencia_s=0.0):
+    """Sobe o servidor em uma thread e retorna (servidor, url_base). Use servidor.shutdown() ao final."""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), _Handler)
+    servidor.latencia_s, servidor.requisicoes, servidor.lock = latencia_s, 0, threading.Lock()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/maps/api/directions/json"
+
+
+if __name__ == "__main__":
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    servidor, url = iniciar_servidor(porta, latencia)
+    print(f"Directions falso em {url} (latência {latencia}s). Ctrl+C para encerrar.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
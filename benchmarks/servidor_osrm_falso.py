@@ -0,0 +1,77 @@
+"""
+Servidor HTTP local que imita o serviço /table do OSRM, para testar o provedor de
+distâncias 'osrm' sem subir um OSRM de verdade.
+
+As distâncias são a linha reta x 1,5 (mesma regra do servidor Directions falso).
+Como o OSRM, recusa consultas com mais coordenadas que 'max_coordenadas' (TooBig).
+Uso isolado:
+    python benchmarks/servidor_osrm_falso.py [porta] [max_coordenadas]
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from servidor_directions_falso import FATOR_DISTANCIA, VELOCIDADE_M_POR_S
+
+RAIO_MEDIO_TERRA_M = 6371008.8
+MAX_COORDENADAS_PADRAO = 100  # Valor padrão do --max-table-size do osrm-routed
+
+
+def _distancias(lat_o, lon_o, lat_d, lon_d):
+    lat_o, lon_o, lat_d, lon_d = map(np.radians, (lat_o, lon_o, lat_d, lon_d))
+    d = np.sin((lat_d[None, :] - lat_o[:, None]) * 0.5) ** 2 + np.cos(lat_o)[:, None] * np.cos(lat_d)[None, :] * np.sin((lon_d[None, :] - lon_o[:, None]) * 0.5) ** 2
+    return 2 * RAIO_MEDIO_TERRA_M * np.arcsin(np.sqrt(d)) * FATOR_DISTANCIA
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.requisicoes += 1
+        url = urlsplit(self.path)
+        partes = url.path.strip('/').split('/')  # table / v1 / perfil / coordenadas
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        coordenadas = np.array([[float(v) for v in par.split(',')] for par in partes[3].split(';')])  # lon, lat
+        if len(coordenadas) > servidor.max_coordenadas:
+            status, corpo = 400, {'code': 'TooBig', 'message': f'Too many table coordinates ({len(coordenadas)} > {servidor.max_coordenadas}).'}
+        else:
+            origens = [int(i) for i in params['sources'].split(';')] if 'sources' in params else list(range(len(coordenadas)))
+            destinos = [int(i) for i in params['destinations'].split(';')] if 'destinations' in params else list(range(len(coordenadas)))
+            distancias = _distancias(coordenadas[origens, 1], coordenadas[origens, 0], coordenadas[destinos, 1], coordenadas[destinos, 0]).round(1)
+            status, corpo = 200, {'code': 'Ok', 'distances': distancias.tolist()}
+            if 'duration' in params.get('annotations', 'duration'):
+                corpo['durations'] = (distancias / VELOCIDADE_M_POR_S).round(1).tolist()
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor(porta=0, max_coordenadas=MAX_COORDENADAS_PADRAO):
+    """Sobe o servidor em uma thread e retorna (servidor, url_base). Use servidor.shutdown() ao final."""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), _Handler)
+    servidor.max_coordenadas, servidor.requisicoes, servidor.lock = max_coordenadas, 0, threading.Lock()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+if __name__ == "__main__":
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    max_coordenadas = int(sys.argv[2]) if len(sys.argv) > 2 else MAX_COORDENADAS_PADRAO
+    servidor, url = iniciar_servidor(porta, max_coordenadas)
+    print(f"OSRM /table falso em {url} (até {max_coordenadas} coordenadas por consulta). Ctrl+C para encerrar.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
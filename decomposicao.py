@@ -0,0 +1,154 @@
+import math
+
+import numpy as np
+
+from matrizes import recortar_dados_grupo
+from instrumentacao import somar_etapas, somar_estatisticas_busca
+
+# ==============================================================================
+# DECOMPOSIÇÃO ESPACIAL DE GRUPOS GRANDES
+# Um grupo com muitos serviços e poucas equipes é dividido em subproblemas
+# geográficos (setores em torno do depósito ou k-means), cada um com parte das
+# equipes. Os subproblemas são resolvidos como grupos comuns (em paralelo) e as
+# rotas juntadas viram a solução inicial de uma busca local curta no grupo
+# inteiro, que troca serviços entre rotas e encaixa os que ficaram de fora.
+# ==============================================================================
+METODOS_DECOMPOSICAO = ('varredura', 'kmeans')
+MIN_SERVICOS_DECOMPOSICAO = 200  # Grupos menores são sempre resolvidos inteiros
+EQUIPES_POR_SUBPROBLEMA = 2
+ITERACOES_KMEANS = 25
+JANELA_MINIMA_SUBPROBLEMA_S = 1
+KM_POR_GRAU = 111.32
+
+
+def _coordenadas_planas(latitudes, longitudes):
+    """Coordenadas (x, y) em km dos serviços, em projeção equiretangular centrada no depósito (posição 0)."""
+    escala_longitude = math.cos(math.radians(latitudes[0]))
+    return np.column_stack(((longitudes[1:] - longitudes[0]) * escala_longitude, latitudes[1:] - latitudes[0])) * KM_POR_GRAU
+
+
+def repartir_equipes(num_equipes, tamanhos):
+    """Equipes de cada subproblema, proporcionais aos tamanhos (mínimo de 1; sobras pelos maiores restos)."""
+    tamanhos = np.asarray(tamanhos, dtype=np.float64)
+    cotas = tamanhos / tamanhos.sum() * (num_equipes - len(tamanhos))
+    equipes = 1 + np.floor(cotas).astype(int)
+    sobras = num_equipes - int(equipes.sum())
+    equipes[np.argsort(np.floor(cotas) - cotas, kind='stable')[:sobras]] += 1
+    return equipes.tolist()
+
+
+def setores_varredura(latitudes, longitudes, equipes_por_setor):
+    """
+    Divide os serviços em setores angulares em torno do depósito, com número de serviços proporcional
+    às equipes de cada setor. A varredura começa no maior vão angular, para não cortar uma região densa.
+    Retorna os índices (no grupo) dos serviços de cada setor.
+    """
+    pontos = _coordenadas_planas(latitudes, longitudes)
+    angulos = np.arctan2(pontos[:, 1], pontos[:, 0])
+    ordem = np.argsort(angulos, kind='stable')
+    vaos = np.diff(np.append(angulos[ordem], angulos[ordem[0]] + 2 * np.pi))
+    ordem = np.roll(ordem, -(int(np.argmax(vaos)) + 1))
+    cortes = np.round(np.cumsum(equipes_por_setor)[:-1] / sum(equipes_por_setor) * len(ordem)).astype(int)
+    return np.split(ordem, cortes)
+
+
+def grupos_kmeans(latitudes, longitudes, num_grupos, semente=0):
+    """K-means (inicialização k-means++ e iterações de Lloyd) sobre os serviços. Retorna os índices de cada grupo não vazio."""
+    pontos = _coordenadas_planas(latitudes, longitudes)
+    rng = np.random.default_rng(semente)
+    centros = pontos[[rng.integers(len(pontos))]]
+    while len(centros) < num_grupos:
+        distancias2 = ((pontos[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        if distancias2.sum() == 0: break
+        centros = np.vstack((centros, pontos[rng.choice(len(pontos), p=distancias2 / distancias2.sum())]))
+    for _ in range(ITERACOES_KMEANS):
+        rotulos = ((pontos[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        novos_centros = np.array([pontos[rotulos == g].mean(axis=0) if np.any(rotulos == g) else centros[g] for g in range(len(centros))])
+        if np.allclose(novos_centros, centros): break
+        centros = novos_centros
+    return [indices for indices in (np.flatnonzero(rotulos == g) for g in range(len(centros))) if len(indices)]
+
+
+def dividir_problema(problema):
+    """
+    Divide um grupo conforme problema['decomposicao'] ('varredura' ou 'kmeans') em subproblemas de
+    'equipes_por_subproblema' equipes. Retorna None se o grupo deve ser resolvido inteiro (sem método,
+    poucos serviços, equipes para um único subproblema ou reotimização de um plano anterior).
+    Retorna {'metodo', 'subproblemas', 'indices'}: cada subproblema é um problema comum de
+    resolver_grupo e 'indices' liga seus serviços aos do grupo.
+    """
+    metodo, dados_grupo, num_equipes = problema.get('decomposicao'), problema['dados_grupo'], problema['num_equipes']
+    num_subproblemas = math.ceil(num_equipes / max(1, int(problema.get('equipes_por_subproblema') or EQUIPES_POR_SUBPROBLEMA)))
+    if metodo not in METODOS_DECOMPOSICAO or problema.get('rotas_iniciais') or num_subproblemas < 2 \
+            or len(dados_grupo['ids_servico']) < max(MIN_SERVICOS_DECOMPOSICAO, num_subproblemas):
+        return None
+
+    if metodo == 'varredura':
+        equipes = repartir_equipes(num_equipes, [1] * num_subproblemas)
+        setores = setores_varredura(dados_grupo['latitudes'], dados_grupo['longitudes'], equipes)
+    else:
+        setores = grupos_kmeans(dados_grupo['latitudes'], dados_grupo['longitudes'], num_subproblemas)
+        equipes = repartir_equipes(num_equipes, [len(indices) for indices in setores])
+    # Subproblemas menores melhoram mais rápido: a janela sem melhora encolhe na proporção dos serviços
+    num_servicos = len(dados_grupo['ids_servico'])
+    subproblemas = [{**problema, 'dados_grupo': recortar_dados_grupo(dados_grupo, indices), 'num_equipes': equipes_setor, 'decomposicao': None,
+                     'janela_sem_melhora_s': max(JANELA_MINIMA_SUBPROBLEMA_S, problema['janela_sem_melhora_s'] * len(indices) / num_servicos)}
+                    for indices, equipes_setor in zip(setores, equipes)]
+    return {'metodo': metodo, 'subproblemas': subproblemas, 'indices': setores}
+
+
+def juntar_resultados(problema, divisao, resultados):
+    """Resultado do grupo inteiro a partir dos subproblemas: rotas em índices do grupo, equipes numeradas em sequência."""
+    rotas, trechos_m, atendidos, podados = [], [], set(), {}
+    for subproblema, indices, resultado in zip(divisao['subproblemas'], divisao['indices'], resultados):
+        podados.update({int(indices[servico]): motivo for servico, motivo in resultado['podados'].items()})
+        if not resultado['solucao_encontrada']:
+            rotas += [[] for _ in range(subproblema['num_equipes'])]
+            trechos_m += [[] for _ in range(subproblema['num_equipes'])]
+            continue
+        for rota, trechos in zip(resultado['rotas'], resultado['trechos_m']):
+            rotas.append(indices[rota].tolist())
+            trechos_m.append(trechos)
+            atendidos.update(rotas[-1])
+    return {
+        'polo': problema['polo'], 'tipo_equipe': problema['tipo_equipe'],
+        'solucao_encontrada': any(resultado['solucao_encontrada'] for resultado in resultados),
+        'rotas': rotas, 'trechos_m': trechos_m,
+        'nao_atendidos': sorted(set(range(len(problema['dados_grupo']['ids_servico']))) - atendidos),
+        'podados': podados,
+        'arcos_no_modelo': sum(resultado['arcos_no_modelo'] for resultado in resultados),
+        'vizinhos_por_servico': resultados[0]['vizinhos_por_servico'] if resultados else None,
+        'tempo_solver_s': round(sum(resultado['tempo_solver_s'] for resultado in resultados), 2),
+        'tempo_limite_s': round(sum(resultado['tempo_limite_s'] for resultado in resultados), 2),
+        'solucoes_encontradas': sum(resultado['solucoes_encontradas'] for resultado in resultados),
+        'encerrado_por_convergencia': all(resultado['encerrado_por_convergencia'] for resultado in resultados),
+        'evolucao_objetivo': [],  # Os custos dos subproblemas não se comparam ao do grupo inteiro
+        'cancelado': any(resultado.get('cancelado', False) for resultado in resultados),
+        'limitado_pelo_prazo': any(resultado.get('limitado_pelo_prazo', False) for resultado in resultados),
+        'reaproveitado': False, 'partiu_do_plano_anterior': False,
+        'decomposicao': {'metodo': divisao['metodo'], 'subproblemas': len(resultados), 'tempo_subproblemas_s': round(sum(resultado['tempo_solver_s'] for resultado in resultados), 2)},
+        'etapas_s': somar_etapas(*(resultado['etapas_s'] for resultado in resultados)),
+        'avisos_distancias': list(dict.fromkeys(aviso for resultado in resultados for aviso in resultado['avisos_distancias'])),
+        'estatisticas_busca': somar_estatisticas_busca(*(resultado['estatisticas_busca'] for resultado in resultados)),
+    }
+
+
+def concluir_com_busca_local(juntado, melhorado):
+    """Resultado final de um grupo dividido: o da busca local no grupo inteiro, com os tempos das duas etapas somados."""
+    if not melhorado['solucao_encontrada']:
+        return juntado
+    return {
+        **melhorado, 'partiu_do_plano_anterior': False,
+        'tempo_solver_s': round(juntado['tempo_solver_s'] + melhorado['tempo_solver_s'], 2),
+        'tempo_limite_s': round(juntado['tempo_limite_s'] + melhorado['tempo_limite_s'], 2),
+        'solucoes_encontradas': juntado['solucoes_encontradas'] + melhorado['solucoes_encontradas'],
+        'evolucao_objetivo': [[round(juntado['tempo_solver_s'] + segundos, 2), custo] for segundos, custo in melhorado['evolucao_objetivo']],
+        'cancelado': juntado['cancelado'] or melhorado['cancelado'],
+        'limitado_pelo_prazo': juntado['limitado_pelo_prazo'] or melhorado['limitado_pelo_prazo'],
+        'decomposicao': {**juntado['decomposicao'], 'tempo_busca_local_s': melhorado['tempo_solver_s']},
+        'etapas_s': somar_etapas(juntado['etapas_s'], melhorado['etapas_s']),
+        'avisos_distancias': list(dict.fromkeys(juntado['avisos_distancias'] + melhorado['avisos_distancias'])),
+        # O modelo é o do grupo inteiro (o da busca local); galhos e falhas contam as duas etapas
+        'estatisticas_busca': {**somar_estatisticas_busca(juntado['estatisticas_busca'], melhorado['estatisticas_busca']),
+                               'status': melhorado['estatisticas_busca']['status'], 'nos_no_modelo': melhorado['estatisticas_busca']['nos_no_modelo']},
+    }
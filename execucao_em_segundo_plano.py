@@ -0,0 +1,60 @@
+import queue
+import threading
+import time
+
+# ==============================================================================
+# EXECUÇÃO EM SEGUNDO PLANO
+# A roteirização do app roda numa thread de trabalho, que só publica eventos
+# numa fila: 'progresso', 'grupo' (cada grupo concluído, com as rotas, o
+# resumo e a evolução do custo na busca), 'concluido' e 'erro'. A página lê
+# os eventos a cada atualização e pode pedir o cancelamento: os grupos em
+# andamento ficam com a melhor solução já encontrada e os seguintes ficam de
+# fora. A thread não chama o Streamlit.
+# ==============================================================================
+
+
+class ExecucaoEmSegundoPlano:
+    """
+    Roda funcao(*args, ao_progredir=..., ao_concluir_grupo=..., cancelamento=..., **kwargs) numa thread
+    (executar_roteirizacao ou planejar_dias) e entrega os eventos em novos_eventos().
+    """
+
+    def __init__(self, funcao, *args, **kwargs):
+        self.eventos = queue.Queue()
+        self.cancelamento = threading.Event()
+        self.inicio = time.time()
+        self._thread = threading.Thread(target=self._executar, args=(funcao, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def _publicar(self, tipo, **dados):
+        self.eventos.put({'tipo': tipo, 'segundos': round(time.time() - self.inicio, 1), **dados})
+
+    def _executar(self, funcao, args, kwargs):
+        try:
+            resultados = funcao(*args, ao_progredir=lambda fracao, texto: self._publicar('progresso', fracao=fracao, texto=texto),
+                                ao_concluir_grupo=lambda registro: self._publicar('grupo', registro=registro),
+                                cancelamento=self.cancelamento, **kwargs)
+        except Exception as erro:
+            self._publicar('erro', mensagem=str(erro))
+        else:
+            self._publicar('concluido', resultados=resultados, cancelado=self.cancelamento.is_set())
+
+    def novos_eventos(self):
+        """Os eventos publicados desde a última chamada, sem esperar."""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.eventos.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def cancelar(self):
+        self.cancelamento.set()
+
+    @property
+    def em_andamento(self):
+        return self._thread.is_alive()
+
+    @property
+    def segundos_decorridos(self):
+        return time.time() - self.inicio
@@ -0,0 +1,215 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ==============================================================================
+# CONSULTA À GOOGLE DIRECTIONS API COM CACHE LOCAL
+# As respostas ficam em um SQLite, indexadas pela sequência origem/waypoints/
+# destino arredondada; reexecutar o mesmo dia ou um único polo não paga de novo
+# pela consulta. O modo offline responde apenas com o que já está em cache.
+# ==============================================================================
+URL_DIRECTIONS_GOOGLE = "https://maps.googleapis.com/maps/api/directions/json"
+ARQUIVO_CACHE_DIRECTIONS = "cache_directions.sqlite"
+CASAS_DECIMAIS_CACHE = 5  # ~1 m de precisão
+TTL_CACHE_DIAS = 30
+LIMITE_WAYPOINTS_GOOGLE = 25
+PONTOS_POR_CONSULTA = LIMITE_WAYPOINTS_GOOGLE + 2  # origem + waypoints + destino
+
+# Enriquecimento concorrente
+MAX_CONSULTAS_SIMULTANEAS = 8
+CONSULTAS_POR_SEGUNDO = 20
+TENTATIVAS_CONSULTA = 3
+ESPERA_INICIAL_RETRY_S = 0.5
+TIMEOUT_CONSULTA_S = 30
+STATUS_GOOGLE_RETENTAVEIS = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+
+class CacheDirections:
+    """Cache persistente (SQLite) dos trechos devolvidos pela Directions API."""
+
+    def __init__(self, caminho=ARQUIVO_CACHE_DIRECTIONS, casas_decimais=CASAS_DECIMAIS_CACHE, ttl_dias=TTL_CACHE_DIAS, modo_offline=False):
+        self.casas_decimais = casas_decimais
+        self.ttl_segundos = ttl_dias * 86400 if ttl_dias else None
+        self.modo_offline = modo_offline
+        self.acertos, self.falhas, self.gravacoes = 0, 0, 0
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        with self._lock, self._conexao:
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS rotas (chave TEXT PRIMARY KEY, legs TEXT NOT NULL, criado_em REAL NOT NULL)")
+        self.remover_expirados()
+
+    def chave(self, origem_coords, destino_coords, waypoints_coords):
+        """Chave da consulta: pontos arredondados na ordem origem, waypoints, destino."""
+        pontos = [origem_coords] + list(waypoints_coords) + [destino_coords]
+        return "|".join(f"{float(lat):.{self.casas_decimais}f},{float(lon):.{self.casas_decimais}f}" for lat, lon in pontos)
+
+    def obter(self, origem_coords, destino_coords, waypoints_coords):
+        """Retorna os trechos em cache (ou None), descartando entradas vencidas."""
+        chave = self.chave(origem_coords, destino_coords, waypoints_coords)
+        with self._lock:
+            linha = self._conexao.execute("SELECT legs, criado_em FROM rotas WHERE chave = ?", (chave,)).fetchone()
+            if linha and self.ttl_segundos and time.time() - linha[1] > self.ttl_segundos:
+                with self._conexao:
+                    self._conexao.execute("DELETE FROM rotas WHERE chave = ?", (chave,))
+                linha = None
+            if linha is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+        return json.loads(linha[0])
+
+    def salvar(self, origem_coords, destino_coords, waypoints_coords, legs):
+        """Grava apenas distância e duração de cada trecho, que é o que a roteirização usa."""
+        legs_compactos = [{'distance': {'value': leg['distance']['value']}, 'duration': {'value': leg['duration']['value']}} for leg in legs]
+        chave = self.chave(origem_coords, destino_coords, waypoints_coords)
+        with self._lock, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO rotas (chave, legs, criado_em) VALUES (?, ?, ?)", (chave, json.dumps(legs_compactos), time.time()))
+            self.gravacoes += 1
+
+    def remover_expirados(self):
+        """Remove as entradas mais antigas que o TTL. Retorna a quantidade removida."""
+        if not self.ttl_segundos:
+            return 0
+        with self._lock, self._conexao:
+            return self._conexao.execute("DELETE FROM rotas WHERE criado_em < ?", (time.time() - self.ttl_segundos,)).rowcount
+
+    def estatisticas(self):
+        with self._lock:
+            total = self._conexao.execute("SELECT COUNT(*) FROM rotas").fetchone()[0]
+        consultas = self.acertos + self.falhas
+        return {'acertos': self.acertos, 'falhas': self.falhas, 'gravacoes': self.gravacoes, 'entradas': total,
+                'taxa_acerto_%': round(self.acertos / consultas * 100, 2) if consultas else 0.0}
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+class LimitadorTaxa:
+    """Token bucket: libera até 'taxa_por_s' consultas por segundo, com rajada de até 'capacidade'."""
+
+    def __init__(self, taxa_por_s=CONSULTAS_POR_SEGUNDO, capacidade=None):
+        self.taxa_por_s = taxa_por_s
+        self.capacidade = capacidade or taxa_por_s
+        self.fichas = float(self.capacidade)
+        self.atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa_por_s)
+                self.atualizado_em = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                espera = (1 - self.fichas) / self.taxa_por_s
+            time.sleep(espera)
+
+
+def criar_sessao(max_conexoes=MAX_CONSULTAS_SIMULTANEAS):
+    """Sessão HTTP com conexões keep-alive suficientes para as consultas simultâneas."""
+    sessao = requests.Session()
+    sessao.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max_conexoes))
+    sessao.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=max_conexoes))
+    return sessao
+
+
+def obter_distancia_real_google(origem_coords, destino_coords, waypoints_coords, chave_api, cache=None, url_base=URL_DIRECTIONS_GOOGLE,
+                                sessao=None, limitador=None, tentativas=TENTATIVAS_CONSULTA, avisar=None):
+    """
+    Consulta os trechos (legs) da rota na Directions API, passando antes pelo cache, se houver.
+    Os waypoints são enviados na ordem recebida (a sequência já vem otimizada pelo solver).
+    Falhas de conexão, HTTP 429/5xx e OVER_QUERY_LIMIT são repetidas com espera exponencial.
+    Retorna None se a consulta falhar; o motivo vai para 'avisar(texto)', se houver.
+    """
+    avisar = avisar or (lambda aviso: None)
+    if cache is not None:
+        legs = cache.obter(origem_coords, destino_coords, waypoints_coords)
+        if legs is not None or cache.modo_offline:
+            return legs
+    if not chave_api or chave_api == "COLE_SUA_CHAVE_DE_API_AQUI": return None
+    origin_str, destination_str = f"{origem_coords[0]},{origem_coords[1]}", f"{destino_coords[0]},{destino_coords[1]}"
+    if len(waypoints_coords) > LIMITE_WAYPOINTS_GOOGLE:
+        avisar(f"Rota com {len(waypoints_coords)} pontos excede o limite de {LIMITE_WAYPOINTS_GOOGLE}.")
+        return None
+    params = {"origin": origin_str, "destination": destination_str, "key": chave_api}
+    if waypoints_coords:
+        params["waypoints"] = "|".join([f"{lat},{lon}" for lat, lon in waypoints_coords])
+    cliente = sessao or requests
+    for tentativa in range(max(1, tentativas)):
+        if tentativa:
+            time.sleep(ESPERA_INICIAL_RETRY_S * 2 ** (tentativa - 1))
+        if limitador is not None:
+            limitador.aguardar()
+        try:
+            response = cliente.get(url_base, params=params, timeout=TIMEOUT_CONSULTA_S)
+            if response.status_code == 429 or response.status_code >= 500:
+                erro = f"HTTP {response.status_code}"
+                continue
+            if response.status_code >= 400:  # Pedido recusado (chave inválida, parâmetros): repetir não adianta
+                erro = f"HTTP {response.status_code}"
+                break
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            erro = f"ERRO DE CONEXÃO: {e}"
+            continue
+        if data['status'] == 'OK':
+            legs = data['routes'][0]['legs']
+            if cache is not None: cache.salvar(origem_coords, destino_coords, waypoints_coords, legs)
+            return legs
+        erro = data.get('error_message', data['status'])
+        if data['status'] not in STATUS_GOOGLE_RETENTAVEIS:
+            break
+    avisar(erro)
+    return None
+
+
+def dividir_em_consultas(pontos, pontos_por_consulta=PONTOS_POR_CONSULTA):
+    """Divide o caminho completo em trechos consecutivos (o último ponto de um é o primeiro do seguinte)."""
+    return [pontos[i:i + pontos_por_consulta] for i in range(0, len(pontos) - 1, pontos_por_consulta - 1)]
+
+
+def enriquecer_rotas(rotas, chave_api, cache=None, url_base=URL_DIRECTIONS_GOOGLE,
+                     max_simultaneas=MAX_CONSULTAS_SIMULTANEAS, consultas_por_segundo=CONSULTAS_POR_SEGUNDO, avisar=None):
+    """
+    Consulta de uma vez os trechos de várias rotas. Cada rota é (deposito, [pontos...]) e é
+    percorrida depósito -> pontos -> depósito. Todas as consultas (de todas as rotas) são
+    enviadas em paralelo por um pool limitado de threads, com sessão HTTP compartilhada e
+    limite de taxa. Retorna, na ordem de 'rotas', a lista de legs de cada uma (None se falhar).
+    Os motivos das falhas vão para 'avisar(texto)', na thread de quem chamou, depois das consultas.
+    """
+    consultas = []  # (indice_rota, trecho)
+    for indice_rota, (deposito, pontos) in enumerate(rotas):
+        for trecho in dividir_em_consultas([deposito] + list(pontos) + [deposito]):
+            consultas.append((indice_rota, trecho))
+    if not consultas:
+        return [None] * len(rotas)
+
+    limitador = LimitadorTaxa(consultas_por_segundo) if consultas_por_segundo else None
+    avisos = []
+    with criar_sessao(max_simultaneas) as sessao, ThreadPoolExecutor(max_workers=max_simultaneas) as executor:
+        legs_por_consulta = list(executor.map(
+            lambda consulta: obter_distancia_real_google(consulta[1][0], consulta[1][-1], consulta[1][1:-1], chave_api, cache=cache,
+                                                         url_base=url_base, sessao=sessao, limitador=limitador, avisar=avisos.append),
+            consultas
+        ))
+    if avisar is not None:
+        for aviso in dict.fromkeys(avisos):  # Sem repetir o mesmo motivo a cada consulta
+            avisar(aviso)
+
+    legs_por_rota = [[] for _ in rotas]
+    for (indice_rota, _), legs in zip(consultas, legs_por_consulta):
+        if legs_por_rota[indice_rota] is None:
+            continue
+        if legs:
+            legs_por_rota[indice_rota].extend(legs)
+        else:
+            legs_por_rota[indice_rota] = None
+    return legs_por_rota
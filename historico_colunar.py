@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ==============================================================================
+# HISTÓRICO DO FATOR K EM FORMATO COLUNAR (PARQUET)
+# Cada histórico (rotas, trechos, fator_k) vira um dataset particionado por
+# polo e mês (Polo=.../Mes=AAAA-MM/*.parquet). Cada gravação diária acrescenta
+# um arquivo por partição, com a coluna 'Data' (estatísticas por row group) e
+# o 'Lote' da gravação. Consultas do tipo "polo X nos últimos N dias" só abrem
+# as partições e os row groups necessários, e apenas as colunas pedidas.
+# A compactação junta os arquivos diários de cada partição em um só.
+# Uso: python historico_colunar.py [migrar | compactar]
+# ==============================================================================
+DIRETORIO_HISTORICO = "historico_k"
+ARQUIVOS_CSV_HISTORICO = {
+    'rotas': "historico_rotas_k.csv",
+    'trechos': "historico_trechos_k.csv",
+    'fator_k': "historico_fator_k.csv",
+}
+PARTICIONAMENTO = ds.partitioning(pa.schema([('Polo', pa.string()), ('Mes', pa.string())]), flavor='hive')
+COLUNAS_INTERNAS = ('Mes', 'Lote')
+
+
+class ArmazemHistorico:
+    """Datasets Parquet dos históricos, particionados por Polo e Mês."""
+
+    def __init__(self, diretorio=DIRETORIO_HISTORICO):
+        self.diretorio = diretorio
+
+    def caminho(self, tipo):
+        return os.path.join(self.diretorio, tipo)
+
+    def existe(self, tipo):
+        return os.path.isdir(self.caminho(tipo))
+
+    def acrescentar(self, tipo, df):
+        """Grava as linhas novas (com colunas 'Polo' e 'Data') em um arquivo novo de cada partição."""
+        if df.empty: return 0
+        df = df.copy()
+        df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%Y-%m-%d')
+        df['Mes'] = df['Data'].str[:7]
+        df['Lote'] = time.time_ns()
+        ds.write_dataset(
+            pa.Table.from_pandas(df.sort_values(['Polo', 'Data']), preserve_index=False), self.caminho(tipo), format='parquet',
+            partitioning=PARTICIONAMENTO, basename_template=f"parte-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        return len(df)
+
+    def dataset(self, tipo):
+        return ds.dataset(self.caminho(tipo), format='parquet', partitioning=PARTICIONAMENTO)
+
+    def ler(self, tipo, polo=None, ultimos_dias=None, colunas=None, data_referencia=None, lote_minimo=None):
+        """
+        Lê o histórico filtrando por polo e/ou pelos últimos N dias (até 'data_referencia', padrão hoje).
+        Os filtros são aplicados às partições e às estatísticas dos row groups antes da leitura.
+        'lote_minimo' devolve apenas as linhas gravadas depois desse lote (leitura incremental).
+        """
+        if not self.existe(tipo): return pd.DataFrame(columns=colunas)
+        filtros = []
+        if polo is not None:
+            filtros.append(ds.field('Polo') == polo)
+        if ultimos_dias is not None:
+            inicio = ((data_referencia or date.today()) - timedelta(days=ultimos_dias)).strftime('%Y-%m-%d')
+            filtros += [ds.field('Mes') >= inicio[:7], ds.field('Data') > inicio]
+        if lote_minimo is not None:
+            filtros.append(ds.field('Lote') > lote_minimo)
+        filtro = None
+        for condicao in filtros:
+            filtro = condicao if filtro is None else filtro & condicao
+        df = self.dataset(tipo).to_table(columns=colunas, filter=filtro).to_pandas()
+        if colunas: return df
+        return df[['Polo', 'Data'] + [c for c in df.columns if c not in ('Polo', 'Data') + COLUNAS_INTERNAS]]
+
+    def ler_novos(self, tipo, ultimo_lote=0):
+        """Linhas gravadas depois de 'ultimo_lote'. Retorna (df, maior lote lido)."""
+        if not self.existe(tipo): return pd.DataFrame(), ultimo_lote
+        df = self.ler(tipo, lote_minimo=ultimo_lote, colunas=self.dataset(tipo).schema.names)
+        return df, int(df['Lote'].max()) if not df.empty else ultimo_lote
+
+    def compactar(self, tipo):
+        """Junta os arquivos de cada partição em um único arquivo (preserva 'Lote'). Retorna as partições compactadas."""
+        compactadas = 0
+        if not self.existe(tipo): return compactadas
+        for pasta, _, nomes in os.walk(self.caminho(tipo)):
+            arquivos = sorted(os.path.join(pasta, nome) for nome in nomes if nome.endswith('.parquet'))
+            if len(arquivos) < 2: continue
+            tabela = ds.dataset(arquivos, format='parquet').to_table().sort_by([('Data', 'ascending')])
+            temporario = os.path.join(pasta, f"compactado-{uuid.uuid4().hex}.parquet.tmp")
+            pq.write_table(tabela, temporario)
+            os.replace(temporario, temporario[:-len('.tmp')])
+            for arquivo in arquivos:
+                os.remove(arquivo)
+            compactadas += 1
+        return compactadas
+
+
+def migrar_csvs(armazem=None, arquivos_csv=ARQUIVOS_CSV_HISTORICO):
+    """Converte os históricos CSV (';' com BOM) para o armazém colunar. Retorna as linhas migradas por tipo."""
+    armazem = armazem or ArmazemHistorico()
+    migrados = {}
+    for tipo, caminho_csv in arquivos_csv.items():
+        if not os.path.exists(caminho_csv): continue
+        if armazem.existe(tipo):
+            print(f"  - '{armazem.caminho(tipo)}' já existe; migração de '{caminho_csv}' ignorada.")
+            continue
+        df = pd.read_csv(caminho_csv, sep=';', encoding='utf-8-sig')
+        migrados[tipo] = armazem.acrescentar(tipo, df)
+    return migrados
+
+
+def main():
+    comando = sys.argv[1] if len(sys.argv) > 1 else ''
+    if comando not in ('migrar', 'compactar'):
+        print("Uso: python historico_colunar.py [migrar | compactar]"); return
+    inicio = time.time()
+    if comando == 'migrar':
+        for tipo, linhas in migrar_csvs().items():
+            print(f"{tipo}: {linhas} linha(s) migrada(s) para '{os.path.join(DIRETORIO_HISTORICO, tipo)}'.")
+    else:
+        armazem = ArmazemHistorico()
+        for tipo in ARQUIVOS_CSV_HISTORICO:
+            print(f"{tipo}: {armazem.compactar(tipo)} partição(ões) compactada(s).")
+    print(f"Concluído em {time.time() - inicio:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
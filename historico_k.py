@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from historico_colunar import ArmazemHistorico
+
+# ==============================================================================
+# AGREGADOS INCREMENTAIS DO FATOR K
+# Os históricos de rotas e trechos só crescem (append). Em vez de reprocessar os
+# arquivos inteiros a cada análise, mantemos somas e contagens por polo e por
+# faixa de distância, e a posição (em bytes) até onde cada arquivo já foi lido.
+# Cada atualização processa apenas as linhas novas. Se o histórico já foi
+# migrado para o armazém colunar (historico_colunar.py), lê dele pelo 'Lote'.
+# Uso: python historico_k.py [atualizar | reconstruir]
+# ==============================================================================
+ARQUIVO_HISTORICO_ROTAS = "historico_rotas_k.csv"
+ARQUIVO_HISTORICO_TRECHOS = "historico_trechos_k.csv"
+ARQUIVO_AGREGADOS_K = "agregados_fator_k.json"
+ARQUIVO_ANALISE_GERAL_K = "analise_fator_k_geral.csv"
+ARQUIVO_ANALISE_GRANULAR_K = "analise_k_por_distancia.csv"
+TAMANHO_FAIXA_M = 500
+MIN_ROTAS_ANALISE = 10
+
+
+def _nivel_confianca(qtd_rotas):
+    if qtd_rotas < 10: return "Dados Insuficientes"
+    if qtd_rotas < 30: return "Inicial"
+    if qtd_rotas < 100: return "Confiável"
+    return "Alta Precisão"
+
+
+class AgregadosFatorK:
+    """Somas e contagens do Fator K real por polo (rotas) e por polo + faixa de distância (trechos)."""
+
+    def __init__(self, caminho=ARQUIVO_AGREGADOS_K):
+        self.caminho = caminho
+        self.limpar()
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+            self.posicoes_lidas = dados['posicoes_lidas']
+            self.lotes_lidos = dados.get('lotes_lidos', {})
+            self.rotas = dados['rotas']
+            self.trechos = {polo: {int(inicio): valores for inicio, valores in faixas.items()} for polo, faixas in dados['trechos'].items()}
+
+    def limpar(self):
+        self.posicoes_lidas = {}  # arquivo -> bytes já processados
+        self.lotes_lidos = {}  # tipo do armazém colunar -> último lote processado
+        self.rotas = {}  # polo -> [qtd_rotas, qtd_validas, soma_k]
+        self.trechos = {}  # polo -> {inicio_faixa_m: [qtd, soma_k]}
+
+    def salvar(self):
+        with open(self.caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump({'posicoes_lidas': self.posicoes_lidas, 'lotes_lidos': self.lotes_lidos, 'rotas': self.rotas, 'trechos': self.trechos}, arquivo)
+
+    def atualizar_com_rotas(self, df_rotas):
+        """Soma as rotas novas (Polo, KM_Estimado_K, KM_Real_Google, Fator_K_Usado)."""
+        if df_rotas.empty: return
+        km_estimado = pd.to_numeric(df_rotas['KM_Estimado_K'], errors='coerce')
+        km_real = pd.to_numeric(df_rotas['KM_Real_Google'], errors='coerce')
+        fator_k_usado = pd.to_numeric(df_rotas['Fator_K_Usado'], errors='coerce')
+        dist_reta_km = km_estimado / fator_k_usado
+        validas = km_real.notna() & (fator_k_usado > 0) & (km_estimado > 0) & (dist_reta_km > 0)
+        df = pd.DataFrame({'Polo': df_rotas['Polo'], 'Valida': validas, 'K': (km_real / dist_reta_km).where(validas, 0.0)})
+        for polo, qtd, qtd_validas, soma_k in df.groupby('Polo').agg(qtd=('Valida', 'size'), qtd_validas=('Valida', 'sum'), soma_k=('K', 'sum')).itertuples():
+            atual = self.rotas.setdefault(polo, [0, 0, 0.0])
+            atual[0] += int(qtd); atual[1] += int(qtd_validas); atual[2] += float(soma_k)
+
+    def atualizar_com_trechos(self, df_trechos):
+        """Soma os trechos novos (Polo, Distancia_Reta_m, Distancia_Real_m) na faixa de distância de cada um."""
+        if df_trechos.empty: return
+        dist_reta = pd.to_numeric(df_trechos['Distancia_Reta_m'], errors='coerce')
+        dist_real = pd.to_numeric(df_trechos['Distancia_Real_m'], errors='coerce')
+        validos = (dist_reta > 0) & (dist_real > 0)
+        df = pd.DataFrame({'Polo': df_trechos['Polo'][validos], 'Inicio': (dist_reta[validos] // TAMANHO_FAIXA_M * TAMANHO_FAIXA_M).astype(np.int64), 'K': dist_real[validos] / dist_reta[validos]})
+        for (polo, inicio), qtd, soma_k in df.groupby(['Polo', 'Inicio']).agg(qtd=('K', 'size'), soma_k=('K', 'sum')).itertuples():
+            atual = self.trechos.setdefault(polo, {}).setdefault(int(inicio), [0, 0.0])
+            atual[0] += int(qtd); atual[1] += float(soma_k)
+
+    def _ler_linhas_novas(self, caminho_csv):
+        """Lê apenas o que foi acrescentado ao CSV desde a última atualização."""
+        if not os.path.exists(caminho_csv): return pd.DataFrame()
+        with open(caminho_csv, 'rb') as arquivo:
+            cabecalho = arquivo.readline()
+            inicio = max(self.posicoes_lidas.get(caminho_csv, 0), len(cabecalho))
+            arquivo.seek(inicio)
+            novos = arquivo.read()
+        novos = novos[:novos.rfind(b'\n') + 1]  # uma linha final ainda incompleta fica para a próxima leitura
+        self.posicoes_lidas[caminho_csv] = inicio + len(novos)
+        if not novos.strip(): return pd.DataFrame()
+        return pd.read_csv(io.BytesIO(cabecalho + novos), sep=';', encoding='utf-8-sig')
+
+    def atualizar_de_arquivos(self, arquivo_rotas=ARQUIVO_HISTORICO_ROTAS, arquivo_trechos=ARQUIVO_HISTORICO_TRECHOS):
+        """Processa as linhas novas dos históricos. Retorna (rotas_novas, trechos_novos)."""
+        df_rotas, df_trechos = self._ler_linhas_novas(arquivo_rotas), self._ler_linhas_novas(arquivo_trechos)
+        self.atualizar_com_rotas(df_rotas)
+        self.atualizar_com_trechos(df_trechos)
+        return len(df_rotas), len(df_trechos)
+
+    def atualizar_do_armazem(self, armazem):
+        """Processa as linhas gravadas no armazém colunar depois do último lote lido. Retorna (rotas_novas, trechos_novos)."""
+        df_rotas, self.lotes_lidos['rotas'] = armazem.ler_novos('rotas', self.lotes_lidos.get('rotas', 0))
+        df_trechos, self.lotes_lidos['trechos'] = armazem.ler_novos('trechos', self.lotes_lidos.get('trechos', 0))
+        self.atualizar_com_rotas(df_rotas)
+        self.atualizar_com_trechos(df_trechos)
+        return len(df_rotas), len(df_trechos)
+
+    def atualizar(self, armazem=None, arquivo_rotas=ARQUIVO_HISTORICO_ROTAS, arquivo_trechos=ARQUIVO_HISTORICO_TRECHOS):
+        """Atualiza pelo armazém colunar, se houver, ou pelos CSVs."""
+        if armazem is not None and (armazem.existe('rotas') or armazem.existe('trechos')):
+            return self.atualizar_do_armazem(armazem)
+        return self.atualizar_de_arquivos(arquivo_rotas, arquivo_trechos)
+
+    def reconstruir(self, armazem=None, arquivo_rotas=ARQUIVO_HISTORICO_ROTAS, arquivo_trechos=ARQUIVO_HISTORICO_TRECHOS):
+        """Descarta os agregados e relê os históricos completos."""
+        self.limpar()
+        return self.atualizar(armazem, arquivo_rotas, arquivo_trechos)
+
+    def analise_geral(self, df_polos_info):
+        """Mesmo formato de 'analise_fator_k_geral.csv', a partir dos agregados."""
+        dados_analise = []
+        for polo, fator_k_atual in zip(df_polos_info['Centro Operativo'], df_polos_info['fator_k']):
+            qtd_rotas, qtd_validas, soma_k = self.rotas.get(polo, [0, 0, 0.0])
+            novo_k_sugerido_str, observacao = "N/A", ""
+            if qtd_rotas < MIN_ROTAS_ANALISE:
+                observacao = f"São necessárias no mínimo {MIN_ROTAS_ANALISE} rotas ({qtd_rotas} existentes)."
+            elif qtd_validas:
+                novo_k_sugerido_str, observacao = f"{soma_k / qtd_validas:.2f}", "Sugestão calculada"
+            dados_analise.append({'Polo': polo, 'Fator_K_Atual': f"{fator_k_atual:.2f}", 'Fator_K_Sugerido': novo_k_sugerido_str, 'Qtd_Rotas_Analisadas': qtd_rotas, 'Nivel_Confianca': _nivel_confianca(qtd_rotas), 'Observacao': observacao})
+        return pd.DataFrame(dados_analise)
+
+    def analise_por_faixa(self):
+        """Mesmo formato de 'analise_k_por_distancia.csv': todas as faixas até a maior observada, para cada polo."""
+        if not self.trechos: return pd.DataFrame(columns=['Polo', 'Faixa_Distancia', 'K_Sugerido', 'Qtd_Amostras'])
+        inicios = np.arange(0, max(max(faixas) for faixas in self.trechos.values()) + TAMANHO_FAIXA_M, TAMANHO_FAIXA_M)
+        linhas = []
+        for polo in sorted(self.trechos):
+            faixas = self.trechos[polo]
+            for inicio in inicios.tolist():
+                qtd, soma_k = faixas.get(inicio, [0, 0.0])
+                linhas.append({'Polo': polo, 'Faixa_Distancia': f"{inicio}-{inicio + TAMANHO_FAIXA_M} m", 'K_Sugerido': round(soma_k / qtd, 2) if qtd else np.nan, 'Qtd_Amostras': qtd})
+        return pd.DataFrame(linhas)
+
+
+def main():
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'atualizar'
+    if comando not in ('atualizar', 'reconstruir'):
+        print("Uso: python historico_k.py [atualizar | reconstruir]"); return
+    agregados, armazem = AgregadosFatorK(), ArmazemHistorico()
+    rotas_novas, trechos_novos = agregados.reconstruir(armazem) if comando == 'reconstruir' else agregados.atualizar(armazem)
+    agregados.salvar()
+    print(f"{rotas_novas} rota(s) e {trechos_novos} trecho(s) processados. Agregados salvos em '{ARQUIVO_AGREGADOS_K}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# ==============================================================================
+# INSTRUMENTAÇÃO DA ROTEIRIZAÇÃO
+# Tempo de parede e de CPU de cada etapa, da execução (preparação dos dados,
+# montagem dos problemas, gravação das saídas) e de cada grupo (distâncias,
+# poda, modelo, busca, leitura da solução, Google Directions, montagem das
+# rotas), com o tamanho do modelo, o status do OR-Tools, as estatísticas da
+# busca e a evolução do custo. O relatório sai em JSON (completo) e em CSV
+# (uma linha por grupo), ao lado do resumo_do_dia.csv.
+# ==============================================================================
+ARQUIVO_RELATORIO_JSON = "relatorio_execucao.json"
+ARQUIVO_RELATORIO_CSV = "relatorio_execucao.csv"
+# Etapas de um grupo, na ordem em que acontecem. 'espera_resultado' é o consumidor aguardando o solver: com os
+# grupos resolvidos no mesmo processo, ela contém as etapas do solver (distancias a leitura_solucao)
+ETAPAS_GRUPO = ('espera_resultado', 'distancias', 'poda', 'modelo', 'busca', 'leitura_solucao', 'enriquecimento_google', 'montagem_rotas')
+
+
+class CronometroEtapas:
+    """
+    Tempo de parede e de CPU (da thread atual) entre marcações: marcar(nome) soma a 'nome' o tempo desde a marcação
+    anterior (ou desde reiniciar()). 'etapas': {nome: {'parede_s', 'cpu_s'}}.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._parede, self._cpu = time.perf_counter(), time.thread_time()
+
+    def marcar(self, nome):
+        parede, cpu = time.perf_counter(), time.thread_time()
+        etapa = self.etapas.setdefault(nome, {'parede_s': 0.0, 'cpu_s': 0.0})
+        etapa['parede_s'] += parede - self._parede
+        etapa['cpu_s'] += cpu - self._cpu
+        self._parede, self._cpu = parede, cpu
+
+
+def somar_etapas(*listas_de_etapas):
+    """Soma etapa a etapa (subproblemas de um grupo dividido, busca local depois dos subproblemas)."""
+    total = {}
+    for etapas in listas_de_etapas:
+        for nome, tempos in (etapas or {}).items():
+            acumulado = total.setdefault(nome, {'parede_s': 0.0, 'cpu_s': 0.0})
+            acumulado['parede_s'] += tempos['parede_s']
+            acumulado['cpu_s'] += tempos['cpu_s']
+    return total
+
+
+def somar_estatisticas_busca(*estatisticas):
+    """Estatísticas da busca de várias resoluções de um mesmo grupo: contagens somadas, status distintos juntos."""
+    estatisticas = [item for item in estatisticas if item]
+    somar = lambda chave: sum(item[chave] for item in estatisticas) if all(item.get(chave) is not None for item in estatisticas) else None
+    return {'status': ', '.join(dict.fromkeys(item['status'] for item in estatisticas)), 'nos_no_modelo': somar('nos_no_modelo'),
+            'galhos': somar('galhos'), 'falhas': somar('falhas'), 'chamadas_callback_transito': somar('chamadas_callback_transito')}
+
+
+def _arredondar_etapas(etapas):
+    return {nome: {'parede_s': round(tempos['parede_s'], 4), 'cpu_s': round(tempos['cpu_s'], 4)} for nome, tempos in etapas.items()}
+
+
+def dados_do_grupo(problema, resultado, etapas, data_despacho=None):
+    """Registro de instrumentação de um grupo resolvido (ou reaproveitado do cache)."""
+    evolucao = resultado.get('evolucao_objetivo', [])
+    estatisticas = resultado.get('estatisticas_busca') or {}
+    podados = len(resultado['podados'])
+    return {
+        'data_despacho': data_despacho, 'polo': problema['polo'], 'tipo_equipe': problema['tipo_equipe'],
+        'servicos': len(problema['dados_grupo']['ids_servico']), 'equipes': problema['num_equipes'],
+        'nos_no_modelo': estatisticas.get('nos_no_modelo'), 'arcos_no_modelo': resultado.get('arcos_no_modelo'),
+        'status_solver': estatisticas.get('status'), 'solucao_encontrada': resultado['solucao_encontrada'],
+        'reaproveitado': resultado['reaproveitado'], 'cancelado': resultado.get('cancelado', False),
+        'encerrado_por_convergencia': resultado['encerrado_por_convergencia'],
+        'tempo_solver_s': resultado['tempo_solver_s'], 'tempo_limite_s': resultado['tempo_limite_s'],
+        'chamadas_callback_solucao': resultado['solucoes_encontradas'],
+        'chamadas_callback_transito': estatisticas.get('chamadas_callback_transito'),
+        'galhos': estatisticas.get('galhos'), 'falhas': estatisticas.get('falhas'),
+        'servicos_podados': podados, 'servicos_descartados_solver': len(resultado['nao_atendidos']) - podados,
+        'melhoras_custo': len(evolucao), 'custo_inicial': evolucao[0][1] if evolucao else None,
+        'custo_final': evolucao[-1][1] if evolucao else None, 'ultima_melhora_s': evolucao[-1][0] if evolucao else None,
+        'etapas': _arredondar_etapas(etapas), 'evolucao_objetivo': evolucao,
+    }
+
+
+class Instrumentacao:
+    """
+    Coleta de uma execução: as etapas gerais (etapa, acrescentar_etapas) e um registro por grupo (registrar_grupo).
+    As etapas gerais podem se sobrepor ('montagem_problemas' acontece dentro de 'roteirizacao'). O tempo de CPU é o
+    da thread que mediu: com grupos num pool de processos, a CPU do solver está nos registros dos grupos.
+    """
+
+    def __init__(self):
+        self.inicio, self.fim = time.time(), None
+        self.etapas = {}
+        self.grupos = []
+
+    @contextmanager
+    def etapa(self, nome):
+        """Soma a 'nome' o tempo de parede e de CPU do bloco 'with'."""
+        cronometro = CronometroEtapas()
+        try:
+            yield
+        finally:
+            cronometro.marcar(nome)
+            self.acrescentar_etapas(cronometro.etapas)
+
+    def concluir(self):
+        """Marca o fim da execução (a duração do relatório para de correr)."""
+        self.fim = time.time()
+
+    def acrescentar_etapas(self, etapas):
+        self.etapas = somar_etapas(self.etapas, etapas)
+
+    def registrar_grupo(self, dados):
+        self.grupos.append(dados)
+
+    def relatorio(self):
+        """Relatório completo (o conteúdo do JSON)."""
+        return {
+            'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'), 'duracao_s': round((self.fim or time.time()) - self.inicio, 2),
+            'etapas': _arredondar_etapas(self.etapas),
+            'etapas_grupos': _arredondar_etapas(somar_etapas(*(grupo['etapas'] for grupo in self.grupos))),
+            'grupos': self.grupos,
+        }
+
+    def tabela_grupos(self):
+        """Uma linha por grupo, com as etapas em colunas (<etapa>_parede_s, <etapa>_cpu_s); sem a evolução do custo."""
+        linhas = []
+        for grupo in self.grupos:
+            linha = {chave: valor for chave, valor in grupo.items() if chave not in ('etapas', 'evolucao_objetivo')}
+            for nome in ETAPAS_GRUPO:
+                tempos = grupo['etapas'].get(nome, {'parede_s': 0.0, 'cpu_s': 0.0})
+                linha[f'{nome}_parede_s'], linha[f'{nome}_cpu_s'] = tempos['parede_s'], tempos['cpu_s']
+            linhas.append(linha)
+        return pd.DataFrame(linhas)
+
+    def tabela_etapas(self):
+        """Parede e CPU por etapa: as da execução e as dos grupos somadas."""
+        relatorio = self.relatorio()
+        linhas = [{'Etapa': nome, 'Escopo': 'execução', **tempos} for nome, tempos in relatorio['etapas'].items()]
+        linhas += [{'Etapa': nome, 'Escopo': 'grupos (soma)', **relatorio['etapas_grupos'][nome]} for nome in ETAPAS_GRUPO if nome in relatorio['etapas_grupos']]
+        return pd.DataFrame(linhas, columns=['Etapa', 'Escopo', 'parede_s', 'cpu_s'])
+
+    def relatorio_json(self):
+        return json.dumps(self.relatorio(), ensure_ascii=False, indent=2, default=str)
+
+    def salvar(self, caminho_json=ARQUIVO_RELATORIO_JSON, caminho_csv=ARQUIVO_RELATORIO_CSV):
+        with open(caminho_json, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(self.relatorio_json())
+        self.tabela_grupos().to_csv(caminho_csv, index=False, sep=';', encoding='utf-8-sig')
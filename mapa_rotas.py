@@ -0,0 +1,157 @@
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.utilities import JsCode
+
+# ==============================================================================
+# MAPA DAS ROTAS
+# Dois modos de montagem do mapa folium:
+#  - 'rapido': uma junção das coordenadas para todas as rotas e, por polo, uma
+#    camada (liga/desliga no controle de camadas) com as rotas numa única
+#    FeatureCollection de linhas e os serviços noutra de pontos, montadas das
+#    colunas de uma vez; as linhas podem ser simplificadas (Douglas-Peucker).
+#  - 'marcadores': um folium.Marker com popup HTML por serviço (o mapa antigo,
+#    mais pesado; serve para poucas rotas).
+# ==============================================================================
+MODOS_MAPA = ('rapido', 'marcadores')
+MODO_MAPA_PADRAO = 'rapido'
+CASAS_DECIMAIS_MAPA = 5  # ~1 m: o suficiente para o mapa e bem menos texto no HTML
+CORES_EQUIPES = ['blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue', 'red', 'lightblue', 'lightgreen', 'gray', 'pink', 'lightgray']
+# Cores do folium.Icon (nomes) convertidas para as linhas e círculos da camada rápida
+CORES_HEX = {'blue': '#38aadd', 'green': '#72b026', 'purple': '#d252b9', 'orange': '#f69730', 'darkred': '#a23336', 'lightred': '#ff8e7f', 'beige': '#ffcb92',
+             'darkblue': '#0067a3', 'darkgreen': '#728224', 'cadetblue': '#436978', 'red': '#d63e2a', 'lightblue': '#8adaff', 'lightgreen': '#bbf970',
+             'gray': '#575757', 'pink': '#ff91ea', 'lightgray': '#a3a3a3'}
+METROS_POR_GRAU = 111_320
+COR_DO_SERVICO = JsCode("function(feature, layer) { layer.setStyle({color: feature.properties.cor, fillColor: feature.properties.cor}); }")
+
+
+def simplificar_linha(pontos, tolerancia_m):
+    """Douglas-Peucker sobre (lat, lon): os vértices que desviam mais de 'tolerancia_m' da linha simplificada. Mantém as pontas."""
+    pontos = np.asarray(pontos, dtype=np.float64)
+    if tolerancia_m <= 0 or len(pontos) < 3: return pontos
+    # Projeção local em metros (equiretangular), suficiente na escala de um polo
+    xy = np.column_stack([pontos[:, 1] * np.cos(np.radians(pontos[:, 0].mean())), pontos[:, 0]]) * METROS_POR_GRAU
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[[0, -1]] = True
+    pilha = [(0, len(pontos) - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2: continue
+        segmento, relativos = xy[fim] - xy[inicio], xy[inicio + 1:fim] - xy[inicio]
+        comprimento = np.hypot(*segmento)
+        if comprimento == 0:
+            distancias = np.hypot(relativos[:, 0], relativos[:, 1])
+        else:
+            distancias = np.abs(segmento[0] * relativos[:, 1] - segmento[1] * relativos[:, 0]) / comprimento
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia_m:
+            meio = inicio + 1 + maior
+            manter[meio] = True
+            pilha += [(inicio, meio), (meio, fim)]
+    return pontos[manter]
+
+
+def _rotas_com_coordenadas(df_rotas, df_servicos_info):
+    """Rotas com Latitude/Longitude (uma única junção para todas as equipes), ordenadas por polo, equipe e visita."""
+    if {'Latitude', 'Longitude'}.issubset(df_rotas.columns):
+        rotas = df_rotas
+    else:
+        coordenadas = df_servicos_info[['ID_Servico', 'Latitude', 'Longitude']].drop_duplicates('ID_Servico')
+        rotas = df_rotas.merge(coordenadas, on='ID_Servico', how='left')
+    rotas = rotas.dropna(subset=['Latitude', 'Longitude']).sort_values(['Polo', 'Equipe', 'Ordem_Visita'], kind='stable')
+    # Nomes de equipe se repetem entre polos: a cor e a linha são por polo + equipe
+    equipes = rotas['Polo'].astype(str) + " - " + rotas['Equipe'].astype(str)
+    cores = {equipe: CORES_EQUIPES[i % len(CORES_EQUIPES)] for i, equipe in enumerate(equipes.unique())}
+    return rotas.assign(Equipe_Unica=equipes, Cor=equipes.map(cores))
+
+
+def _marcadores_polos(mapa_ou_camada, polos):
+    for nome, latitude, longitude in zip(polos['Centro Operativo'], polos['latitude'], polos['longitude']):
+        folium.Marker(location=[latitude, longitude], popup=f"<strong>Polo: {nome}</strong>", icon=folium.Icon(color='black', icon='industry', prefix='fa')).add_to(mapa_ou_camada)
+
+
+def _camadas_rapidas(mapa, rotas, polos, simplificar_m):
+    """Uma camada por polo: as linhas das equipes e os pontos dos serviços em FeatureCollections."""
+    coordenadas_polos = {nome: (latitude, longitude) for nome, latitude, longitude in zip(polos['Centro Operativo'], polos['latitude'], polos['longitude'])}
+    arredondar = lambda valores: np.round(np.asarray(valores, dtype=np.float64), CASAS_DECIMAIS_MAPA)
+    for polo, rotas_polo in rotas.groupby('Polo', sort=False):
+        camada = folium.FeatureGroup(name=str(polo))
+        deposito = coordenadas_polos.get(polo)
+        if deposito is not None:
+            _marcadores_polos(camada, polos[polos['Centro Operativo'] == polo])
+
+        linhas = []
+        latitudes, longitudes = arredondar(rotas_polo['Latitude']), arredondar(rotas_polo['Longitude'])
+        limites = np.flatnonzero(np.r_[True, rotas_polo['Equipe_Unica'].to_numpy()[1:] != rotas_polo['Equipe_Unica'].to_numpy()[:-1], True])
+        for inicio, fim in zip(limites[:-1], limites[1:]):
+            pontos = np.column_stack([latitudes[inicio:fim], longitudes[inicio:fim]])
+            if deposito is not None:
+                pontos = np.vstack([deposito, pontos, deposito])
+            pontos = arredondar(simplificar_linha(pontos, simplificar_m))
+            linhas.append({'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': pontos[:, ::-1].tolist()},
+                           'properties': {'equipe': rotas_polo['Equipe_Unica'].iat[inicio], 'cor': CORES_HEX[rotas_polo['Cor'].iat[inicio]]}})
+        folium.GeoJson({'type': 'FeatureCollection', 'features': linhas}, control=False,
+                       style_function=lambda feature: {'color': feature['properties']['cor'], 'weight': 3, 'opacity': 0.8},
+                       tooltip=folium.GeoJsonTooltip(fields=['equipe'], labels=False)).add_to(camada)
+
+        # Pontos dos serviços: propriedades montadas das colunas, sem iterrows. A cor é aplicada no navegador
+        # (um style_function viraria um caso por serviço no JavaScript do mapa)
+        propriedades = pd.DataFrame({'equipe': rotas_polo['Equipe'].astype(str), 'ordem': rotas_polo['Ordem_Visita'].astype(int),
+                                     'servico': rotas_polo['ID_Servico'].astype(str), 'cor': rotas_polo['Cor'].map(CORES_HEX)})
+        campos, apelidos = ['equipe', 'ordem', 'servico'], ['Equipe', 'Ordem', 'ID Serviço']
+        if 'Valor_Divida' in rotas_polo.columns:
+            propriedades['divida'] = pd.to_numeric(rotas_polo['Valor_Divida'], errors='coerce').map("R$ {:.2f}".format)
+            campos, apelidos = campos + ['divida'], apelidos + ['Dívida']
+        pontos = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]}, 'properties': registro}
+                  for longitude, latitude, registro in zip(longitudes.tolist(), latitudes.tolist(), propriedades.to_dict('records'))]
+        folium.GeoJson({'type': 'FeatureCollection', 'features': pontos}, control=False,
+                       marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=0.9, weight=1), on_each_feature=COR_DO_SERVICO,
+                       popup=folium.GeoJsonPopup(fields=campos, aliases=apelidos)).add_to(camada)
+        camada.add_to(mapa)
+    folium.LayerControl(collapsed=False).add_to(mapa)
+
+
+def _marcadores_detalhados(mapa, rotas, polos):
+    """O mapa antigo: uma linha por equipe e um folium.Marker com popup HTML por serviço."""
+    _marcadores_polos(mapa, polos)
+    coordenadas_polos = {nome: (latitude, longitude) for nome, latitude, longitude in zip(polos['Centro Operativo'], polos['latitude'], polos['longitude'])}
+    for equipe_unica, rota_da_equipe in rotas.groupby('Equipe_Unica', sort=False):
+        cor_da_rota = rota_da_equipe['Cor'].iloc[0]
+        deposito = coordenadas_polos.get(rota_da_equipe['Polo'].iloc[0])
+        pontos_da_rota = list(zip(rota_da_equipe['Latitude'], rota_da_equipe['Longitude']))
+        if deposito is not None: pontos_da_rota = [deposito] + pontos_da_rota + [deposito]
+        folium.PolyLine(pontos_da_rota, color=cor_da_rota, weight=3, opacity=0.8, tooltip=f"<strong>{equipe_unica}</strong>").add_to(mapa)
+        for _, servico in rota_da_equipe.iterrows():
+            popup_html = (f"<strong>Equipe:</strong> {servico['Equipe']}<br><strong>Polo:</strong> {servico['Polo']}<br><strong>Ordem:</strong> {servico['Ordem_Visita']}<br>"
+                          f"<strong>ID Serviço:</strong> {servico['ID_Servico']}")
+            if 'Valor_Divida' in servico: popup_html += f"<br><strong>Dívida:</strong> R$ {float(servico['Valor_Divida']):.2f}"
+            folium.Marker(location=[servico['Latitude'], servico['Longitude']], popup=folium.Popup(popup_html, max_width=300), icon=folium.Icon(color=cor_da_rota, icon='info-sign')).add_to(mapa)
+
+
+def gerar_mapa_de_rotas(df_rotas, df_polos_info, df_servicos_info, polos_processados, modo=MODO_MAPA_PADRAO, simplificar_m=0):
+    """
+    Mapa folium das rotas (sem as linhas de retorno ao depósito) dos polos processados. 'df_servicos_info' fornece as
+    coordenadas se as rotas não as tiverem. 'modo': ver MODOS_MAPA; 'simplificar_m': tolerância em metros da
+    simplificação das linhas no modo rápido (0 = sem simplificar).
+
+    Retorna (mapa, tempo de montagem em segundos), ou (None, 0) se não houver rotas ou polos.
+    """
+    if modo not in MODOS_MAPA: raise ValueError(f"Modo de mapa desconhecido: {modo!r} (use {', '.join(MODOS_MAPA)})")
+    if df_rotas.empty: return None, 0.0
+    polos = df_polos_info[df_polos_info['Centro Operativo'].isin(polos_processados)]
+    if polos.empty: return None, 0.0
+    inicio = time.perf_counter()
+    mapa = folium.Map(location=[polos['latitude'].mean(), polos['longitude'].mean()], zoom_start=10)
+    rotas = _rotas_com_coordenadas(df_rotas, df_servicos_info)
+    if modo == 'rapido':
+        _camadas_rapidas(mapa, rotas, polos, simplificar_m)
+    else:
+        _marcadores_detalhados(mapa, rotas, polos)
+    return mapa, time.perf_counter() - inicio
+
+
+def html_do_mapa(mapa):
+    """HTML completo do mapa (o mesmo que mapa.save grava)."""
+    return mapa.get_root().render()
@@ -0,0 +1,260 @@
+import numpy as np
+
+from prazos_ans import fatores_urgencia
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Sem SciPy, os vizinhos saem de uma busca por blocos de linhas com NumPy
+    cKDTree = None
+
+# ==============================================================================
+# MATRIZES DE DISTÂNCIA E TEMPO PARA O OR-TOOLS
+# Calculadas uma única vez por grupo (polo + tipo de equipe) com NumPy e
+# registradas no solver como matrizes, evitando chamadas Python por arco.
+# ==============================================================================
+RAIO_MEDIO_TERRA_M = 6371008.8  # Mesmo raio médio usado pela biblioteca 'haversine'
+LINHAS_POR_BLOCO_VIZINHOS = 256  # Busca sem SciPy: memória de LINHAS_POR_BLOCO_VIZINHOS x N distâncias
+CUSTO_ARCO_FORA_DO_GRAFO = 10 ** 9  # Arcos fora do grafo de vizinhança (não deveriam ser avaliados)
+
+
+def calcular_distancias_haversine(latitudes, longitudes):
+    """Retorna a matriz NxN de distâncias em linha reta (metros) entre todos os pontos."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[None, :] - lat[:, None]
+    dlon = lon[None, :] - lon[:, None]
+    d = np.sin(dlat * 0.5) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon * 0.5) ** 2
+    return 2 * RAIO_MEDIO_TERRA_M * np.arcsin(np.sqrt(d))
+
+
+def calcular_distancias_pares(lat_origem, lon_origem, lat_destino, lon_destino):
+    """Distâncias em linha reta (metros) elemento a elemento entre dois vetores de pontos."""
+    lat1, lon1 = np.radians(lat_origem), np.radians(lon_origem)
+    lat2, lon2 = np.radians(lat_destino), np.radians(lon_destino)
+    d = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2 * RAIO_MEDIO_TERRA_M * np.arcsin(np.sqrt(d))
+
+
+def extrair_dados_grupo(info_polo, grupo_servicos):
+    """
+    Extrai uma única vez por grupo os arrays contíguos lidos pelo solver e pelo pós-processamento.
+    Coordenadas incluem o depósito na posição 0; os demais arrays têm um valor por serviço.
+    Prazo do ANS e janela do cliente vêm das colunas de prazos_ans.minutos_no_dia (NaN se ausentes).
+    """
+    return {
+        'latitudes': np.concatenate(([info_polo['latitude']], grupo_servicos['Latitude'].to_numpy(dtype=np.float64))),
+        'longitudes': np.concatenate(([info_polo['longitude']], grupo_servicos['Longitude'].to_numpy(dtype=np.float64))),
+        'tempos_execucao': np.ascontiguousarray(grupo_servicos['Tempo_Execucao_Min'].to_numpy(dtype=np.float64)),
+        'valores_divida': np.ascontiguousarray(grupo_servicos['Valor_Divida'].to_numpy(dtype=np.float64)),
+        'ids_servico': grupo_servicos['ID_Servico'].to_numpy(),
+        'prazos_min': _coluna_opcional(grupo_servicos, 'Prazo_ANS_Min'),
+        'janelas_inicio_min': _coluna_opcional(grupo_servicos, 'Janela_Inicio_Min'),
+        'janelas_fim_min': _coluna_opcional(grupo_servicos, 'Janela_Fim_Min'),
+    }
+
+
+def _coluna_opcional(grupo_servicos, coluna):
+    if coluna not in grupo_servicos.columns:
+        return np.full(len(grupo_servicos), np.nan)
+    return np.ascontiguousarray(grupo_servicos[coluna].to_numpy(dtype=np.float64))
+
+
+def recortar_dados_grupo(dados_grupo, indices):
+    """Dados de extrair_dados_grupo só com o depósito e os serviços 'indices' (na ordem dada)."""
+    indices = np.asarray(indices, dtype=np.int64)
+    nos = np.concatenate(([0], indices + 1))
+    return {
+        'latitudes': dados_grupo['latitudes'][nos], 'longitudes': dados_grupo['longitudes'][nos],
+        'tempos_execucao': dados_grupo['tempos_execucao'][indices], 'valores_divida': dados_grupo['valores_divida'][indices],
+        'ids_servico': dados_grupo['ids_servico'][indices], 'prazos_min': dados_grupo['prazos_min'][indices],
+        'janelas_inicio_min': dados_grupo['janelas_inicio_min'][indices], 'janelas_fim_min': dados_grupo['janelas_fim_min'][indices],
+    }
+
+
+def construir_matrizes_grupo(dados_grupo, fator_k, minutos_por_km, fator_custo=1, incluir_tempo=False, provedor=None):
+    """
+    Constrói as matrizes inteiras do grupo a partir de 'extrair_dados_grupo' (nó 0 = depósito).
+    As distâncias vêm do 'provedor' (ver provedores_distancia.py); sem ele, linha reta x Fator K.
+
+    Retorna um dicionário com:
+      - 'distancia_m': distâncias em metros (float), como devolvidas pelo provedor;
+      - 'distancia': 'distancia_m' truncada para inteiro;
+      - 'custo': 'distancia' multiplicada pelo fator de custo da estratégia;
+      - 'tempo': minutos de deslocamento + tempo de execução do nó de origem (se 'incluir_tempo').
+    """
+    if provedor is not None:
+        dist_k_metros = provedor.matriz_distancias(dados_grupo['latitudes'], dados_grupo['longitudes'])
+    else:
+        dist_k_metros = calcular_distancias_haversine(dados_grupo['latitudes'], dados_grupo['longitudes']) * fator_k
+
+    matrizes = {'distancia_m': dist_k_metros, 'distancia': dist_k_metros.astype(np.int64)}
+    matrizes['custo'] = matrizes['distancia'] * fator_custo if fator_custo != 1 else matrizes['distancia']
+
+    if incluir_tempo:
+        execucao_por_no = np.concatenate(([0.0], dados_grupo['tempos_execucao']))
+        tempo_deslocamento = (dist_k_metros / 1000) * minutos_por_km
+        matrizes['tempo'] = (tempo_deslocamento + execucao_por_no[:, None]).astype(np.int64)
+    return matrizes
+
+
+def calcular_penalidades(dados_grupo, matriz_distancia, estrategia):
+    """Penalidade de não atendimento (AddDisjunction) de cada serviço, conforme a estratégia e a urgência do ANS."""
+    valores = dados_grupo['valores_divida']
+    if estrategia == '1':
+        penalidades = np.full(len(valores), 15000, dtype=np.int64)
+    elif estrategia == '2':
+        penalidades = (valores * 100).astype(np.int64)
+    elif estrategia == '3':
+        dist_do_polo = matriz_distancia[0, 1:].copy()
+        dist_do_polo[dist_do_polo == 0] = 1
+        penalidades = ((valores * 10000) / dist_do_polo).astype(np.int64)
+    else:
+        penalidades = np.zeros(len(valores), dtype=np.int64)
+    penalidades = (penalidades * fatores_urgencia(dados_grupo['prazos_min'])).astype(np.int64)
+    penalidades[penalidades <= 0] = 1
+    return penalidades
+
+
+def registrar_matriz(routing, matriz):
+    """Registra uma matriz (nós x nós) como callback de trânsito nativo do OR-Tools."""
+    return routing.RegisterTransitMatrix(matriz.tolist())
+
+
+# ==============================================================================
+# GRAFO DE VIZINHANÇA (GRUPOS GRANDES)
+# Em vez da matriz NxN, cada serviço só se liga aos seus k vizinhos mais
+# próximos (nos dois sentidos) e ao depósito: memória e cálculo O(N·k). Os
+# demais arcos ficam fora do domínio de NextVar no OR-Tools e os valores dos
+# arcos são lidos de dicionários por nó de origem.
+# ==============================================================================
+
+def _coordenadas_esfera(latitudes, longitudes):
+    """Pontos no espaço 3D (esfera unitária): a distância entre eles preserva a ordem das distâncias em linha reta."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def vizinhos_mais_proximos(latitudes, longitudes, k):
+    """
+    Índices (N x k) dos k pontos mais próximos de cada ponto, sem ele mesmo. Usa uma KD-tree (SciPy)
+    se disponível; senão, uma busca por blocos de linhas com NumPy, sem montar a matriz NxN inteira.
+    """
+    pontos = _coordenadas_esfera(latitudes, longitudes)
+    num_pontos = len(pontos)
+    k = min(k, num_pontos - 1)
+    if cKDTree is not None:
+        _, indices = cKDTree(pontos).query(pontos, k + 1)
+        indices = np.asarray(indices).reshape(num_pontos, k + 1)
+        # O próprio ponto sai da lista (com pontos repetidos ele pode não estar na primeira coluna)
+        manter = indices != np.arange(num_pontos)[:, None]
+        manter[manter.all(axis=1), -1] = False
+        return indices[manter].reshape(num_pontos, k)
+    vizinhos = np.empty((num_pontos, k), dtype=np.int64)
+    for inicio in range(0, num_pontos, LINHAS_POR_BLOCO_VIZINHOS):
+        bloco = slice(inicio, min(inicio + LINHAS_POR_BLOCO_VIZINHOS, num_pontos))
+        distancias2 = 2 - 2 * pontos[bloco] @ pontos.T
+        distancias2[np.arange(distancias2.shape[0]), np.arange(bloco.start, bloco.stop)] = np.inf
+        mais_proximos = np.argpartition(distancias2, k - 1, axis=1)[:, :k]
+        ordem = np.argsort(np.take_along_axis(distancias2, mais_proximos, axis=1), axis=1)
+        vizinhos[bloco] = np.take_along_axis(mais_proximos, ordem, axis=1)
+    return vizinhos
+
+
+class GrafoVizinhanca:
+    """Arcos (origem, destino) de um grupo, com os valores de cada arco alinhados em arrays ('distancia_m', 'custo', 'tempo'...)."""
+
+    def __init__(self, num_nos, origens, destinos, valores):
+        self.num_nos = num_nos
+        self.origens, self.destinos, self.valores = origens, destinos, valores
+        self._por_origem = {}
+        self._callbacks = []  # Mantém vivos os callbacks registrados no OR-Tools
+        self.chamadas = {}  # Chamadas de cada callback de trânsito registrado, para a instrumentação
+
+    def __len__(self):
+        return len(self.origens)
+
+    def valores_por_origem(self, nome):
+        """Lista (por nó de origem) de dicionários {destino: valor}, montada uma vez por tipo de valor."""
+        if nome not in self._por_origem:
+            por_origem = [{} for _ in range(self.num_nos)]
+            for origem, destino, valor in zip(self.origens.tolist(), self.destinos.tolist(), self.valores[nome].tolist()):
+                por_origem[origem][destino] = valor
+            self._por_origem[nome] = por_origem
+        return self._por_origem[nome]
+
+    def valor(self, nome, origem, destino):
+        if origem == destino: return 0
+        return self.valores_por_origem(nome)[origem].get(destino, CUSTO_ARCO_FORA_DO_GRAFO)
+
+    def do_deposito(self, nome):
+        """Valores dos arcos depósito -> serviço e serviço -> depósito, por serviço (posição 0 = serviço 1)."""
+        ida, volta = np.zeros(self.num_nos - 1, dtype=self.valores[nome].dtype), np.zeros(self.num_nos - 1, dtype=self.valores[nome].dtype)
+        saindo, chegando = self.origens == 0, self.destinos == 0
+        ida[self.destinos[saindo] - 1] = self.valores[nome][saindo]
+        volta[self.origens[chegando] - 1] = self.valores[nome][chegando]
+        return ida, volta
+
+    def minimo_por_origem(self, nome):
+        """Menor valor entre os arcos que saem de cada serviço (posição 0 = serviço 1)."""
+        minimos = np.full(self.num_nos - 1, np.inf)
+        dos_servicos = self.origens > 0
+        np.minimum.at(minimos, self.origens[dos_servicos] - 1, self.valores[nome][dos_servicos])
+        return minimos
+
+    def recortar(self, mantidos):
+        """Grafo só com o depósito e os serviços 'mantidos' (índices no grupo), renumerados na mesma ordem."""
+        novo_no = np.full(self.num_nos, -1, dtype=np.int64)
+        novo_no[0] = 0
+        novo_no[np.asarray(mantidos) + 1] = np.arange(1, len(mantidos) + 1)
+        arcos = (novo_no[self.origens] >= 0) & (novo_no[self.destinos] >= 0)
+        return GrafoVizinhanca(len(mantidos) + 1, novo_no[self.origens[arcos]], novo_no[self.destinos[arcos]],
+                               {nome: valores[arcos] for nome, valores in self.valores.items()})
+
+    def registrar(self, routing, manager, nome):
+        """Registra os valores 'nome' como callback de trânsito (só os arcos do grafo são avaliados)."""
+        por_origem, no_do_indice, chamadas = self.valores_por_origem(nome), manager.IndexToNode, self.chamadas
+        chamadas[nome] = 0
+
+        def transito(indice_origem, indice_destino):
+            chamadas[nome] += 1
+            origem, destino = no_do_indice(indice_origem), no_do_indice(indice_destino)
+            return 0 if origem == destino else por_origem[origem].get(destino, CUSTO_ARCO_FORA_DO_GRAFO)
+        self._callbacks.append(transito)
+        return routing.RegisterTransitCallback(transito)
+
+    def restringir_sucessores(self, routing, manager):
+        """Limita o NextVar de cada serviço aos destinos do grafo, ao fim das rotas e a ele mesmo (não atendido)."""
+        fins = [routing.End(vehicle_id) for vehicle_id in range(routing.vehicles())]
+        destinos_por_origem = self.valores_por_origem('distancia_m')
+        for no in range(1, self.num_nos):
+            indice = manager.NodeToIndex(no)
+            routing.NextVar(indice).SetValues([indice] + [manager.NodeToIndex(destino) for destino in destinos_por_origem[no] if destino != 0] + fins)
+
+
+def construir_grafo_vizinhanca(dados_grupo, vizinhos_por_servico, minutos_por_km, provedor, fator_custo=1, incluir_tempo=False, arcos_extras=()):
+    """
+    Grafo de vizinhança do grupo (nó 0 = depósito): cada serviço ligado aos seus k vizinhos mais próximos
+    nos dois sentidos, ao depósito e, em 'arcos_extras', a arcos que precisam existir (rotas iniciais).
+    As distâncias vêm de provedor.distancias_pares; os valores seguem construir_matrizes_grupo.
+    """
+    latitudes, longitudes = dados_grupo['latitudes'], dados_grupo['longitudes']
+    num_nos = len(latitudes)
+    servicos = np.arange(1, num_nos)
+    vizinhos = vizinhos_mais_proximos(latitudes[1:], longitudes[1:], vizinhos_por_servico) + 1
+    origens_vizinhos = np.repeat(servicos, vizinhos.shape[1])
+    extras = np.asarray(arcos_extras, dtype=np.int64).reshape(-1, 2)
+    arcos = np.unique(np.column_stack((
+        np.concatenate((origens_vizinhos, vizinhos.ravel(), np.zeros(num_nos - 1, dtype=np.int64), servicos, extras[:, 0])),
+        np.concatenate((vizinhos.ravel(), origens_vizinhos, servicos, np.zeros(num_nos - 1, dtype=np.int64), extras[:, 1])),
+    )), axis=0)
+    origens, destinos = arcos[arcos[:, 0] != arcos[:, 1]].T
+
+    distancia_m = provedor.distancias_pares(latitudes[origens], longitudes[origens], latitudes[destinos], longitudes[destinos])
+    valores = {'distancia_m': distancia_m, 'distancia': distancia_m.astype(np.int64)}
+    valores['custo'] = valores['distancia'] * fator_custo if fator_custo != 1 else valores['distancia']
+    if incluir_tempo:
+        execucao_por_no = np.concatenate(([0.0], dados_grupo['tempos_execucao']))
+        valores['tempo'] = ((distancia_m / 1000) * minutos_por_km + execucao_por_no[origens]).astype(np.int64)
+    return GrafoVizinhanca(num_nos, origens, destinos, valores)
+
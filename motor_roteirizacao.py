@@ -0,0 +1,734 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Sem pyarrow, a leitura usa apenas o leitor C do pandas
+    pa = pa_csv = None
+
+from resolvedor import montar_problema_grupo, resolver_grupos
+from poda_candidatos import MOTIVOS_PODA
+from prazos_ans import data_hora, inicio_da_jornada, minutos_no_dia, horarios_da_rota, dentro_do_ans, COLUNAS_MINUTOS_NO_DIA
+from google_directions import enriquecer_rotas
+from instrumentacao import CronometroEtapas, dados_do_grupo, somar_etapas
+
+# ==============================================================================
+# MOTOR DE ROTEIRIZAÇÃO
+# Leitura e preparação dos dados, filtros do dia e a roteirização completa
+# (montagem dos grupos, solver, Google Directions e tabelas de saída), sem
+# interface. O app Streamlit e o roteirizador de linha de comando (interativo
+# ou em lote) chamam as mesmas funções; o acompanhamento é feito por callbacks.
+# ==============================================================================
+FATOR_CUSTO_DISTANCIA = 50
+MINUTOS_POR_KM = 3  # Premissa: Velocidade média de 20 km/h (60 min / 20 km = 3 min/km)
+FATOR_K_PADRAO = 1.4
+TIPOS_EQUIPE = ("LEVE", "CESTO")
+TIPOS_SERVICO = ('CORTE', 'RECORTE', 'TODOS')
+ID_RETORNO_DEPOSITO = 'RETORNO_AO_DEPOSITO'
+# Coluna 'Motivo_Nao_Roteirizado' da lista de não roteirizados (os motivos da poda vêm de poda_candidatos.MOTIVOS_PODA)
+MOTIVO_POLO_SEM_CADASTRO = "Polo sem cadastro em polos.csv"
+MOTIVO_SEM_EQUIPES = "Polo sem equipes do tipo requerido"
+MOTIVO_SEM_SOLUCAO = "Nenhuma solução viável para o grupo"
+MOTIVO_FORA_DAS_ROTAS = "Não coube nas rotas otimizadas"
+MOTIVO_CANCELADO = "Roteirização cancelada antes de o grupo ser resolvido"
+
+ARQUIVOS_CONFIG = ("polos.csv", "equipes.csv", "feriados.xlsx", "Tempos.csv", "fator_k.csv")
+MAX_DADOS_PREPARADOS = 4  # Conjuntos preparados mantidos em memória (LRU)
+MAX_MEMORIA_DADOS_PREPARADOS_MB = 512
+
+COLUNAS_EQUIPES = ['Centro Operativo', 'Quantidade_equipes_Leves', 'Capacidade_maxima_Leves', 'Quantidades_equipes_Cesto', 'Capacidade_maxima_Cesto']
+COLUNAS_SERVICOS = [
+    'CODIGO_EXTERNO', 'TDC', 'FECHA_CREACION_ORDEN_SIS_EXT', 'FECHA_CREACION_TDC_EORDER', 'ESTADO',
+    'CODIGO_PROCESO', 'DESCRIPCION_PROCESO', 'CODIGO_ORDEN', 'DESCRIPCION_ORDEN', 'CICLO',
+    'FECHA_ACTUALIZACION', 'ETL_TIME', 'CODIGO_CENTRO_OPERATIVO', 'CENTRO_OPERATIVO_TDC',
+    'LONGITUD', 'LATITUD', 'CODIGO_CLIENTE', 'LOCALIDAD', 'CALLE', 'NUMERO_CALLE', 'MUNICIPIO',
+    'BARRIO', 'CODIGO_ZIP', 'COMPLEMENTO', 'MOTIVO_INSPECION', 'CODE_NOTA', 'DESCRIPCION_CODE_NOTA',
+    'MEDIDA', 'DESCIPCION_MEDIDA', 'TEXTO_DIRECCION_COMPLETA', 'ALOC_RECURSOS', 'RESIDUAL',
+    'TDC_FIM', 'ANS_LEGAL', 'ANS_LEGAL_CALCULADO', 'CODIGO_EXTERNO_SAP_CONCAT', 'TIPO_REMESSA',
+    'NUMERO_PROTOCOLO', 'valor_factura_sum', 'TIPO_CORTE', 'Trâmite_Solicitado',
+    'Executor_Solicitado', 'Polo', 'Centro Operativo', 'UT', 'tipo_servico'
+]
+COLUNAS_NECESSARIAS_SERVICOS = {
+    'TDC': 'ID_Servico', 'Centro Operativo': 'Polo', 'LATITUD': 'Latitude',
+    'LONGITUD': 'Longitude', 'valor_factura_sum': 'Valor_Divida',
+    'tipo_servico': 'Tipo_Servico', 'MUNICIPIO': 'Municipio',
+    'Executor_Solicitado': 'Tipo_Equipe_Requerida',
+    'Trâmite_Solicitado': 'Mix_Solic', 'ANS_LEGAL': 'ANS_Legal',
+    'ANS_LEGAL_CALCULADO': 'ANS_Legal_Calculado'
+}
+# Janela de atendimento combinada com o cliente (HH:MM), em colunas opcionais depois das de COLUNAS_SERVICOS
+COLUNAS_OPCIONAIS_SERVICOS = {'JANELA_INICIO': 'Janela_Inicio', 'JANELA_FIM': 'Janela_Fim'}
+# Tipos das colunas lidas de servicos.csv: textos de poucos valores distintos viram categorias
+COLUNAS_NUMERICAS_SERVICOS = ['LATITUD', 'LONGITUD', 'valor_factura_sum']
+COLUNAS_CATEGORICAS_SERVICOS = ['Centro Operativo', 'MUNICIPIO', 'tipo_servico', 'Executor_Solicitado', 'Trâmite_Solicitado']
+LEITOR_SERVICOS_PADRAO = 'pyarrow' if pa_csv is not None else 'c'
+
+
+def _numero(serie):
+    """Converte textos com vírgula decimal em números (inválidos viram NaN). Colunas já numéricas passam direto."""
+    if pd.api.types.is_numeric_dtype(serie): return serie
+    return pd.to_numeric(serie.astype(str).str.replace(',', '.'), errors='coerce')
+
+
+def _texto_padronizado(serie):
+    """strip + upper como categoria, aplicado só aos valores distintos (vazios viram 'NAN', como em astype(str))."""
+    serie = serie.astype('category')
+    categorias = serie.cat.categories.astype(str).str.strip().str.upper()
+    categorias_finais, novos_codigos = np.unique(np.append(categorias.to_numpy(dtype=object), 'NAN'), return_inverse=True)
+    codigos = novos_codigos[serie.cat.codes.to_numpy()]  # código -1 (vazio) aponta para o 'NAN' acrescentado no fim
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=categorias_finais), index=serie.index, name=serie.name)
+
+
+def _nada(*args, **kwargs):
+    pass
+
+# ==============================================================================
+# LEITURA E PREPARAÇÃO DOS DADOS
+# ==============================================================================
+
+def carregar_dados_config():
+    """Lê os arquivos de configuração do diretório atual: (polos, equipes, feriados, tempos, fator_k)."""
+    arquivo_polos, arquivo_equipes, arquivo_feriados, arquivo_tempos, arquivo_fator_k = ARQUIVOS_CONFIG
+    df_polos = pd.read_csv(arquivo_polos, encoding='utf-8', sep=';')
+    df_equipes = pd.read_csv(arquivo_equipes, encoding='utf-8', sep=';', header=None, names=COLUNAS_EQUIPES, skiprows=1, on_bad_lines='skip')
+    df_feriados = pd.read_excel(arquivo_feriados)
+    df_tempos = pd.read_csv(arquivo_tempos, encoding='utf-8', sep=';')
+    df_fator_k = pd.read_csv(arquivo_fator_k, encoding='utf-8', sep=';')
+    return df_polos, df_equipes, df_feriados, df_tempos, df_fator_k
+
+
+def _colunas_do_arquivo(arquivo):
+    """
+    Nomes das colunas do arquivo de serviços: as posições fixas de COLUNAS_SERVICOS e, se o cabeçalho trouxer
+    depois delas alguma de COLUNAS_OPCIONAIS_SERVICOS, as do cabeçalho (as demais com um nome genérico).
+    """
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+        cabecalho = arquivo.readline()
+        arquivo.seek(0)
+    else:
+        with open(arquivo, 'rb') as f:
+            cabecalho = f.readline()
+    if isinstance(cabecalho, bytes): cabecalho = cabecalho.decode('utf-8-sig', errors='replace')
+    extras = [nome.strip() for nome in cabecalho.rstrip('\r\n').split(';')[len(COLUNAS_SERVICOS):]]
+    if not set(extras) & set(COLUNAS_OPCIONAIS_SERVICOS): return COLUNAS_SERVICOS
+    return COLUNAS_SERVICOS + [nome if nome in COLUNAS_OPCIONAIS_SERVICOS else f'COLUNA_EXTRA_{posicao}' for posicao, nome in enumerate(extras, start=1)]
+
+
+def _ler_servicos_pyarrow(arquivo, colunas, usadas, decimal_virgula=True):
+    categoria = pa.dictionary(pa.int32(), pa.string())
+    tipos = {coluna: pa.string() for coluna in usadas}
+    tipos.update({coluna: categoria for coluna in COLUNAS_CATEGORICAS_SERVICOS})
+    if decimal_virgula:
+        tipos.update({coluna: pa.float64() for coluna in COLUNAS_NUMERICAS_SERVICOS})
+    tabela = pa_csv.read_csv(
+        arquivo,
+        read_options=pa_csv.ReadOptions(column_names=colunas, skip_rows=1),
+        parse_options=pa_csv.ParseOptions(delimiter=';', invalid_row_handler=lambda linha: 'skip'),
+        convert_options=pa_csv.ConvertOptions(include_columns=usadas, column_types=tipos, decimal_point=',', strings_can_be_null=True)
+    )
+    return tabela.to_pandas()
+
+
+def carregar_dados_servicos(arquivo="servicos.csv", leitor=LEITOR_SERVICOS_PADRAO, registrar=None):
+    """
+    Lê do arquivo de serviços do dia (caminho ou arquivo aberto) só as colunas usadas na roteirização,
+    com os tipos já definidos: IDs como texto, coordenadas e valores com vírgula decimal como números e
+    polo, município, tipo de serviço, equipe e mix como categorias. 'leitor': 'pyarrow' ou 'c' (pandas).
+    Colunas numéricas fora do padrão (ponto decimal) ficam como texto e são convertidas em preparar_dados.
+    As colunas de COLUNAS_OPCIONAIS_SERVICOS são lidas se o cabeçalho as trouxer depois das posições fixas.
+    """
+    inicio = time.perf_counter()
+    colunas = _colunas_do_arquivo(arquivo)
+    usadas = list(COLUNAS_NECESSARIAS_SERVICOS) + [coluna for coluna in COLUNAS_OPCIONAIS_SERVICOS if coluna in colunas]
+    if leitor == 'pyarrow':
+        try:
+            df = _ler_servicos_pyarrow(arquivo, colunas, usadas)
+        except pa.ArrowInvalid:
+            if hasattr(arquivo, 'seek'): arquivo.seek(0)
+            df = _ler_servicos_pyarrow(arquivo, colunas, usadas, decimal_virgula=False)
+    else:
+        tipos = {coluna: str for coluna in usadas if coluna not in COLUNAS_NUMERICAS_SERVICOS}
+        tipos.update({coluna: 'category' for coluna in COLUNAS_CATEGORICAS_SERVICOS})
+        df = pd.read_csv(arquivo, encoding='utf-8', sep=';', header=None, names=colunas, skiprows=1, usecols=usadas,
+                         dtype=tipos, decimal=',', on_bad_lines='skip')
+    duracao = time.perf_counter() - inicio
+    if registrar:
+        registrar(f"Serviços lidos: {len(df)} linhas em {duracao:.2f}s ({len(df) / max(duracao, 1e-9):,.0f} linhas/s, leitor {leitor}).")
+    return df
+
+
+def preparar_dados(df_polos, df_equipes, df_servicos_raw, df_feriados, df_tempos, df_fator_k, avisar=print):
+    """
+    Padroniza os dados lidos para a roteirização. Não altera os DataFrames recebidos.
+    Retorna (df_servicos, df_polos_completo, df_feriados, jornada_trabalho_min, servicos_extras_improdutividade).
+    Os avisos (polos sem Fator K, serviços sem tempo de execução) são enviados para 'avisar'.
+    """
+    df_polos, df_equipes, df_feriados, df_fator_k = df_polos.copy(), df_equipes.copy(), df_feriados.copy(), df_fator_k.copy()
+    df_polos.columns = [str(col).strip() for col in df_polos.columns]
+    df_fator_k.columns = [str(col).strip() for col in df_fator_k.columns]
+    df_fator_k.rename(columns={'Fator K Estimado': 'Fator_K_Estimado'}, inplace=True)
+
+    # Tempos de execução e jornada
+    df_tempos_execucao = df_tempos[['Equipe', 'Serviço', 'Mix_solic', 'Tempo Execução']].copy().dropna()
+    df_tempos_execucao['Tempo_Execucao_Min'] = pd.to_timedelta(df_tempos_execucao['Tempo Execução']).dt.total_seconds() / 60
+    tempo_total_str = df_tempos.loc[0, 'Total']
+    tempo_total_timedelta = pd.to_timedelta(tempo_total_str + ':00' if len(tempo_total_str) <= 5 else tempo_total_str)
+    jornada_trabalho_min = tempo_total_timedelta.total_seconds() / 60
+    servicos_extras_improdutividade = float(str(df_tempos.loc[0, 'Improdutividade_serviços_extras']).replace(',', '.'))
+
+    # Fator K por polo
+    df_fator_k['Centro Operativo'] = df_fator_k['Centro Operativo'].astype(str).str.strip().str.upper()
+    df_fator_k['Fator_K_Estimado'] = _numero(df_fator_k['Fator_K_Estimado'])
+    df_polos['Centro Operativo'] = df_polos['Centro Operativo'].astype(str).str.strip().str.upper()
+    df_polos = pd.merge(df_polos, df_fator_k[['Centro Operativo', 'Fator_K_Estimado']], on='Centro Operativo', how='left')
+
+    polos_sem_k = df_polos[df_polos['Fator_K_Estimado'].isnull()]
+    if not polos_sem_k.empty:
+        avisar(f"AVISO: Os polos {polos_sem_k['Centro Operativo'].tolist()} não foram encontrados em 'fator_k.csv' e usarão um Fator K padrão de {FATOR_K_PADRAO}.")
+        df_polos['Fator_K_Estimado'] = df_polos['Fator_K_Estimado'].fillna(FATOR_K_PADRAO)
+
+    # Serviços
+    colunas_opcionais = {coluna: nome for coluna, nome in COLUNAS_OPCIONAIS_SERVICOS.items() if coluna in df_servicos_raw.columns}
+    df_servicos = df_servicos_raw[list(COLUNAS_NECESSARIAS_SERVICOS) + list(colunas_opcionais)].rename(columns={**COLUNAS_NECESSARIAS_SERVICOS, **colunas_opcionais})
+    # Prazo do ANS: o calculado, se houver; senão, o legal
+    df_servicos['Prazo_ANS'] = data_hora(df_servicos.pop('ANS_Legal_Calculado')).fillna(data_hora(df_servicos.pop('ANS_Legal')))
+    for col in ['Polo', 'Municipio', 'Tipo_Servico', 'Tipo_Equipe_Requerida', 'Mix_Solic']:
+        df_servicos[col] = _texto_padronizado(df_servicos[col])
+    for col_tempo in ['Equipe', 'Serviço', 'Mix_solic']:
+        df_tempos_execucao[col_tempo] = df_tempos_execucao[col_tempo].astype(str).str.strip().str.upper()
+
+    df_servicos = df_servicos[df_servicos['Polo'] != 'NAN'].copy()
+    df_servicos = pd.merge(
+        df_servicos,
+        df_tempos_execucao[['Equipe', 'Serviço', 'Mix_solic', 'Tempo_Execucao_Min']],
+        left_on=['Tipo_Equipe_Requerida', 'Tipo_Servico', 'Mix_Solic'],
+        right_on=['Equipe', 'Serviço', 'Mix_solic'],
+        how='left'
+    )
+    for col in ['Tipo_Servico', 'Tipo_Equipe_Requerida', 'Mix_Solic']:  # o merge devolve as chaves como texto
+        df_servicos[col] = df_servicos[col].astype('category')
+
+    servicos_sem_tempo = df_servicos[df_servicos['Tempo_Execucao_Min'].isnull()]
+    if not servicos_sem_tempo.empty:
+        avisar(f"AVISO: {len(servicos_sem_tempo)} serviços não encontraram tempo de execução em Tempos.csv e foram removidos da roteirização.")
+        df_servicos.dropna(subset=['Tempo_Execucao_Min'], inplace=True)
+
+    # Padronizações finais
+    df_equipes['Centro Operativo'] = df_equipes['Centro Operativo'].astype(str).str.strip().str.upper()
+    df_feriados.columns = [str(col).strip() for col in df_feriados.columns]
+    df_feriados['Municipio'] = df_feriados['Municipio'].astype(str).str.strip().str.upper()
+    df_feriados['FECHA'] = pd.to_datetime(df_feriados['FECHA'], errors='coerce')
+    df_servicos.dropna(subset=['Polo', 'Municipio', 'Latitude', 'Longitude'], inplace=True)
+
+    df_polos['latitude'] = _numero(df_polos['latitude'])
+    df_polos['longitude'] = _numero(df_polos['longitude'])
+    df_servicos['Latitude'] = _numero(df_servicos['Latitude'])
+    df_servicos['Longitude'] = _numero(df_servicos['Longitude'])
+    df_servicos['Valor_Divida'] = _numero(df_servicos['Valor_Divida']).fillna(0)
+
+    df_polos_completo = pd.merge(df_polos, df_equipes, on="Centro Operativo")
+    return df_servicos, df_polos_completo, df_feriados, jornada_trabalho_min, servicos_extras_improdutividade
+
+# ==============================================================================
+# CACHE DE DADOS PREPARADOS
+# Para uma interface que roda de novo a cada interação: os dados preparados
+# ficam em memória, indexados pelo hash do conteúdo do arquivo de serviços e
+# pela data de modificação dos arquivos de configuração. Mantém os conjuntos
+# usados mais recentemente, dentro de um limite de quantidade e de memória.
+# ==============================================================================
+
+def assinatura_config():
+    """(arquivo, data de modificação, tamanho) de cada arquivo de configuração; muda quando algum é alterado."""
+    assinatura = []
+    for arquivo in ARQUIVOS_CONFIG:
+        try:
+            estado = os.stat(arquivo)
+            assinatura.append((arquivo, estado.st_mtime_ns, estado.st_size))
+        except OSError:
+            assinatura.append((arquivo, None, None))
+    return tuple(assinatura)
+
+
+def chave_dados_preparados(conteudo_servicos, assinatura=None):
+    """Chave do cache: hash do conteúdo do arquivo de serviços + assinatura da configuração."""
+    resumo = hashlib.blake2b(conteudo_servicos, digest_size=16)
+    resumo.update(repr(assinatura if assinatura is not None else assinatura_config()).encode('utf-8'))
+    return resumo.hexdigest()
+
+
+def _tamanho_bytes(valor):
+    """Memória ocupada pelos DataFrames/Series de um valor (tuplas e listas são percorridas)."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return int(np.sum(valor.memory_usage(deep=True)))
+    if isinstance(valor, (tuple, list)):
+        return sum(_tamanho_bytes(item) for item in valor)
+    return 0
+
+
+class CacheDadosPreparados:
+    """LRU de dados preparados, com limite de itens e de memória. Pode ser compartilhado entre threads."""
+
+    def __init__(self, max_itens=MAX_DADOS_PREPARADOS, max_memoria_mb=MAX_MEMORIA_DADOS_PREPARADOS_MB):
+        self.max_itens = max_itens
+        self.max_bytes = int(max_memoria_mb * 1024 * 1024)
+        self.itens = OrderedDict()  # chave -> (valor, bytes)
+        self.bytes_ocupados = 0
+        self.acertos = self.falhas = 0
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self.itens:
+                self.falhas += 1
+                return None
+            self.itens.move_to_end(chave)
+            self.acertos += 1
+            return self.itens[chave][0]
+
+    def guardar(self, chave, valor):
+        """Guarda o valor e descarta os menos usados recentemente até caber nos limites. Retorna o valor."""
+        tamanho = _tamanho_bytes(valor)
+        with self._lock:
+            if chave in self.itens:
+                self.bytes_ocupados -= self.itens.pop(chave)[1]
+            self.itens[chave] = (valor, tamanho)
+            self.bytes_ocupados += tamanho
+            while len(self.itens) > 1 and (len(self.itens) > self.max_itens or self.bytes_ocupados > self.max_bytes):
+                _, (_, tamanho_descartado) = self.itens.popitem(last=False)
+                self.bytes_ocupados -= tamanho_descartado
+        return valor
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {'itens': len(self.itens), 'memoria_mb': round(self.bytes_ocupados / (1024 * 1024), 1), 'acertos': self.acertos, 'falhas': self.falhas,
+                    'taxa_acerto_%': round(100 * self.acertos / consultas, 1) if consultas else 0.0}
+
+# ==============================================================================
+# DATA DE DESPACHO E FILTROS
+# ==============================================================================
+
+def calcular_data_despacho(hoje=None):
+    """Próximo dia de despacho: o dia seguinte, ou a segunda-feira a partir de sexta e sábado."""
+    hoje = hoje or date.today()
+    dias_ate_despacho = {4: 3, 5: 2}.get(hoje.weekday(), 1)
+    return hoje + timedelta(days=dias_ate_despacho)
+
+
+class IndiceFeriados:
+    """
+    Feriados de feriados.xlsx pré-calculados em conjuntos de datas: os gerais (COD_MUNICIPIO 0) e os de cada
+    município, já com as vésperas. Cada consulta é só uma busca em conjunto, sem percorrer o DataFrame.
+    """
+
+    def __init__(self, df_feriados):
+        df_feriados = df_feriados.rename(columns=lambda col: str(col).strip()).dropna(subset=['FECHA'])
+        self.gerais = set(pd.to_datetime(df_feriados.loc[df_feriados['COD_MUNICIPIO'] == 0, 'FECHA']).dt.date)
+        self.por_municipio = {municipio: set(pd.to_datetime(datas).dt.date)
+                              for municipio, datas in df_feriados.groupby(df_feriados['Municipio'].astype(str).str.strip().str.upper())['FECHA']}
+        self.restritas_gerais = self._com_vesperas(self.gerais)
+        self.restritas_por_municipio = {municipio: self._com_vesperas(datas) | self.restritas_gerais for municipio, datas in self.por_municipio.items()}
+
+    @staticmethod
+    def _com_vesperas(datas):
+        return set(datas) | {data - timedelta(days=1) for data in datas}
+
+    def feriado_geral(self, data):
+        return data in self.gerais
+
+    def restrito(self, data, municipio):
+        """Se a data é feriado ou véspera de feriado (geral ou do município)."""
+        return data in self.restritas_por_municipio.get(municipio, self.restritas_gerais)
+
+
+def indice_feriados(df_feriados):
+    """IndiceFeriados a partir do DataFrame de feriados (um IndiceFeriados já montado é devolvido como está)."""
+    return df_feriados if isinstance(df_feriados, IndiceFeriados) else IndiceFeriados(df_feriados)
+
+
+def verificar_dia_restrito(data_atual, municipios_do_polo, df_feriados):
+    """
+    Retorna (restrito, motivo): cortes não são feitos de sexta a domingo nem em feriados e vésperas.
+    'df_feriados' pode ser o DataFrame de feriados ou um IndiceFeriados (mais rápido em consultas repetidas).
+    """
+    if data_atual.weekday() in [4, 5, 6]:
+        dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+        return True, f"{dias_semana[data_atual.weekday()]}"
+    feriados = indice_feriados(df_feriados)
+    if any(feriados.restrito(data_atual, municipio) for municipio in municipios_do_polo) or feriados.restrito(data_atual, None):
+        return True, "Feriado ou Véspera de Feriado"
+    return False, ""
+
+
+def servicos_dos_polos(df_servicos, polos, tipo_servico):
+    """Serviços dos polos escolhidos, do tipo pedido ('CORTE', 'RECORTE' ou 'TODOS'), sem olhar o dia de despacho."""
+    if tipo_servico not in TIPOS_SERVICO:
+        raise ValueError(f"Tipo de serviço inválido: {tipo_servico}. Use {', '.join(TIPOS_SERVICO)}.")
+    servicos_a_processar = df_servicos[df_servicos['Polo'].isin(polos)]
+    if tipo_servico == 'TODOS':
+        return servicos_a_processar.copy()
+    return servicos_a_processar[servicos_a_processar['Tipo_Servico'] == tipo_servico].copy()
+
+
+def filtrar_servicos(df_servicos, polos, tipo_servico, data_despacho, df_feriados):
+    """
+    Serviços dos polos escolhidos, do tipo pedido ('CORTE', 'RECORTE' ou 'TODOS').
+    Levanta ValueError se o pedido inclui cortes e o dia de despacho é restrito.
+    """
+    servicos_a_processar = servicos_dos_polos(df_servicos, polos, tipo_servico)
+    restrito, motivo = verificar_dia_restrito(data_despacho, df_servicos.loc[df_servicos['Polo'].isin(polos), 'Municipio'].unique(), df_feriados)
+    if restrito and tipo_servico in ['CORTE', 'TODOS']:
+        raise ValueError(f"Roteirização de CORTES não é permitida para o dia {data_despacho.strftime('%d/%m/%Y')} ({motivo}).")
+    return servicos_a_processar
+
+# ==============================================================================
+# PLANO ANTERIOR (REOTIMIZAÇÃO)
+# Um rotas_otimizadas.csv já gerado (pelo app ou pelo roteirizador) vira a
+# solução inicial de cada grupo. Serviços que saíram do arquivo do dia são
+# retirados das rotas e os novos ficam para a busca local encaixar.
+# ==============================================================================
+
+def carregar_plano_anterior(arquivo):
+    """Rotas de um rotas_otimizadas.csv: {(polo, tipo_equipe): {índice da equipe: [ID_Servico na ordem de visita]}}."""
+    if hasattr(arquivo, 'seek'): arquivo.seek(0)
+    df = pd.read_csv(arquivo, sep=';', encoding='utf-8-sig', usecols=['Polo', 'Equipe', 'Tipo_Equipe', 'Ordem_Visita', 'ID_Servico'], dtype={'ID_Servico': str})
+    df = df[df['ID_Servico'] != ID_RETORNO_DEPOSITO].copy()
+    df['Indice_Equipe'] = df['Equipe'].astype(str).str.extract(r'(\d+)\s*$', expand=False).astype(int) - 1
+    plano = {}
+    for (polo, tipo_equipe, indice_equipe), rota in df.sort_values('Ordem_Visita').groupby(['Polo', 'Tipo_Equipe', 'Indice_Equipe'], sort=False):
+        plano.setdefault((str(polo).strip().upper(), str(tipo_equipe).strip().upper()), {})[int(indice_equipe)] = rota['ID_Servico'].str.strip().tolist()
+    return plano
+
+
+def rotas_iniciais_do_plano(rotas_plano, ids_servico):
+    """
+    Converte as rotas de um grupo do plano anterior em índices dos serviços do grupo atual.
+    Retorna (rotas, {'mantidos', 'removidos', 'novos'}).
+    """
+    posicoes = {str(id_servico): posicao for posicao, id_servico in enumerate(ids_servico)}
+    rotas = [[] for _ in range(max(rotas_plano) + 1)] if rotas_plano else []
+    for indice_equipe, ids_rota in rotas_plano.items():
+        rotas[indice_equipe] = [posicoes[id_servico] for id_servico in ids_rota if id_servico in posicoes]
+    mantidos = sum(len(rota) for rota in rotas)
+    no_plano = sum(len(ids_rota) for ids_rota in rotas_plano.values())
+    return rotas, {'mantidos': mantidos, 'removidos': no_plano - mantidos, 'novos': len(ids_servico) - mantidos}
+
+# ==============================================================================
+# ROTEIRIZAÇÃO
+# ==============================================================================
+
+def _montar_problemas(df_servicos_filtrado, df_polos_completo, parametros_solver, plano_anterior=None):
+    """
+    Etapa 1: um problema por grupo (polo + tipo de equipe), com as rotas do plano anterior, se houver.
+    Retorna (problemas, grupos_servicos, servicos_sem_grupo).
+    """
+    problemas, grupos_servicos, servicos_sem_grupo = [], [], []
+    for nome_polo_atual in sorted(df_servicos_filtrado['Polo'].unique()):
+        servicos_do_polo = df_servicos_filtrado[df_servicos_filtrado['Polo'] == nome_polo_atual]
+        polo_filtrado = df_polos_completo[df_polos_completo['Centro Operativo'] == nome_polo_atual]
+        if polo_filtrado.empty:
+            servicos_sem_grupo.append(servicos_do_polo.assign(Motivo_Nao_Roteirizado=MOTIVO_POLO_SEM_CADASTRO))
+            continue
+
+        info_polo = polo_filtrado.iloc[0]
+        for tipo_equipe in TIPOS_EQUIPE:
+            if tipo_equipe == "LEVE":
+                num_equipes = int(info_polo.get('Quantidade_equipes_Leves', 0))
+                capacidade_base = int(info_polo.get('Capacidade_maxima_Leves', 0))
+            else:
+                num_equipes = int(info_polo.get('Quantidades_equipes_Cesto', 0))
+                capacidade_base = int(info_polo.get('Capacidade_maxima_Cesto', 0))
+
+            grupo_servicos = servicos_do_polo[servicos_do_polo['Tipo_Equipe_Requerida'] == tipo_equipe].copy()
+            if grupo_servicos.empty: continue
+            if num_equipes == 0:
+                servicos_sem_grupo.append(grupo_servicos.assign(Motivo_Nao_Roteirizado=MOTIVO_SEM_EQUIPES))
+                continue
+
+            problema = montar_problema_grupo(nome_polo_atual, tipo_equipe, info_polo, grupo_servicos, num_equipes, capacidade_base, parametros_solver)
+            if plano_anterior and (nome_polo_atual, tipo_equipe) in plano_anterior:
+                problema['rotas_iniciais'], problema['plano_anterior'] = rotas_iniciais_do_plano(plano_anterior[(nome_polo_atual, tipo_equipe)], problema['dados_grupo']['ids_servico'])
+            problemas.append(problema)
+            grupos_servicos.append(grupo_servicos)
+    return problemas, grupos_servicos, servicos_sem_grupo
+
+
+def _coordenadas_rota(problema, pontos_da_rota_indices):
+    """(depósito, [pontos da rota]) como pares (lat, lon)."""
+    latitudes, longitudes = problema['dados_grupo']['latitudes'], problema['dados_grupo']['longitudes']
+    nos_da_rota = np.array(pontos_da_rota_indices) + 1
+    return (latitudes[0], longitudes[0]), list(zip(latitudes[nos_da_rota].tolist(), longitudes[nos_da_rota].tolist()))
+
+
+def _horarios_equipe(problema, resultado, vehicle_id, minutos_por_km):
+    """(chegadas em minutos desde o início da jornada, com o retorno ao depósito no fim; serviços dentro do ANS) de uma rota."""
+    dados_grupo, pontos_da_rota_indices = problema['dados_grupo'], resultado['rotas'][vehicle_id]
+    execucao = dados_grupo['tempos_execucao'][pontos_da_rota_indices]
+    chegadas = horarios_da_rota(resultado['trechos_m'][vehicle_id], execucao, dados_grupo['janelas_inicio_min'][pontos_da_rota_indices], minutos_por_km)
+    return chegadas, dentro_do_ans(chegadas[:-1], execucao, dados_grupo['prazos_min'][pontos_da_rota_indices])
+
+
+def _linhas_rota(problema, resultado, vehicle_id, legs_info, minutos_por_km, inicio_jornada):
+    """Linhas da tabela de rotas de uma equipe: um trecho por serviço e o retorno ao depósito."""
+    nome_polo_atual, tipo_equipe, dados_grupo = problema['polo'], problema['tipo_equipe'], problema['dados_grupo']
+    pontos_da_rota_indices = resultado['rotas'][vehicle_id]
+    chegadas, no_prazo = _horarios_equipe(problema, resultado, vehicle_id, minutos_por_km)
+    deposito, pontos = _coordenadas_rota(problema, pontos_da_rota_indices)
+
+    gmaps_url = "N/A"
+    if legs_info:
+        origin_url = f"{deposito[0]},{deposito[1]}"
+        waypoints_url = "/".join([f"{lat},{lon}" for lat, lon in pontos])
+        gmaps_url = f"https://www.google.com/maps/dir/{origin_url}/{waypoints_url}/{origin_url}"
+
+    # Trechos depósito -> serviços -> depósito calculados de uma vez para a rota
+    km_trechos = np.array(resultado['trechos_m'][vehicle_id]) / 1000
+    equipe = {'Polo': nome_polo_atual, 'Equipe': f"Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}", 'Tipo_Equipe': tipo_equipe.capitalize()}
+    linhas = []
+    for i in range(len(pontos_da_rota_indices) + 1):
+        if i < len(pontos_da_rota_indices):
+            serv_idx = pontos_da_rota_indices[i]
+            prazo_min = dados_grupo['prazos_min'][serv_idx]
+            servico = {'ID_Servico': dados_grupo['ids_servico'][serv_idx], 'Valor_Divida': dados_grupo['valores_divida'][serv_idx], 'Tempo_Execucao_Min': dados_grupo['tempos_execucao'][serv_idx],
+                       'Prazo_ANS': "" if np.isnan(prazo_min) else (inicio_jornada + pd.Timedelta(minutes=prazo_min)).strftime('%d/%m/%Y %H:%M'), 'Dentro_do_ANS': bool(no_prazo[i])}
+            leg = legs_info[i] if legs_info and i < len(legs_info) else None
+        else:
+            servico = {'ID_Servico': ID_RETORNO_DEPOSITO, 'Valor_Divida': 0, 'Tempo_Execucao_Min': 0, 'Prazo_ANS': "", 'Dentro_do_ANS': None}
+            leg = legs_info[-1] if legs_info and len(legs_info) == len(pontos_da_rota_indices) + 1 else None
+
+        km_trecho_google, tempo_trecho_google = "N/A", "N/A"
+        if leg:
+            km_trecho_google, tempo_trecho_google = round(leg['distance']['value'] / 1000, 2), round(leg['duration']['value'] / 60, 2)
+        linhas.append({
+            **equipe, 'Ordem_Visita': i + 1, **servico,
+            'Chegada_Estimada': (inicio_jornada + pd.Timedelta(minutes=chegadas[i])).strftime('%H:%M'),
+            'KM_Trecho_Estimado': round(km_trechos[i], 2),
+            'Tempo_Trecho_Estimado_Min': round(km_trechos[i] * minutos_por_km, 2),
+            'KM_Trecho_Google': km_trecho_google, 'Tempo_Trecho_Google_Min': tempo_trecho_google,
+            'Link_Google_Maps': gmaps_url
+        })
+    return linhas
+
+
+def resumir_equipes(todas_as_rotas_df):
+    """Totais por equipe (serviços, dívida, km e tempos) a partir da tabela de rotas."""
+    if todas_as_rotas_df.empty: return pd.DataFrame()
+    df_resumo = todas_as_rotas_df.groupby('Equipe').agg(
+        Quantidade_servicos_alocados=('ID_Servico', lambda x: (x != ID_RETORNO_DEPOSITO).sum()),
+        Valor_Total_Divida=('Valor_Divida', 'sum'),
+        KM_percorridos=('KM_Trecho_Estimado', 'sum'),
+        Tempo_total_deslocamento=('Tempo_Trecho_Estimado_Min', 'sum'),
+        Tempo_total_servicos=('Tempo_Execucao_Min', 'sum')
+    ).reset_index()
+    df_resumo.rename(columns={'Valor_Total_Divida': 'Valor_Total_Divida_R$'}, inplace=True)
+    df_resumo['Tempo_total_rota'] = df_resumo['Tempo_total_deslocamento'] + df_resumo['Tempo_total_servicos']
+    return df_resumo
+
+
+def roteirizar_por_grupo(df_servicos_filtrado, df_polos_completo, parametros, chave_api="", cache_directions=None, cache_resultados=None, plano_anterior=None, ao_progredir=None, registrar=None, cancelamento=None, instrumentacao=None):
+    """
+    Gerador da roteirização (argumentos como em executar_roteirizacao): um registro por grupo (polo + tipo de equipe),
+    assim que o grupo é resolvido e montado, na ordem dos grupos. Cada registro é um dict com 'polo', 'tipo_equipe',
+    'linhas_rotas' (lista de dicts, um por trecho), 'nao_atendidos' (DataFrame, com o 'Motivo_Nao_Roteirizado', ou None),
+    'relatorio' (a linha do resumo do dia, ou None), 'evolucao_objetivo' (as melhoras do custo durante a busca:
+    [segundos, custo]) e 'avisos' (falhas da fonte de distâncias, como consultas ao OSRM sem resposta). Os serviços que não formam grupo (polo sem cadastro, sem equipes do tipo requerido) vêm antes,
+    num registro com 'polo' None; se 'cancelamento' (threading.Event) for acionado, os grupos em andamento (também os
+    do pool de processos) ficam com a melhor solução já encontrada e os serviços dos grupos seguintes vêm num último registro com 'polo' None.
+    Com 'instrumentacao' (instrumentacao.Instrumentacao), cada grupo resolvido deixa lá os tempos das etapas e as
+    estatísticas da busca.
+    """
+    ao_progredir, registrar = ao_progredir or _nada, registrar or _nada
+    minutos_por_km = parametros.get('MINUTOS_POR_KM', MINUTOS_POR_KM)
+    parametros_solver = {'MINUTOS_POR_KM': minutos_por_km, 'FATOR_CUSTO_DISTANCIA': parametros.get('FATOR_CUSTO_DISTANCIA', FATOR_CUSTO_DISTANCIA), **parametros}
+    num_processos = parametros.get('num_processos', 1)
+    inicio_jornada = inicio_da_jornada(parametros.get('data_despacho') or calcular_data_despacho(), parametros.get('INICIO_JORNADA'))
+    sem_colunas_internas = lambda df: df.drop(columns=COLUNAS_MINUTOS_NO_DIA)
+
+    cronometro = CronometroEtapas()
+    problemas, grupos_servicos, sem_grupo = _montar_problemas(minutos_no_dia(df_servicos_filtrado, inicio_jornada), df_polos_completo, parametros_solver, plano_anterior)
+    cronometro.marcar('montagem_problemas')
+    if instrumentacao is not None: instrumentacao.acrescentar_etapas(cronometro.etapas)
+    if sem_grupo:
+        yield {'polo': None, 'tipo_equipe': None, 'linhas_rotas': [], 'nao_atendidos': sem_colunas_internas(pd.concat(sem_grupo)), 'relatorio': None, 'evolucao_objetivo': []}
+
+    # Os grupos são resolvidos (em paralelo, se configurado) e cada um é montado assim que sai do solver, na ordem original;
+    # as consultas à Google Directions de um grupo (em paralelo) correm enquanto os grupos seguintes são resolvidos
+    registrar(f"\nOtimizando {len(problemas)} grupo(s) com até {num_processos} processo(s) em paralelo...")
+    resultados = resolver_grupos(problemas, num_processos, cache=cache_resultados, cancelamento=cancelamento)
+    try:
+        yield from _montar_grupos(problemas, grupos_servicos, resultados, inicio_jornada, minutos_por_km, chave_api, cache_directions, ao_progredir, registrar, instrumentacao)
+    finally:
+        resultados.close()  # Gerador fechado antes do fim: os grupos da fila do pool não são resolvidos
+
+
+def _montar_grupos(problemas, grupos_servicos, resultados, inicio_jornada, minutos_por_km, chave_api, cache_directions, ao_progredir, registrar, instrumentacao):
+    """Corpo de roteirizar_por_grupo: monta o registro de cada grupo assim que 'resultados' o entrega."""
+    sem_colunas_internas = lambda df: df.drop(columns=COLUNAS_MINUTOS_NO_DIA)
+    consultar_directions = cache_directions is not None and (cache_directions.modo_offline or bool(chave_api))
+    for posicao, (problema, grupo_servicos) in enumerate(zip(problemas, grupos_servicos)):
+        cronometro = CronometroEtapas()
+        resultado = next(resultados, None)
+        cronometro.marcar('espera_resultado')
+        if resultado is None:  # Cancelamento: os grupos seguintes não chegaram a ser resolvidos
+            registrar(f"\nRoteirização cancelada: {len(problemas) - posicao} grupo(s) não resolvido(s).")
+            restantes = pd.concat(grupos_servicos[posicao:]).assign(Motivo_Nao_Roteirizado=MOTIVO_CANCELADO)
+            yield {'polo': None, 'tipo_equipe': None, 'linhas_rotas': [], 'nao_atendidos': sem_colunas_internas(restantes), 'relatorio': None, 'evolucao_objetivo': []}
+            return
+        nome_polo_atual, tipo_equipe, dados_grupo = problema['polo'], problema['tipo_equipe'], problema['dados_grupo']
+        registro = {'polo': nome_polo_atual, 'tipo_equipe': tipo_equipe, 'linhas_rotas': [], 'nao_atendidos': None, 'relatorio': None,
+                    'evolucao_objetivo': resultado.get('evolucao_objetivo', []), 'avisos': resultado.get('avisos_distancias', [])}
+        ao_progredir((posicao + 1) / len(problemas), f"Polo concluído: {nome_polo_atual} - {tipo_equipe}")
+
+        registrar(f"\n--- ROTAS PARA: {nome_polo_atual} - EQUIPES {tipo_equipe} (usando Fator K: {problema['fator_k']:.2f}) ---")
+        if problema['restricao'] == '1':
+            registrar("  - Usando restrição por CAPACIDADE DE SERVIÇOS.")
+        else:
+            registrar(f"  - Usando restrição por TEMPO DE TRABALHO ({problema['jornada_min']} min).")
+
+        for aviso in registro['avisos']:
+            registrar(f"  - AVISO: {aviso}")
+        if not resultado['solucao_encontrada']:
+            registrar(f"NÃO FOI ENCONTRADA NENHUMA SOLUÇÃO VIÁVEL para {nome_polo_atual} - EQUIPES {tipo_equipe}.")
+            registro['nao_atendidos'] = sem_colunas_internas(grupo_servicos.assign(Motivo_Nao_Roteirizado=MOTIVO_SEM_SOLUCAO))
+            if instrumentacao is not None: instrumentacao.registrar_grupo(_dados_instrumentacao(problema, resultado, cronometro, inicio_jornada))
+            yield registro
+            continue
+
+        legs_por_rota = {}
+        if consultar_directions:
+            equipes_com_rota = [vehicle_id for vehicle_id, pontos_da_rota_indices in enumerate(resultado['rotas']) if pontos_da_rota_indices]
+            inicio_consultas = time.time()
+            legs_por_rota = dict(zip(equipes_com_rota, enriquecer_rotas(
+                [_coordenadas_rota(problema, resultado['rotas'][vehicle_id]) for vehicle_id in equipes_com_rota], chave_api, cache=cache_directions,
+                avisar=lambda aviso: registrar(f"  - AVISO GOOGLE API: {aviso}"))))
+            registrar(f"  - Consultas ao Google Maps para {len(equipes_com_rota)} rota(s) concluídas em {time.time() - inicio_consultas:.1f}s.")
+            cronometro.marcar('enriquecimento_google')
+
+        servicos_atendidos_indices, equipes_usadas, dentro_ans, minutos_equipes = [], 0, 0, 0
+        for vehicle_id, pontos_da_rota_indices in enumerate(resultado['rotas']):
+            if not pontos_da_rota_indices: continue
+            equipes_usadas += 1
+            servicos_atendidos_indices.extend(pontos_da_rota_indices)
+            chegadas, no_prazo = _horarios_equipe(problema, resultado, vehicle_id, minutos_por_km)
+            dentro_ans, minutos_equipes = dentro_ans + int(no_prazo.sum()), minutos_equipes + chegadas[-1]
+            legs_info = legs_por_rota.get(vehicle_id)
+            if consultar_directions and not legs_info:
+                registrar(f"  - AVISO: Falha na consulta à API do Google para a Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}. Usando apenas estimativas locais.")
+            registro['linhas_rotas'].extend(_linhas_rota(problema, resultado, vehicle_id, legs_info, minutos_por_km, inicio_jornada))
+
+        registrar(f"Solução encontrada! Serviços atendidos: {len(servicos_atendidos_indices)} de {len(grupo_servicos)}. Equipes usadas: {equipes_usadas} de {problema['num_equipes']}")
+        registrar(f"  - Dentro do ANS: {dentro_ans} serviço(s) em {minutos_equipes / 60:.1f} equipe-hora(s) ({dentro_ans / max(minutos_equipes / 60, 1e-9):.2f} por equipe-hora).")
+        if resultado['podados']:
+            contagem = pd.Series(list(resultado['podados'].values())).value_counts()
+            registrar(f"  - Poda: {len(resultado['podados'])} serviço(s) fora do modelo ({'; '.join(f'{quantidade} {MOTIVOS_PODA[codigo].lower()}' for codigo, quantidade in contagem.items())}).")
+        if problema.get('plano_anterior'):
+            alteracoes = problema['plano_anterior']
+            origem = "reotimizado a partir do plano anterior" if resultado['partiu_do_plano_anterior'] else "plano anterior não pôde ser aproveitado, resolvido do zero"
+            registrar(f"  - Plano anterior: {alteracoes['mantidos']} serviço(s) mantido(s) nas rotas, {alteracoes['novos']} novo(s), {alteracoes['removidos']} removido(s); {origem}.")
+        if resultado.get('cancelado'):
+            registrar("  - Busca interrompida pelo cancelamento: rotas da melhor solução encontrada até então.")
+        if resultado['reaproveitado']:
+            registrar("  - Mesmas entradas de uma execução anterior: rotas reaproveitadas do cache, sem passar pelo solver.")
+        else:
+            registrar(f"  - Tempo do solver: {resultado['tempo_solver_s']:.1f}s de {resultado['tempo_limite_s']:.1f}s disponíveis{' (encerrado por convergência)' if resultado['encerrado_por_convergencia'] else ''}.")
+            if resultado['vizinhos_por_servico']:
+                registrar(f"  - Arcos restritos aos {resultado['vizinhos_por_servico']} vizinhos mais próximos de cada serviço: {resultado['arcos_no_modelo']} arcos no modelo.")
+            if resultado['decomposicao']:
+                decomposicao = resultado['decomposicao']
+                registrar(f"  - Grupo dividido em {decomposicao['subproblemas']} subproblema(s) ({decomposicao['metodo']}): {decomposicao['tempo_subproblemas_s']:.1f}s nos subproblemas"
+                          f" e {decomposicao.get('tempo_busca_local_s', 0):.1f}s na busca local entre as rotas.")
+        nao_atendidos_indices = resultado['nao_atendidos']
+        if nao_atendidos_indices:
+            motivos = [MOTIVOS_PODA[resultado['podados'][indice]] if indice in resultado['podados'] else MOTIVO_FORA_DAS_ROTAS for indice in nao_atendidos_indices]
+            registro['nao_atendidos'] = sem_colunas_internas(grupo_servicos.iloc[nao_atendidos_indices].assign(Motivo_Nao_Roteirizado=motivos))
+        registro['relatorio'] = {
+            'Polo': f"{nome_polo_atual} - {tipo_equipe}", 'Data': time.strftime("%Y-%m-%d"),
+            'Total_Servicos_Disponiveis': len(grupo_servicos), 'Servicos_Roteirizados': len(servicos_atendidos_indices),
+            'Servicos_Nao_Roteirizados': len(nao_atendidos_indices),
+            'Aproveitamento_%': f"{(len(servicos_atendidos_indices) / len(grupo_servicos) * 100):.2f}" if len(grupo_servicos) > 0 else "0.00",
+            'Valor_Total_Roteirizado_R$': dados_grupo['valores_divida'][servicos_atendidos_indices].sum(),
+            'Servicos_Dentro_ANS': dentro_ans, 'Equipe_Horas': round(minutos_equipes / 60, 2),
+            'Dentro_ANS_por_Equipe_Hora': round(dentro_ans / (minutos_equipes / 60), 2) if minutos_equipes else 0.0,
+            'Tempo_Solver_s': resultado['tempo_solver_s']
+        }
+        cronometro.marcar('montagem_rotas')
+        if instrumentacao is not None: instrumentacao.registrar_grupo(_dados_instrumentacao(problema, resultado, cronometro, inicio_jornada))
+        yield registro
+
+
+def _dados_instrumentacao(problema, resultado, cronometro, inicio_jornada):
+    """Registro de instrumentação do grupo: as etapas do solver (as de um grupo reaproveitado do cache não contam) e as da montagem."""
+    etapas = somar_etapas({} if resultado['reaproveitado'] else resultado.get('etapas_s'), cronometro.etapas)
+    return dados_do_grupo(problema, resultado, etapas, inicio_jornada.date().isoformat())
+
+
+class GravadorCSV:
+    """
+    CSV gravado aos pedaços, no formato das saídas do roteirizador (';' e utf-8-sig). O arquivo só é criado no primeiro
+    pedaço não vazio, com o cabeçalho de 'colunas' (ou as colunas desse pedaço), e os seguintes seguem as mesmas colunas.
+    """
+    def __init__(self, caminho, colunas=None):
+        self.caminho, self.colunas, self.linhas, self._arquivo = caminho, colunas, 0, None
+
+    def acrescentar(self, df):
+        if df is None or df.empty: return
+        if self._arquivo is None:
+            self.colunas = list(self.colunas or df.columns)
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8-sig', newline='')
+            df.to_csv(self._arquivo, columns=self.colunas, index=False, sep=';')
+        else:
+            df.reindex(columns=self.colunas).to_csv(self._arquivo, index=False, header=False, sep=';')
+        self._arquivo.flush()
+        self.linhas += len(df)
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.fechar()
+
+
+def executar_roteirizacao(df_servicos_filtrado, df_polos_completo, parametros, chave_api="", cache_directions=None, cache_resultados=None, plano_anterior=None, ao_progredir=None, registrar=None, ao_concluir_grupo=None, cancelamento=None, instrumentacao=None):
+    """
+    Roteiriza os serviços já filtrados, grupo a grupo (polo + tipo de equipe).
+
+    'parametros': estrategia ('1' curta, '2' valiosa, '3' eficiente), restricao ('1' capacidade,
+    '2' tempo), JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE e, opcionalmente,
+    num_processos, provedor_distancia, MINUTOS_POR_KM, FATOR_CUSTO_DISTANCIA, decomposicao, equipes_por_subproblema,
+    podar_candidatos, vizinhos_por_servico, data_despacho (padrão: calcular_data_despacho()) e INICIO_JORNADA ('HH:MM'),
+    que situam os prazos do ANS e as janelas dos clientes no dia (ver prazos_ans.py).
+    Com 'cache_directions' (CacheDirections) as rotas são enriquecidas pela Google Directions.
+    Com 'cache_resultados' (resolvedor.CacheResultados) só os grupos com entradas novas passam pelo solver.
+    Com 'plano_anterior' (carregar_plano_anterior) cada grupo é reotimizado a partir das rotas já planejadas.
+    'ao_progredir(fracao, texto)' acompanha o andamento e 'registrar(mensagem)' recebe o relatório de cada grupo;
+    'ao_concluir_grupo(registro)' recebe o resultado de cada grupo assim que fica pronto (ver roteirizar_por_grupo);
+    'cancelamento' (threading.Event) interrompe a roteirização, que devolve o que já estiver pronto.
+    'instrumentacao' (instrumentacao.Instrumentacao) recebe os tempos por etapa e as estatísticas de cada grupo.
+
+    Retorna (rotas, servicos_nao_atendidos, resumo_equipes, resumo_dia); cada não atendido traz o 'Motivo_Nao_Roteirizado'.
+    """
+    linhas_rotas, nao_atendidos, dados_relatorio = [], [], []
+    for registro in roteirizar_por_grupo(df_servicos_filtrado, df_polos_completo, parametros, chave_api, cache_directions, cache_resultados, plano_anterior, ao_progredir, registrar, cancelamento, instrumentacao):
+        if ao_concluir_grupo is not None: ao_concluir_grupo(registro)
+        linhas_rotas.extend(registro['linhas_rotas'])
+        if registro['nao_atendidos'] is not None: nao_atendidos.append(registro['nao_atendidos'])
+        if registro['relatorio'] is not None: dados_relatorio.append(registro['relatorio'])
+
+    (ao_progredir or _nada)(1.0, "Processo concluído!")
+    todas_as_rotas_df = pd.DataFrame(linhas_rotas)
+    servicos_nao_atendidos_df = pd.concat(nao_atendidos) if nao_atendidos else pd.DataFrame()
+    return todas_as_rotas_df, servicos_nao_atendidos_df, resumir_equipes(todas_as_rotas_df), pd.DataFrame(dados_relatorio)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from motor_roteirizacao import executar_roteirizacao, indice_feriados
+
+# ==============================================================================
+# PLANEJAMENTO DE VÁRIOS DIAS (HORIZONTE ROLANTE)
+# A carteira de serviços é distribuída pelos próximos dias de trabalho: cada
+# dia é roteirizado como um despacho comum (os grupos do dia em paralelo) e os
+# serviços que não couberam passam para o dia seguinte, com o prazo do ANS
+# mais próximo. Cortes ficam retidos nos dias restritos do município (sexta,
+# feriado e véspera); recortes seguem em qualquer dia de trabalho.
+# ==============================================================================
+MAX_DIAS_PLANEJAMENTO = 10
+MOTIVO_CORTE_RETIDO = "Corte sem dia permitido no horizonte planejado"
+
+
+def dias_de_trabalho(data_inicial, num_dias, feriados):
+    """Os 'num_dias' primeiros dias de trabalho a partir de 'data_inicial': segunda a sexta, fora dos feriados gerais."""
+    dias, data = [], data_inicial
+    while len(dias) < num_dias:
+        if data.weekday() < 5 and not feriados.feriado_geral(data):
+            dias.append(data)
+        data += timedelta(days=1)
+    return dias
+
+
+def cortes_retidos(df_servicos, data, feriados):
+    """Máscara dos cortes que não podem sair na data (sexta ou feriado/véspera no município do serviço)."""
+    cortes = (df_servicos['Tipo_Servico'] == 'CORTE').to_numpy()
+    if data.weekday() in [4, 5, 6]:
+        return cortes
+    restritos = {municipio for municipio in df_servicos['Municipio'].unique() if feriados.restrito(data, municipio)}
+    return cortes & df_servicos['Municipio'].isin(restritos).to_numpy()
+
+
+def planejar_dias(df_servicos_filtrado, df_polos_completo, parametros, data_inicial, num_dias, df_feriados, ao_progredir=None, registrar=None, **opcoes):
+    """
+    Roteiriza a carteira nos próximos 'num_dias' dias de trabalho a partir de 'data_inicial' (ver executar_roteirizacao
+    para 'parametros' e 'opcoes': chave_api, cache_directions, cache_resultados, ao_concluir_grupo, cancelamento,
+    instrumentacao). 'df_feriados': DataFrame ou IndiceFeriados. Com o cancelamento, os dias seguintes não são
+    planejados e a carteira restante fica de fora.
+
+    Retorna as mesmas quatro tabelas de executar_roteirizacao, com a coluna 'Data_Despacho': rotas e resumos de todos
+    os dias e os serviços que ficaram de fora ao fim do horizonte (com o motivo do último dia em que foram tentados).
+    """
+    ao_progredir, registrar = ao_progredir or (lambda fracao, texto: None), registrar or (lambda mensagem: None)
+    feriados = indice_feriados(df_feriados)
+    dias = dias_de_trabalho(data_inicial, min(max(int(num_dias), 1), MAX_DIAS_PLANEJAMENTO), feriados)
+    pendentes = df_servicos_filtrado.assign(Motivo_Nao_Roteirizado=MOTIVO_CORTE_RETIDO)
+    rotas, resumos_equipes, resumos_dia = [], [], []
+
+    cancelamento = opcoes.get('cancelamento')
+    for posicao, data in enumerate(dias):
+        if cancelamento is not None and cancelamento.is_set(): break
+        retidos = cortes_retidos(pendentes, data, feriados)
+        do_dia = pendentes[~retidos].drop(columns='Motivo_Nao_Roteirizado')
+        registrar(f"\n===== DIA {posicao + 1} de {len(dias)}: {data.strftime('%d/%m/%Y')} - {len(do_dia)} serviço(s) na carteira, {int(retidos.sum())} corte(s) retido(s) =====")
+        if do_dia.empty: continue
+        progresso_dia = lambda fracao, texto, posicao=posicao: ao_progredir((posicao + fracao) / len(dias), f"{data.strftime('%d/%m')}: {texto}")
+        rotas_dia, nao_atendidos_dia, resumo_equipes_dia, resumo_dia = executar_roteirizacao(
+            do_dia, df_polos_completo, {**parametros, 'data_despacho': data}, ao_progredir=progresso_dia, registrar=registrar, **opcoes)
+        for tabela, destino in ((rotas_dia, rotas), (resumo_equipes_dia, resumos_equipes), (resumo_dia, resumos_dia)):
+            if not tabela.empty:
+                destino.append(tabela.assign(Data_Despacho=data.isoformat())[['Data_Despacho', *tabela.columns]])
+        # Os não atendidos do dia (com o motivo) voltam à carteira junto com os cortes retidos
+        pendentes = pd.concat([pendentes[retidos], nao_atendidos_dia]) if not nao_atendidos_dia.empty else pendentes[retidos]
+        registrar(f"Dia {data.strftime('%d/%m/%Y')}: {len(do_dia) - len(nao_atendidos_dia)} serviço(s) roteirizado(s); {len(pendentes)} passam para o próximo dia.")
+
+    ao_progredir(1.0, "Planejamento concluído!")
+    concatenar = lambda tabelas: pd.concat(tabelas, ignore_index=True) if tabelas else pd.DataFrame()
+    return concatenar(rotas), pendentes, concatenar(resumos_equipes), concatenar(resumos_dia)
@@ -0,0 +1,86 @@
+import numpy as np
+
+# ==============================================================================
+# PODA DE CANDIDATOS ANTES DO MODELO
+# Serviços que nenhuma rota consegue atender (ida e volta ao polo maior que a
+# jornada) ou que ficam muito atrás na ordem de vantagem da estratégia, quando
+# há bem mais serviços do que vagas nas equipes, saem do grupo antes do
+# RoutingModel: o modelo fica menor, resolve mais rápido e converge melhor.
+# Serviços cuja janela (ANS ou cliente) não pode ser alcançada também saem.
+# Cada serviço descartado leva o motivo para a lista de não roteirizados.
+# ==============================================================================
+FOLGA_CANDIDATOS = 2.0  # Candidatos mantidos por vaga estimada nas equipes
+MOTIVOS_PODA = {
+    'fora_da_jornada': "Ida e volta ao polo não cabem na jornada",
+    'excedente': "Fora dos candidatos mais vantajosos para as vagas das equipes",
+    'fora_da_janela': "Janela de atendimento ou prazo legal inalcançável no dia",
+}
+
+
+def perfil_das_matrizes(matrizes):
+    """Valores por serviço usados na poda (idas e voltas ao depósito, menor parada), a partir das matrizes do grupo."""
+    perfil = {'custo_ida_volta': matrizes['custo'][0, 1:] + matrizes['custo'][1:, 0]}
+    if 'tempo' in matrizes:
+        tempo = matrizes['tempo']
+        tempo_servicos = tempo[1:, 1:].astype(np.float64)
+        np.fill_diagonal(tempo_servicos, np.inf)
+        perfil['tempo_ida'] = tempo[0, 1:]
+        perfil['tempo_ida_volta'] = tempo[0, 1:] + tempo[1:, 0]
+        perfil['tempo_minimo_parada'] = np.minimum(tempo_servicos.min(axis=1, initial=np.inf), tempo[1:, 0])
+    return perfil
+
+
+def perfil_do_grafo(grafo):
+    """Os mesmos valores de perfil_das_matrizes, a partir de um matrizes.GrafoVizinhanca."""
+    ida, volta = grafo.do_deposito('custo')
+    perfil = {'custo_ida_volta': ida + volta}
+    if 'tempo' in grafo.valores:
+        ida, volta = grafo.do_deposito('tempo')
+        perfil['tempo_ida'], perfil['tempo_ida_volta'] = ida, ida + volta
+        perfil['tempo_minimo_parada'] = grafo.minimo_por_origem('tempo')
+    return perfil
+
+
+def estimar_vagas(problema, perfil):
+    """
+    Limite superior de serviços atendidos pelo grupo. Por capacidade: equipes x capacidade.
+    Por tempo: cada serviço consome ao menos seu trecho mais curto de saída (execução incluída);
+    uma equipe não passa dos serviços mais rápidos cuja soma cabe na jornada.
+    """
+    if problema['restricao'] == '1':
+        return problema['num_equipes'] * problema['capacidade_servicos']
+    if 'tempo_minimo_parada' not in perfil:
+        return None
+    paradas = np.cumsum(np.sort(perfil['tempo_minimo_parada']))
+    return problema['num_equipes'] * int(np.searchsorted(paradas, problema['jornada_min'], side='right'))
+
+
+def servicos_fora_da_janela(perfil, janelas):
+    """{índice: 'fora_da_janela'} dos serviços com janela vazia ou que fecha antes da chegada direta do polo."""
+    abertura, fechamento = janelas
+    inalcancaveis = abertura > fechamento
+    if 'tempo_ida' in perfil:
+        inalcancaveis |= perfil['tempo_ida'] > fechamento
+    return dict.fromkeys(np.flatnonzero(inalcancaveis).tolist(), 'fora_da_janela')
+
+
+def podar_candidatos(problema, perfil, penalidades, janelas=None):
+    """
+    Escolhe os serviços do grupo que entram no modelo ('perfil' de perfil_das_matrizes ou perfil_do_grafo;
+    'janelas' de prazos_ans.janelas_de_atendimento, se houver).
+    Retorna (índices mantidos, {índice descartado: código do motivo em MOTIVOS_PODA}).
+    """
+    num_servicos = len(penalidades)
+    motivos = servicos_fora_da_janela(perfil, janelas) if janelas is not None else {}
+    if problema['restricao'] == '2' and 'tempo_ida_volta' in perfil:
+        motivos.update(dict.fromkeys(np.flatnonzero(perfil['tempo_ida_volta'] > problema['jornada_min']).tolist(), 'fora_da_jornada'))
+
+    # Vantagem de cada serviço para a estratégia: penalidade de não atender / custo de ida e volta ao polo
+    vagas = estimar_vagas(problema, perfil)
+    candidatos = np.array([indice for indice in range(num_servicos) if indice not in motivos], dtype=np.int64)
+    if vagas is not None and len(candidatos) > FOLGA_CANDIDATOS * vagas:
+        custo_ida_e_volta = np.maximum(perfil['custo_ida_volta'], 1)[candidatos]
+        ordem = np.argsort(-(penalidades[candidatos] / custo_ida_e_volta), kind='stable')
+        motivos.update(dict.fromkeys(candidatos[ordem[int(FOLGA_CANDIDATOS * vagas):]].tolist(), 'excedente'))
+    mantidos = np.array([indice for indice in range(num_servicos) if indice not in motivos], dtype=np.int64)
+    return mantidos, motivos
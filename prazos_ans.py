@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# PRAZOS DE ANS E JANELAS DE ATENDIMENTO
+# O prazo legal (ANS) de cada serviço e a janela combinada com o cliente, se
+# houver, viram minutos contados do início da jornada do dia de despacho. No
+# modelo, são a faixa permitida do CumulVar da dimensão Time de cada serviço;
+# prazos próximos (ou vencidos) aumentam a penalidade de não atender.
+# ==============================================================================
+INICIO_JORNADA_PADRAO = "08:00"
+FATOR_URGENCIA_MAXIMO = 4.0  # Penalidade de não atender de um serviço com o ANS vencendo hoje (ou vencido)
+HORIZONTE_URGENCIA_DIAS = 3  # Prazos a partir deste número de dias não aumentam a penalidade
+HORIZONTE_SEM_JORNADA_MIN = 24 * 60  # Restrição por capacidade: as janelas valem dentro do dia
+MINUTOS_POR_DIA = 24 * 60
+COLUNAS_MINUTOS_NO_DIA = ['Prazo_ANS_Min', 'Janela_Inicio_Min', 'Janela_Fim_Min']  # Acrescentadas por minutos_no_dia
+
+
+def data_hora(serie):
+    """Converte textos de data e hora ('AAAA-MM-DD HH:MM:SS' ou 'DD/MM/AAAA HH:MM') em datetime (inválidos viram NaT)."""
+    if pd.api.types.is_datetime64_any_dtype(serie): return serie
+    textos = serie.astype('string').str.strip()
+    # ISO primeiro: com dayfirst, '2026-11-03' viraria 11 de março
+    datas = pd.to_datetime(textos, errors='coerce', format='ISO8601')
+    restantes = datas.isna() & textos.notna()
+    if restantes.any():
+        datas[restantes] = pd.to_datetime(textos[restantes], errors='coerce', dayfirst=True, format='mixed')
+    return datas
+
+
+def inicio_da_jornada(data_despacho, inicio=None):
+    """Data e hora de saída das equipes no dia de despacho ('inicio' no formato HH:MM)."""
+    return pd.Timestamp(data_despacho) + pd.to_timedelta(f"{inicio or INICIO_JORNADA_PADRAO}:00")
+
+
+def minutos_no_dia(df_servicos, inicio_jornada):
+    """
+    Acrescenta aos serviços (cópia) o prazo do ANS e a janela do cliente em minutos desde 'inicio_jornada':
+    'Prazo_ANS_Min' (negativo se já vencido), 'Janela_Inicio_Min' e 'Janela_Fim_Min'. Sem a informação, NaN.
+    """
+    df = df_servicos.copy()
+    sem_valor = pd.Series(np.nan, index=df.index)
+    prazos = df['Prazo_ANS'] if 'Prazo_ANS' in df.columns else pd.Series(pd.NaT, index=df.index)
+    df['Prazo_ANS_Min'] = (prazos - inicio_jornada).dt.total_seconds() / 60
+    inicio_min = inicio_jornada.hour * 60 + inicio_jornada.minute
+    for coluna, coluna_min in (('Janela_Inicio', 'Janela_Inicio_Min'), ('Janela_Fim', 'Janela_Fim_Min')):
+        if coluna not in df.columns:
+            df[coluna_min] = sem_valor
+            continue
+        horarios = df[coluna].astype('string').str.strip()
+        horarios = horarios.where(horarios.str.count(':') != 1, horarios + ':00')  # HH:MM -> HH:MM:SS
+        df[coluna_min] = pd.to_timedelta(horarios, errors='coerce').dt.total_seconds() / 60 - inicio_min
+    return df
+
+
+def fatores_urgencia(prazos_min):
+    """Multiplicador da penalidade de cada serviço: FATOR_URGENCIA_MAXIMO no prazo do dia, caindo até 1 no horizonte."""
+    prazos_min = np.asarray(prazos_min, dtype=np.float64)
+    fatores = 1 + (FATOR_URGENCIA_MAXIMO - 1) * np.clip(1 - prazos_min / (MINUTOS_POR_DIA * HORIZONTE_URGENCIA_DIAS), 0, 1)
+    return np.where(np.isnan(prazos_min), 1.0, fatores)
+
+
+def janelas_de_atendimento(dados_grupo, horizonte_min):
+    """
+    (abertura, fechamento) da chegada a cada serviço, em minutos inteiros desde o início da jornada, limitados ao horizonte.
+    O fechamento é o menor entre o fim da janela do cliente e o último início que termina o serviço dentro do ANS;
+    um ANS que já não pode ser cumprido não limita a chegada (pesa só na penalidade). Abertura > fechamento: inviável.
+    """
+    ultimo_inicio_ans = dados_grupo['prazos_min'] - dados_grupo['tempos_execucao']
+    fechamento = np.fmin(dados_grupo['janelas_fim_min'], np.where(ultimo_inicio_ans >= 0, ultimo_inicio_ans, np.nan))
+    fechamento = np.floor(np.fmin(np.nan_to_num(fechamento, nan=horizonte_min), horizonte_min)).astype(np.int64)
+    abertura = np.ceil(np.clip(np.nan_to_num(dados_grupo['janelas_inicio_min'], nan=0), 0, None)).astype(np.int64)
+    return abertura, fechamento
+
+
+def horarios_da_rota(trechos_m, tempos_execucao, janelas_inicio_min, minutos_por_km):
+    """
+    Chegada a cada serviço de uma rota e ao depósito no retorno, em minutos desde o início da jornada, como no
+    modelo: cada trecho leva o deslocamento mais a execução do serviço de origem (truncados para inteiro) e a
+    equipe espera a abertura da janela.
+    """
+    aberturas = np.ceil(np.clip(np.nan_to_num(np.asarray(janelas_inicio_min, dtype=np.float64), nan=0), 0, None))
+    chegadas, relogio, execucao_anterior = [], 0, 0.0
+    for trecho_m, execucao, abertura in zip(trechos_m, list(tempos_execucao) + [0.0], aberturas.tolist() + [0]):
+        relogio = max(relogio + int(trecho_m / 1000 * minutos_por_km + execucao_anterior), int(abertura))
+        chegadas.append(relogio)
+        execucao_anterior = execucao
+    return chegadas
+
+
+def dentro_do_ans(chegadas_min, tempos_execucao, prazos_min):
+    """Serviços concluídos até o prazo do ANS (os sem prazo contam como dentro)."""
+    termino = np.asarray(chegadas_min, dtype=np.float64) + np.asarray(tempos_execucao, dtype=np.float64)
+    prazos_min = np.asarray(prazos_min, dtype=np.float64)
+    return np.isnan(prazos_min) | (termino <= prazos_min)
@@ -0,0 +1,272 @@
+import os
+import sqlite3
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import requests
+
+from matrizes import calcular_distancias_haversine, calcular_distancias_pares
+
+# ==============================================================================
+# PROVEDORES DE MATRIZ DE DISTÂNCIAS
+# Cada provedor devolve a matriz NxN (metros, float) usada pelo solver:
+#   - 'haversine': linha reta x Fator K do polo (padrão);
+#   - 'faixas_k': linha reta x Fator K da faixa de distância (analise_k_por_distancia.csv);
+#   - 'tabela': distâncias reais já conhecidas (SQLite), com reserva em linha reta x K;
+#   - 'osrm': serviço compatível com o /table do OSRM, consultado em blocos.
+# A configuração é um dicionário simples para poder viajar junto com o problema
+# até os processos do resolvedor; o provedor é criado lá com 'criar_provedor'.
+# Os provedores com 'distancias_pares' também calculam só os arcos de um grafo
+# de vizinhança (matrizes.construir_grafo_vizinhanca), sem a matriz inteira.
+# ==============================================================================
+ARQUIVO_TABELA_DISTANCIAS = "tabela_distancias.sqlite"
+CASAS_DECIMAIS_TABELA = 5
+URL_OSRM_PADRAO = "http://localhost:5000"
+PERFIL_OSRM = "driving"
+PONTOS_POR_BLOCO_OSRM = 50  # origens + destinos de um bloco ficam dentro do max-table-size padrão (100)
+TIMEOUT_OSRM_S = 60
+PARAMETROS_POR_CONSULTA_SQLITE = 500
+ARQUIVO_FAIXAS_K = "analise_k_por_distancia.csv"
+MIN_AMOSTRAS_FAIXA_K = 20  # Faixas com menos amostras usam o Fator K do polo
+
+
+class TabelaDistanciasReais:
+    """Tabela persistente (SQLite) de distâncias reais entre pares de pontos."""
+
+    def __init__(self, caminho=ARQUIVO_TABELA_DISTANCIAS, casas_decimais=CASAS_DECIMAIS_TABELA):
+        self.casas_decimais = casas_decimais
+        self._conexao = sqlite3.connect(caminho)
+        with self._conexao:
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS trechos (origem TEXT NOT NULL, destino TEXT NOT NULL, distancia_m REAL NOT NULL, PRIMARY KEY (origem, destino))")
+
+    def chaves(self, latitudes, longitudes):
+        return [f"{lat:.{self.casas_decimais}f},{lon:.{self.casas_decimais}f}" for lat, lon in zip(np.asarray(latitudes, dtype=np.float64).tolist(), np.asarray(longitudes, dtype=np.float64).tolist())]
+
+    def preencher_matriz(self, latitudes, longitudes, matriz):
+        """Sobrescreve em 'matriz' os pares presentes na tabela. Retorna quantos foram encontrados."""
+        chaves = self.chaves(latitudes, longitudes)
+        posicoes = {}
+        for posicao, chave in enumerate(chaves):
+            posicoes.setdefault(chave, []).append(posicao)
+        unicas = list(posicoes)
+        encontrados = 0
+        for inicio in range(0, len(unicas), PARAMETROS_POR_CONSULTA_SQLITE):
+            bloco = unicas[inicio:inicio + PARAMETROS_POR_CONSULTA_SQLITE]
+            consulta = f"SELECT origem, destino, distancia_m FROM trechos WHERE origem IN ({','.join('?' * len(bloco))})"
+            for origem, destino, distancia_m in self._conexao.execute(consulta, bloco):
+                if destino in posicoes:
+                    for i in posicoes[origem]:
+                        for j in posicoes[destino]:
+                            matriz[i, j] = distancia_m
+                            encontrados += 1
+        return encontrados
+
+    def salvar_matriz(self, latitudes, longitudes, matriz, linhas, colunas):
+        """Grava os pares (linhas x colunas) de 'matriz' que tenham valor válido."""
+        chaves = self.chaves(latitudes, longitudes)
+        registros = [(chaves[i], chaves[j], float(matriz[i, j])) for i in linhas for j in colunas if i != j and np.isfinite(matriz[i, j])]
+        with self._conexao:
+            self._conexao.executemany("INSERT OR REPLACE INTO trechos (origem, destino, distancia_m) VALUES (?, ?, ?)", registros)
+        return len(registros)
+
+    def fechar(self):
+        self._conexao.close()
+
+
+class ProvedorHaversineK:
+    """Distância em linha reta multiplicada pelo Fator K do polo."""
+
+    def __init__(self, fator_k):
+        self.fator_k = fator_k
+
+    def matriz_distancias(self, latitudes, longitudes):
+        return calcular_distancias_haversine(latitudes, longitudes) * self.fator_k
+
+    def distancias_pares(self, lat_origem, lon_origem, lat_destino, lon_destino):
+        return calcular_distancias_pares(lat_origem, lon_origem, lat_destino, lon_destino) * self.fator_k
+
+
+def _estado_arquivo(caminho):
+    """(data de modificação, tamanho) do arquivo, ou None se ele não existe."""
+    if not caminho or not os.path.exists(caminho):
+        return None
+    estado = os.stat(caminho)
+    return (estado.st_mtime_ns, estado.st_size)
+
+
+def carregar_faixas_k(caminho=ARQUIVO_FAIXAS_K, min_amostras=MIN_AMOSTRAS_FAIXA_K):
+    """
+    Lê a análise granular do Fator K e devolve, por polo, o início de cada faixa (metros)
+    e o K da faixa. Faixas sem K ou com menos de 'min_amostras' ficam com nan; sem o arquivo, {}.
+    A leitura fica em cache enquanto o arquivo não muda (data de modificação e tamanho).
+    """
+    return _ler_faixas_k(caminho, min_amostras, _estado_arquivo(caminho))
+
+
+@lru_cache(maxsize=4)
+def _ler_faixas_k(caminho, min_amostras, estado_arquivo):
+    if estado_arquivo is None:
+        return {}
+    df_faixas = pd.read_csv(caminho, sep=';', encoding='utf-8-sig')
+    df_faixas['Inicio_m'] = pd.to_numeric(df_faixas['Faixa_Distancia'].astype(str).str.split('-').str[0], errors='coerce')
+    df_faixas['K_Sugerido'] = pd.to_numeric(df_faixas['K_Sugerido'], errors='coerce')
+    df_faixas = df_faixas.dropna(subset=['Inicio_m']).sort_values(['Polo', 'Inicio_m'])
+    df_faixas.loc[df_faixas['Qtd_Amostras'] < min_amostras, 'K_Sugerido'] = np.nan
+    return {
+        polo: {'inicio_m': grupo['Inicio_m'].to_numpy(dtype=np.float64), 'fatores_k': grupo['K_Sugerido'].to_numpy(dtype=np.float64)}
+        for polo, grupo in df_faixas.groupby('Polo')
+    }
+
+
+class ProvedorFaixasK:
+    """
+    Linha reta x Fator K da faixa de distância em que o trecho cai (busca vetorizada).
+    Faixas sem amostras suficientes e distâncias além da última faixa usam o K do polo.
+    'avisos' diz quando as faixas não puderam ser lidas (ver criar_provedor).
+    """
+
+    def __init__(self, fator_k, inicio_faixas_m=(), fatores_k_faixas=()):
+        self.fator_k = fator_k
+        self.avisos = []
+        self.inicio_faixas_m = np.asarray(inicio_faixas_m, dtype=np.float64)
+        fatores = np.asarray(fatores_k_faixas, dtype=np.float64)
+        self.fatores_k_faixas = np.where(np.isnan(fatores), fator_k, fatores)
+
+    def matriz_distancias(self, latitudes, longitudes):
+        return self._aplicar_faixas(calcular_distancias_haversine(latitudes, longitudes))
+
+    def distancias_pares(self, lat_origem, lon_origem, lat_destino, lon_destino):
+        return self._aplicar_faixas(calcular_distancias_pares(lat_origem, lon_origem, lat_destino, lon_destino))
+
+    def _aplicar_faixas(self, distancias_reta):
+        if not len(self.inicio_faixas_m):
+            return distancias_reta * self.fator_k
+        tamanho_ultima_faixa = self.inicio_faixas_m[-1] - self.inicio_faixas_m[-2] if len(self.inicio_faixas_m) > 1 else np.inf
+        fatores = np.append(self.fatores_k_faixas, self.fator_k)  # posição extra: além da última faixa
+        faixa = np.searchsorted(self.inicio_faixas_m, distancias_reta, side='right') - 1
+        faixa[distancias_reta >= self.inicio_faixas_m[-1] + tamanho_ultima_faixa] = len(fatores) - 1
+        return distancias_reta * fatores[faixa]
+
+
+class ProvedorTabelaDistancias:
+    """Usa as distâncias reais da tabela; pares ausentes ficam com a linha reta x K."""
+
+    def __init__(self, fator_k, caminho_tabela=ARQUIVO_TABELA_DISTANCIAS):
+        self.reserva = ProvedorHaversineK(fator_k)
+        self.caminho_tabela = caminho_tabela
+        self.cobertura = 0.0
+
+    def matriz_distancias(self, latitudes, longitudes):
+        matriz = self.reserva.matriz_distancias(latitudes, longitudes)
+        tabela = TabelaDistanciasReais(self.caminho_tabela)
+        try:
+            encontrados = tabela.preencher_matriz(latitudes, longitudes, matriz)
+        finally:
+            tabela.fechar()
+        np.fill_diagonal(matriz, 0.0)
+        num_pontos = len(matriz)
+        self.cobertura = encontrados / (num_pontos * num_pontos - num_pontos) if num_pontos > 1 else 1.0
+        return matriz
+
+
+class ProvedorOSRM:
+    """
+    Consulta um serviço compatível com o /table do OSRM, em blocos de origens x destinos
+    para respeitar o limite de coordenadas por requisição. Pares sem rota (ou blocos cuja
+    consulta falhou) usam linha reta x K; as falhas ficam em 'avisos', para quem resolve o grupo relatar.
+    Com 'caminho_tabela', as distâncias obtidas são gravadas na tabela de distâncias reais.
+    """
+
+    def __init__(self, fator_k, url_base=URL_OSRM_PADRAO, perfil=PERFIL_OSRM, pontos_por_bloco=PONTOS_POR_BLOCO_OSRM, caminho_tabela=None):
+        self.reserva = ProvedorHaversineK(fator_k)
+        self.url_base = url_base.rstrip('/')
+        self.perfil = perfil
+        self.pontos_por_bloco = pontos_por_bloco
+        self.caminho_tabela = caminho_tabela
+        self.requisicoes = 0
+        self.avisos = []
+
+    def _consultar_bloco(self, sessao, latitudes, longitudes, origens, destinos):
+        indices = list(dict.fromkeys(list(origens) + list(destinos)))
+        posicao = {indice: p for p, indice in enumerate(indices)}
+        coordenadas = ";".join(f"{longitudes[i]},{latitudes[i]}" for i in indices)
+        params = {
+            'sources': ";".join(str(posicao[i]) for i in origens),
+            'destinations': ";".join(str(posicao[j]) for j in destinos),
+            'annotations': 'distance',
+        }
+        self.requisicoes += 1
+        response = sessao.get(f"{self.url_base}/table/v1/{self.perfil}/{coordenadas}", params=params, timeout=TIMEOUT_OSRM_S)
+        try:
+            data = response.json()
+        except ValueError:
+            raise RuntimeError(f"OSRM /table respondeu HTTP {response.status_code} sem JSON")
+        if data.get('code') != 'Ok':
+            raise RuntimeError(f"OSRM /table respondeu '{data.get('code')}': {data.get('message', '')}")
+        return np.array(data['distances'], dtype=np.float64)  # None (sem rota) vira nan
+
+    def matriz_distancias(self, latitudes, longitudes):
+        latitudes, longitudes = np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64)
+        num_pontos = len(latitudes)
+        matriz = np.full((num_pontos, num_pontos), np.nan)
+        blocos = [list(range(inicio, min(inicio + self.pontos_por_bloco, num_pontos))) for inicio in range(0, num_pontos, self.pontos_por_bloco)]
+        blocos_com_falha, primeira_falha = 0, None
+        with requests.Session() as sessao:
+            for origens in blocos:
+                for destinos in blocos:
+                    try:
+                        matriz[np.ix_(origens, destinos)] = self._consultar_bloco(sessao, latitudes, longitudes, origens, destinos)
+                    except (requests.exceptions.RequestException, RuntimeError) as e:
+                        # As exceções do requests trazem a URL inteira: basta o tipo
+                        primeira_falha = primeira_falha or (str(e) if isinstance(e, RuntimeError) else type(e).__name__)
+                        blocos_com_falha += 1
+        if blocos_com_falha:
+            self.avisos.append(f"OSRM: {blocos_com_falha} de {len(blocos) ** 2} bloco(s) da matriz sem resposta ({primeira_falha}). "
+                               "Usando linha reta x Fator K nesses trechos.")
+        if self.caminho_tabela:
+            tabela = TabelaDistanciasReais(self.caminho_tabela)
+            try:
+                tabela.salvar_matriz(latitudes, longitudes, matriz, range(num_pontos), range(num_pontos))
+            finally:
+                tabela.fechar()
+        sem_rota = np.isnan(matriz)
+        if sem_rota.any():
+            matriz[sem_rota] = self.reserva.matriz_distancias(latitudes, longitudes)[sem_rota]
+        np.fill_diagonal(matriz, 0.0)
+        return matriz
+
+
+def assinatura_provedor(configuracao):
+    """
+    Texto que identifica as distâncias que o provedor vai devolver: a configuração e, para os
+    provedores que leem um arquivo local ('faixas_k' e 'tabela'), a data de modificação e o tamanho dele.
+    """
+    configuracao = configuracao or {}
+    tipo = configuracao.get('tipo', 'haversine')
+    arquivo = {'faixas_k': configuracao.get('caminho_faixas', ARQUIVO_FAIXAS_K), 'tabela': configuracao.get('caminho_tabela', ARQUIVO_TABELA_DISTANCIAS)}.get(tipo)
+    return repr((sorted(configuracao.items()), _estado_arquivo(arquivo)))
+
+
+def criar_provedor(configuracao, fator_k, polo=None):
+    """
+    Cria o provedor a partir da configuração ({'tipo': 'haversine' | 'faixas_k' | 'tabela' | 'osrm', ...}).
+    Sem configuração, usa linha reta x Fator K.
+    """
+    configuracao = configuracao or {}
+    tipo = configuracao.get('tipo', 'haversine')
+    if tipo == 'haversine':
+        return ProvedorHaversineK(fator_k)
+    if tipo == 'faixas_k':
+        caminho = configuracao.get('caminho_faixas', ARQUIVO_FAIXAS_K)
+        faixas = carregar_faixas_k(caminho, configuracao.get('min_amostras', MIN_AMOSTRAS_FAIXA_K)).get(polo, {})
+        provedor = ProvedorFaixasK(fator_k, faixas.get('inicio_m', ()), faixas.get('fatores_k', ()))
+        if not os.path.exists(caminho):
+            provedor.avisos.append(f"'{caminho}' não encontrado. Usando o Fator K do polo em todas as distâncias.")
+        return provedor
+    if tipo == 'tabela':
+        return ProvedorTabelaDistancias(fator_k, configuracao.get('caminho_tabela', ARQUIVO_TABELA_DISTANCIAS))
+    if tipo == 'osrm':
+        return ProvedorOSRM(fator_k, configuracao.get('url', URL_OSRM_PADRAO), configuracao.get('perfil', PERFIL_OSRM),
+                            configuracao.get('pontos_por_bloco', PONTOS_POR_BLOCO_OSRM), configuracao.get('caminho_tabela'))
+    raise ValueError(f"Provedor de distâncias desconhecido: '{tipo}'")
@@ -0,0 +1,498 @@
+import copy
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from ortools.constraint_solver import routing_enums_pb2
+from ortools.constraint_solver import pywrapcp
+
+from matrizes import (extrair_dados_grupo, recortar_dados_grupo, construir_matrizes_grupo, construir_grafo_vizinhanca, calcular_penalidades,
+                      registrar_matriz)
+from provedores_distancia import criar_provedor, assinatura_provedor
+from decomposicao import dividir_problema, juntar_resultados, concluir_com_busca_local
+from poda_candidatos import podar_candidatos, servicos_fora_da_janela, perfil_das_matrizes, perfil_do_grafo
+from prazos_ans import janelas_de_atendimento, HORIZONTE_SEM_JORNADA_MIN
+from instrumentacao import CronometroEtapas
+
+# ==============================================================================
+# RESOLUÇÃO DOS GRUPOS (POLO + TIPO DE EQUIPE)
+# Cada grupo é descrito por um dicionário simples (picklable), o que permite
+# resolvê-los em processos separados e juntar os resultados na ordem original.
+# ==============================================================================
+NUM_PROCESSOS_PADRAO = os.cpu_count() or 1
+
+# Orçamento de tempo do solver, proporcional ao tamanho do grupo
+TEMPO_MINIMO_SOLVER_S = 1
+TEMPO_MAXIMO_SOLVER_S = 120
+SEGUNDOS_POR_SERVICO = 0.05
+SEGUNDOS_POR_EQUIPE = 0.5
+SOLUCOES_POR_NO = 200
+JANELA_SEM_MELHORA_S = 5  # Encerra a busca se o custo não melhorar neste intervalo
+PRAZO_TOTAL_EXECUCAO_S = 900  # Prazo global para todos os grupos de uma execução
+MAX_RESULTADOS_EM_CACHE = 256  # Grupos resolvidos mantidos pelo CacheResultados (LRU)
+FRACAO_TEMPO_REOTIMIZACAO = 0.25  # Partindo de um plano anterior, a busca local recebe só esta fração do tempo
+
+
+def calcular_orcamento_solver(num_servicos, num_equipes, prazo_global=None):
+    """
+    Define o limite de tempo e de soluções do SolveWithParameters para o tamanho do grupo.
+    'prazo_global' (timestamp) limita o tempo ao que resta para a execução inteira ('limitado_pelo_prazo' indica o corte).
+    """
+    tempo_limite = TEMPO_MINIMO_SOLVER_S + SEGUNDOS_POR_SERVICO * num_servicos + SEGUNDOS_POR_EQUIPE * num_equipes
+    tempo_limite = min(max(tempo_limite, TEMPO_MINIMO_SOLVER_S), TEMPO_MAXIMO_SOLVER_S)
+    limitado_pelo_prazo = False
+    if prazo_global is not None:
+        restante = max(prazo_global - time.time(), TEMPO_MINIMO_SOLVER_S)
+        limitado_pelo_prazo = restante < tempo_limite
+        tempo_limite = min(tempo_limite, restante)
+    return {'tempo_limite_s': tempo_limite, 'limite_solucoes': SOLUCOES_POR_NO * (num_servicos + 1), 'limitado_pelo_prazo': limitado_pelo_prazo}
+
+
+class MonitorConvergencia:
+    """
+    Callback de solução que encerra a busca quando o custo deixa de melhorar (ou quando 'cancelamento', um
+    threading.Event ou o Event compartilhado com os processos do pool, é acionado). Guarda em 'evolucao' cada melhora do custo: [segundos desde o início, custo].
+    """
+
+    def __init__(self, routing, janela_sem_melhora_s, cancelamento=None):
+        self.routing = routing
+        self.janela_sem_melhora_s = janela_sem_melhora_s
+        self.cancelamento = cancelamento
+        self.inicio = self.ultima_melhora = time.time()
+        self.melhor_custo = None
+        self.evolucao = []
+        self.solucoes = 0
+        self.convergiu = self.cancelado = False
+
+    def __call__(self):
+        self.solucoes += 1
+        custo, agora = self.routing.CostVar().Value(), time.time()
+        if self.melhor_custo is None or custo < self.melhor_custo:
+            self.melhor_custo, self.ultima_melhora = custo, agora
+            self.evolucao.append([round(agora - self.inicio, 2), custo])
+        elif agora - self.ultima_melhora > self.janela_sem_melhora_s:
+            self.convergiu = True
+            self.routing.solver().FinishCurrentSearch()
+        if self.cancelamento is not None and self.cancelamento.is_set():
+            self.cancelado = True
+            self.routing.solver().FinishCurrentSearch()
+
+
+def montar_problema_grupo(nome_polo, tipo_equipe, info_polo, grupo_servicos, num_equipes, capacidade_base, parametros):
+    """
+    Monta a descrição do problema de um grupo. 'parametros' traz: estrategia, restricao,
+    JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE, MINUTOS_POR_KM, FATOR_CUSTO_DISTANCIA e,
+    opcionalmente, 'provedor_distancia' (configuração de provedores_distancia.criar_provedor),
+    'decomposicao' e 'equipes_por_subproblema' (ver decomposicao.py), 'podar_candidatos' (ver poda_candidatos.py)
+    e 'vizinhos_por_servico' (grafo de vizinhança no lugar das matrizes NxN, ver matrizes.py).
+    """
+    return {
+        'polo': nome_polo,
+        'tipo_equipe': tipo_equipe,
+        'dados_grupo': extrair_dados_grupo(info_polo, grupo_servicos),
+        'fator_k': float(info_polo['Fator_K_Estimado']),
+        'num_equipes': num_equipes,
+        'capacidade_servicos': int(capacidade_base + parametros['SERVICOS_EXTRAS_IMPRODUTIVIDADE']),
+        'estrategia': parametros['estrategia'],
+        'restricao': parametros['restricao'],
+        'jornada_min': int(parametros['JORNADA_TRABALHO_MIN']),
+        'minutos_por_km': parametros['MINUTOS_POR_KM'],
+        'fator_custo_distancia': parametros['FATOR_CUSTO_DISTANCIA'],
+        'janela_sem_melhora_s': parametros.get('janela_sem_melhora_s', JANELA_SEM_MELHORA_S),
+        'provedor_distancia': parametros.get('provedor_distancia'),
+        'decomposicao': parametros.get('decomposicao'),  # Divide grupos grandes em subproblemas ('varredura' ou 'kmeans')
+        'equipes_por_subproblema': parametros.get('equipes_por_subproblema'),
+        'podar_candidatos': parametros.get('podar_candidatos', True),  # Descarta antes do modelo os serviços inviáveis ou excedentes
+        'vizinhos_por_servico': parametros.get('vizinhos_por_servico'),  # Arcos só entre os k vizinhos mais próximos (None: matriz cheia)
+        'rotas_iniciais': None,  # Rotas de um plano anterior (índices dos serviços no grupo), para reotimizar
+        'prazo_global': None,
+    }
+
+
+def ajustar_rotas_iniciais(rotas_iniciais, problema, tempo_trecho):
+    """
+    Adapta as rotas de um plano anterior ao grupo atual: descarta as equipes que não existem mais
+    e corta cada rota no ponto em que ela passaria da capacidade ou da jornada.
+    'tempo_trecho(no_origem, no_destino)' dá o tempo de um trecho (nó 0 = depósito, nó i + 1 = serviço i).
+    """
+    num_equipes = problema['num_equipes']
+    rotas = [list(rota) for rota in rotas_iniciais[:num_equipes]]
+    rotas += [[] for _ in range(num_equipes - len(rotas))]
+    for rota in rotas:
+        if problema['restricao'] == '1':
+            del rota[problema['capacidade_servicos']:]
+        elif problema['restricao'] == '2':
+            acumulado, anterior, tamanho_viavel = 0, 0, 0
+            for posicao, servico in enumerate(rota):
+                acumulado += tempo_trecho(anterior, servico + 1)
+                if acumulado + tempo_trecho(servico + 1, 0) > problema['jornada_min']: break
+                anterior, tamanho_viavel = servico + 1, posicao + 1
+            del rota[tamanho_viavel:]
+    return rotas
+
+
+def _tempo_trecho_provedor(dados_grupo, provedor, minutos_por_km):
+    """tempo_trecho de ajustar_rotas_iniciais calculado par a par pelo provedor (modo grafo de vizinhança)."""
+    latitudes, longitudes, execucao_por_no = dados_grupo['latitudes'], dados_grupo['longitudes'], np.concatenate(([0.0], dados_grupo['tempos_execucao']))
+
+    def tempo_trecho(origem, destino):
+        distancia_m = provedor.distancias_pares(latitudes[[origem]], longitudes[[origem]], latitudes[[destino]], longitudes[[destino]])[0]
+        return int((distancia_m / 1000) * minutos_por_km + execucao_por_no[origem])
+    return tempo_trecho
+
+
+def resolver_grupo(problema, cancelamento=None):
+    """
+    Constrói e resolve o modelo OR-Tools de um grupo.
+    Retorna as rotas por equipe (índices dos serviços no grupo, na ordem de visita),
+    a distância de cada trecho das rotas (depósito -> serviços -> depósito, em metros),
+    os índices dos serviços não atendidos e, em 'podados', os que nem entraram no modelo (com o motivo).
+    Com problema['vizinhos_por_servico'] (e um provedor com distancias_pares), os arcos ficam restritos
+    a um grafo de vizinhança em vez das matrizes NxN.
+    Prazos do ANS e janelas dos clientes (ver prazos_ans.py) limitam o CumulVar da dimensão Time de cada
+    serviço; com eles, a dimensão Time entra no modelo também na restrição por capacidade.
+    'evolucao_objetivo' traz as melhoras do custo durante a busca; 'cancelamento' (threading.Event ou, no pool,
+    multiprocessing.Event) encerra a busca com a melhor solução já encontrada. 'etapas_s' e 'estatisticas_busca'
+    alimentam o relatório de instrumentação (ver instrumentacao.py).
+    """
+    cronometro = CronometroEtapas()
+    dados_grupo = problema['dados_grupo']
+    num_servicos, num_equipes = len(dados_grupo['latitudes']) - 1, problema['num_equipes']
+    provedor = criar_provedor(problema['provedor_distancia'], problema['fator_k'], problema['polo'])
+    fator_custo = problema['fator_custo_distancia'] if problema['estrategia'] == '2' else 1
+    horizonte = problema['jornada_min'] if problema['restricao'] == '2' else HORIZONTE_SEM_JORNADA_MIN
+    janelas = janelas_de_atendimento(dados_grupo, horizonte)
+    tem_janelas = bool(np.any(janelas[0] > 0) or np.any(janelas[1] < horizonte))
+    incluir_tempo = problema['restricao'] == '2' or tem_janelas
+    vizinhos = problema.get('vizinhos_por_servico')
+    usar_grafo = bool(vizinhos) and num_servicos > vizinhos + 1 and hasattr(provedor, 'distancias_pares')
+
+    if usar_grafo:
+        grafo = construir_grafo_vizinhanca(dados_grupo, vizinhos, problema['minutos_por_km'], provedor, fator_custo, incluir_tempo)
+        distancia_do_deposito = np.concatenate(([0], grafo.do_deposito('distancia')[0]))[None, :]  # Linha do depósito
+        penalidades = calcular_penalidades(dados_grupo, distancia_do_deposito, problema['estrategia'])
+        perfil, tempo_trecho = perfil_do_grafo(grafo), _tempo_trecho_provedor(dados_grupo, provedor, problema['minutos_por_km'])
+    else:
+        matrizes = construir_matrizes_grupo(dados_grupo, problema['fator_k'], problema['minutos_por_km'], fator_custo, incluir_tempo, provedor)
+        penalidades = calcular_penalidades(dados_grupo, matrizes['distancia'], problema['estrategia'])
+        perfil, tempo_trecho = perfil_das_matrizes(matrizes), lambda origem, destino: matrizes['tempo'][origem, destino]
+    cronometro.marcar('distancias')
+
+    # Poda: o modelo só recebe os serviços mantidos (nó i + 1 do modelo = serviço mantidos[i] do grupo)
+    mantidos, podados = np.arange(num_servicos), {}
+    if problema.get('podar_candidatos'):
+        mantidos, podados = podar_candidatos(problema, perfil, penalidades, janelas if tem_janelas else None)
+    elif tem_janelas:  # Janelas inalcançáveis deixariam o CumulVar sem valores possíveis
+        podados = servicos_fora_da_janela(perfil, janelas)
+        mantidos = np.setdiff1d(mantidos, list(podados))
+    penalidades = penalidades[mantidos]
+    no_do_servico = {int(servico): no for no, servico in enumerate(mantidos.tolist(), start=1)}
+    rotas_iniciais = None
+    if problema.get('rotas_iniciais'):
+        rotas_iniciais = [[no_do_servico[servico] for servico in rota if servico in no_do_servico]
+                          for rota in ajustar_rotas_iniciais(problema['rotas_iniciais'], problema, tempo_trecho)]
+    cronometro.marcar('poda')
+
+    if usar_grafo:
+        # O grafo final liga os vizinhos entre os serviços mantidos e inclui os trechos das rotas iniciais
+        if podados or rotas_iniciais:
+            arcos_rotas = [(origem, destino) for rota in rotas_iniciais or [] for origem, destino in zip(rota[:-1], rota[1:])]
+            grafo = construir_grafo_vizinhanca(recortar_dados_grupo(dados_grupo, mantidos), vizinhos, problema['minutos_por_km'], provedor,
+                                               fator_custo, incluir_tempo, arcos_extras=arcos_rotas)
+        distancia_trecho = lambda origem, destino: grafo.valor('distancia_m', origem, destino)
+    elif podados:
+        nos = np.concatenate(([0], mantidos + 1))
+        matrizes = {chave: matriz[np.ix_(nos, nos)] for chave, matriz in matrizes.items()}
+    cronometro.marcar('distancias')
+
+    num_nos = len(mantidos) + 1
+    manager = pywrapcp.RoutingIndexManager(num_nos, num_equipes, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    registrar = (lambda nome: grafo.registrar(routing, manager, nome)) if usar_grafo else (lambda nome: registrar_matriz(routing, matrizes[nome]))
+    transit_callback_index = registrar('custo')
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    if usar_grafo:
+        grafo.restringir_sucessores(routing, manager)
+
+    if problema['restricao'] == '1':
+        routing.AddDimensionWithVehicleCapacity(
+            routing.RegisterUnaryTransitVector([1] * num_nos),
+            0, [problema['capacidade_servicos']] * num_equipes, True, 'Capacity'
+        )
+    if incluir_tempo:
+        # Espera permitida só se algum serviço tiver abertura de janela depois do início da jornada
+        folga = horizonte if np.any(janelas[0][mantidos] > 0) else 0
+        routing.AddDimension(registrar('tempo'), folga, horizonte, True, 'Time')
+        if tem_janelas:
+            dimensao_tempo = routing.GetDimensionOrDie('Time')
+            for no, (abertura, fechamento) in enumerate(zip(janelas[0][mantidos].tolist(), janelas[1][mantidos].tolist()), start=1):
+                if abertura > 0 or fechamento < horizonte:
+                    dimensao_tempo.CumulVar(manager.NodeToIndex(no)).SetRange(abertura, fechamento)
+
+    for node_idx, penalty in enumerate(penalidades.tolist(), start=1):
+        routing.AddDisjunction([manager.NodeToIndex(node_idx)], penalty)
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
+    search_parameters.local_search_metaheuristic = (routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+    orcamento = calcular_orcamento_solver(num_nos - 1, num_equipes, problema['prazo_global'])
+    search_parameters.solution_limit = orcamento['limite_solucoes']
+    monitor = MonitorConvergencia(routing, problema['janela_sem_melhora_s'], cancelamento)
+    routing.AddAtSolutionCallback(monitor)
+
+    # Reotimização: as rotas do plano anterior viram a solução inicial da busca local
+    atribuicao_inicial = None
+    if rotas_iniciais:
+        routing.CloseModelWithParameters(search_parameters)
+        atribuicao_inicial = routing.ReadAssignmentFromRoutes([[manager.NodeToIndex(no) for no in rota] for rota in rotas_iniciais], True)
+    tempo_limite = orcamento['tempo_limite_s'] if atribuicao_inicial is None else max(orcamento['tempo_limite_s'] * FRACAO_TEMPO_REOTIMIZACAO, TEMPO_MINIMO_SOLVER_S)
+    search_parameters.time_limit.FromMilliseconds(int(tempo_limite * 1000))
+    cronometro.marcar('modelo')
+    if atribuicao_inicial is not None:
+        solution = routing.SolveFromAssignmentWithParameters(atribuicao_inicial, search_parameters)
+    else:
+        solution = routing.SolveWithParameters(search_parameters)
+    cronometro.marcar('busca')
+
+    resultado = {
+        'polo': problema['polo'], 'tipo_equipe': problema['tipo_equipe'], 'solucao_encontrada': solution is not None,
+        'rotas': [], 'trechos_m': [], 'nao_atendidos': list(range(num_servicos)), 'podados': podados,
+        'tempo_solver_s': round(time.time() - monitor.inicio, 2), 'tempo_limite_s': round(tempo_limite, 2),
+        'solucoes_encontradas': monitor.solucoes, 'encerrado_por_convergencia': monitor.convergiu, 'reaproveitado': False,
+        'evolucao_objetivo': monitor.evolucao, 'cancelado': monitor.cancelado, 'limitado_pelo_prazo': orcamento['limitado_pelo_prazo'],
+        'partiu_do_plano_anterior': atribuicao_inicial is not None, 'decomposicao': None,
+        'arcos_no_modelo': len(grafo) if usar_grafo else num_nos * (num_nos - 1), 'vizinhos_por_servico': vizinhos if usar_grafo else None,
+        'etapas_s': cronometro.etapas, 'avisos_distancias': list(getattr(provedor, 'avisos', [])),  # Ex.: consultas ao OSRM que falharam
+        # Com as matrizes, os callbacks de trânsito são nativos do OR-Tools (sem chamadas em Python para contar)
+        'estatisticas_busca': {'status': routing_enums_pb2.RoutingSearchStatus.Value.Name(routing.status()), 'nos_no_modelo': num_nos,
+                               'galhos': routing.solver().Branches(), 'falhas': routing.solver().Failures(),
+                               'chamadas_callback_transito': sum(grafo.chamadas.values()) if usar_grafo else None},
+    }
+    if solution:
+        servicos_atendidos = set()
+        for vehicle_id in range(num_equipes):
+            index = routing.Start(vehicle_id)
+            nos_rota = []
+            while not routing.IsEnd(index):
+                node_index = manager.IndexToNode(index)
+                if node_index > 0:
+                    nos_rota.append(node_index)
+                index = solution.Value(routing.NextVar(index))
+            rota = mantidos[np.array(nos_rota, dtype=np.int64) - 1].tolist()
+            resultado['rotas'].append(rota)
+            sequencia_nos = [0] + nos_rota + [0]
+            if not rota:
+                resultado['trechos_m'].append([])
+            elif usar_grafo:
+                resultado['trechos_m'].append([float(distancia_trecho(origem, destino)) for origem, destino in zip(sequencia_nos[:-1], sequencia_nos[1:])])
+            else:
+                resultado['trechos_m'].append(matrizes['distancia_m'][sequencia_nos[:-1], sequencia_nos[1:]].tolist())
+            servicos_atendidos.update(rota)
+        resultado['nao_atendidos'] = sorted(set(range(num_servicos)) - servicos_atendidos)
+    cronometro.marcar('leitura_solucao')
+    return resultado
+
+
+# ==============================================================================
+# CACHE DE RESULTADOS POR IMPRESSÃO DIGITAL DO GRUPO
+# Um grupo com as mesmas entradas (serviços, coordenadas, tempos, valores,
+# prazos, janelas, equipes, capacidade, Fator K, estratégia, restrição e fonte
+# das distâncias) devolve as rotas já calculadas, sem passar pelo solver.
+# ==============================================================================
+CAMPOS_IMPRESSAO_DIGITAL = ('polo', 'tipo_equipe', 'fator_k', 'num_equipes', 'capacidade_servicos', 'estrategia', 'restricao',
+                            'jornada_min', 'minutos_por_km', 'fator_custo_distancia', 'janela_sem_melhora_s', 'rotas_iniciais',
+                            'decomposicao', 'equipes_por_subproblema', 'podar_candidatos', 'vizinhos_por_servico')
+
+
+def impressao_digital_problema(problema):
+    """Hash das entradas que definem a solução de um grupo (o prazo da execução não entra)."""
+    dados_grupo = problema['dados_grupo']
+    resumo = hashlib.blake2b(digest_size=16)
+    for chave in ('latitudes', 'longitudes', 'tempos_execucao', 'valores_divida', 'prazos_min', 'janelas_inicio_min', 'janelas_fim_min'):
+        resumo.update(dados_grupo[chave].tobytes())
+    resumo.update('\x1f'.join(map(str, dados_grupo['ids_servico'])).encode('utf-8'))
+    resumo.update(repr([problema[campo] for campo in CAMPOS_IMPRESSAO_DIGITAL]).encode('utf-8'))
+    resumo.update(assinatura_provedor(problema['provedor_distancia']).encode('utf-8'))
+    return resumo.hexdigest()
+
+
+class CacheResultados:
+    """LRU de resultados de resolver_grupo por impressão digital, com estatísticas. Pode ser compartilhado entre threads."""
+
+    def __init__(self, max_itens=MAX_RESULTADOS_EM_CACHE):
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+        self.acertos = self.falhas = self.descartes = 0
+        self.tempo_solver_poupado_s = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self, impressao):
+        with self._lock:
+            resultado = self.itens.get(impressao)
+            if resultado is None:
+                self.falhas += 1
+                return None
+            self.itens.move_to_end(impressao)
+            self.acertos += 1
+            self.tempo_solver_poupado_s += resultado['tempo_solver_s']
+            return copy.deepcopy(resultado)
+
+    def guardar(self, impressao, resultado):
+        with self._lock:
+            self.itens[impressao] = copy.deepcopy(resultado)
+            self.itens.move_to_end(impressao)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+                self.descartes += 1
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {'itens': len(self.itens), 'acertos': self.acertos, 'falhas': self.falhas, 'descartes': self.descartes,
+                    'taxa_acerto_%': round(100 * self.acertos / consultas, 1) if consultas else 0.0,
+                    'tempo_solver_poupado_s': round(self.tempo_solver_poupado_s, 1)}
+
+
+# ==============================================================================
+# EXECUÇÃO DOS GRUPOS (NO PRÓPRIO PROCESSO OU NUM POOL)
+# O cancelamento (threading.Event do processo principal) chega aos processos
+# do pool por um Event compartilhado, instalado em cada processo na criação.
+# ==============================================================================
+INTERVALO_VERIFICACAO_CANCELAMENTO_S = 0.2  # Espera pelos grupos do pool entre uma verificação do cancelamento e outra
+_cancelamento_do_pool = None  # Nos processos do pool: o Event compartilhado com o processo principal
+
+
+def _instalar_cancelamento(evento):
+    global _cancelamento_do_pool
+    _cancelamento_do_pool = evento
+
+
+def _resolver_grupo_no_pool(problema):
+    return resolver_grupo(problema, _cancelamento_do_pool)
+
+
+class _ExecutorGrupos:
+    """
+    resolver_grupo no próprio processo (na hora em que o resultado é pedido) ou num pool de 'num_processos'
+    processos, com um grupo por processo e os demais numa fila. Com o 'cancelamento' acionado, os grupos em
+    andamento encerram a busca com a melhor solução já encontrada e os da fila não são resolvidos.
+    """
+
+    def __init__(self, num_processos, cancelamento=None):
+        self.cancelamento = cancelamento
+        self.num_processos = num_processos
+        self._fila, self._em_andamento, self._pool = deque(), set(), None
+        if num_processos > 1:
+            # 'spawn': o pool é criado de dentro de threads (a execução em segundo plano do app) e não herda o estado do processo
+            contexto = multiprocessing.get_context('spawn')
+            self._evento = contexto.Event()
+            self._pool = ProcessPoolExecutor(max_workers=num_processos, mp_context=contexto, initializer=_instalar_cancelamento, initargs=(self._evento,))
+
+    def submeter(self, problema, prioritario=False):
+        """Agenda o grupo; 'prioritario' o põe à frente dos que esperam na fila."""
+        tarefa = {'problema': problema, 'futuro': None}
+        if self._pool is not None:
+            (self._fila.appendleft if prioritario else self._fila.append)(tarefa)
+            self._abastecer()
+        return tarefa
+
+    def _cancelado(self):
+        return self.cancelamento is not None and self.cancelamento.is_set()
+
+    def _abastecer(self):
+        if self._cancelado():
+            self._evento.set()
+            self._fila.clear()
+        self._em_andamento = {futuro for futuro in self._em_andamento if not futuro.done()}
+        while self._fila and len(self._em_andamento) < self.num_processos:
+            tarefa = self._fila.popleft()
+            tarefa['futuro'] = self._pool.submit(_resolver_grupo_no_pool, tarefa['problema'])
+            self._em_andamento.add(tarefa['futuro'])
+
+    def resultado(self, tarefa):
+        """O resultado de resolver_grupo da tarefa, ou None se o cancelamento chegou antes de ela começar."""
+        if self._pool is None:
+            return None if self._cancelado() else resolver_grupo(tarefa['problema'], self.cancelamento)
+        while True:
+            self._abastecer()
+            futuro = tarefa['futuro']
+            if futuro is not None and futuro.done():
+                return futuro.result()
+            if futuro is None and self._cancelado():
+                return None
+            wait([futuro] if futuro is not None else self._em_andamento, timeout=INTERVALO_VERIFICACAO_CANCELAMENTO_S, return_when=FIRST_COMPLETED)
+
+    def fechar(self):
+        """Libera o pool sem esperar os grupos em andamento (o Event encerra a busca deles)."""
+        if self._pool is not None:
+            self._evento.set()
+            self._fila.clear()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _resolver_pendentes(problemas, num_processos, prazo_total_s, cancelamento=None):
+    """
+    resolver_grupos sem o cache. Os grupos inteiros e os subproblemas dos grupos divididos entram no executor na ordem
+    dos grupos; a busca local de um grupo dividido passa à frente da fila assim que os subproblemas dele terminam e
+    cada grupo sai assim que fica pronto. Com o cancelamento, o gerador termina no primeiro grupo que não chegou a
+    ser resolvido (um grupo dividido sem a busca local sai com as rotas juntadas dos subproblemas).
+    """
+    prazo_global = time.time() + prazo_total_s if prazo_total_s else None
+    for problema in problemas:
+        problema['prazo_global'] = prazo_global
+    divisoes = [dividir_problema(problema) for problema in problemas]
+    num_tarefas = sum(len(divisao['subproblemas']) if divisao else 1 for divisao in divisoes)
+    executor = _ExecutorGrupos(max(1, min(int(num_processos or 1), num_tarefas)), cancelamento)
+    try:
+        tarefas = [[executor.submeter(subproblema) for subproblema in divisao['subproblemas']] if divisao else executor.submeter(problema)
+                   for problema, divisao in zip(problemas, divisoes)]
+        for problema, divisao, tarefa in zip(problemas, divisoes, tarefas):
+            if divisao is None:
+                resultado = executor.resultado(tarefa)
+            else:
+                partes = [executor.resultado(parte) for parte in tarefa]
+                if None in partes: return
+                resultado = juntar_resultados(problema, divisao, partes)
+                # Busca local no grupo inteiro, partindo das rotas juntadas dos subproblemas
+                melhorado = executor.resultado(executor.submeter({**problema, 'rotas_iniciais': resultado['rotas']}, prioritario=True))
+                if melhorado is not None:
+                    resultado = concluir_com_busca_local(resultado, melhorado)
+            if resultado is None: return
+            yield resultado
+    finally:
+        executor.fechar()
+
+
+def resolver_grupos(problemas, num_processos=1, prazo_total_s=PRAZO_TOTAL_EXECUCAO_S, cache=None, cancelamento=None):
+    """
+    Resolve os grupos e devolve os resultados (gerador) na mesma ordem de 'problemas'.
+    Com 'num_processos' > 1 os grupos são distribuídos em um ProcessPoolExecutor.
+    Nenhum grupo recebe mais tempo do que o restante de 'prazo_total_s'.
+    Grupos grandes com problema['decomposicao'] são resolvidos por subproblemas (ver decomposicao.py).
+    Com 'cache' (CacheResultados), grupos já resolvidos com as mesmas entradas saem direto do
+    cache (resultado['reaproveitado'] = True) e só os demais passam pelo solver; os resultados cancelados ou com o
+    tempo cortado pelo prazo da execução (resultado['limitado_pelo_prazo']) não entram no cache.
+    'cancelamento' (threading.Event) encerra a busca dos grupos em andamento, também nos processos do pool, com a
+    melhor solução já encontrada; o gerador termina antes do primeiro grupo que não chegou a ser resolvido.
+    """
+    if cache is None:
+        yield from _resolver_pendentes(problemas, num_processos, prazo_total_s, cancelamento)
+        return
+    impressoes = [impressao_digital_problema(problema) for problema in problemas]
+    em_cache = [cache.obter(impressao) for impressao in impressoes]
+    resolvidos = _resolver_pendentes([problema for problema, resultado in zip(problemas, em_cache) if resultado is None], num_processos, prazo_total_s, cancelamento)
+    for impressao, resultado in zip(impressoes, em_cache):
+        reaproveitado = resultado is not None
+        if not reaproveitado:
+            resultado = next(resolvidos, None)
+            if resultado is None: return  # Cancelamento
+            # Busca interrompida ou com o tempo cortado pelo prazo da execução não vale para as próximas execuções
+            if not (resultado['cancelado'] or resultado.get('limitado_pelo_prazo')):
+                cache.guardar(impressao, resultado)
+        yield {**resultado, 'reaproveitado': reaproveitado}
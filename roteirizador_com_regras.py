@@ -1,13 +1,21 @@
 import pandas as pd
-import numpy as np
-from haversine import haversine, Unit
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
-import folium
-import time
-import requests
 import os
-from datetime import date, timedelta
+import sys
+import argparse
+import multiprocessing
+from datetime import date
+from resolvedor import NUM_PROCESSOS_PADRAO
+from decomposicao import METODOS_DECOMPOSICAO, EQUIPES_POR_SUBPROBLEMA
+from google_directions import CacheDirections, MAX_CONSULTAS_SIMULTANEAS
+from provedores_distancia import URL_OSRM_PADRAO, ARQUIVO_TABELA_DISTANCIAS
+from historico_k import AgregadosFatorK
+from historico_colunar import ArmazemHistorico, DIRETORIO_HISTORICO
+from prazos_ans import INICIO_JORNADA_PADRAO
+from motor_roteirizacao import (carregar_dados_config, carregar_dados_servicos, preparar_dados, calcular_data_despacho, carregar_plano_anterior,
+                                filtrar_servicos, servicos_dos_polos, executar_roteirizacao, GravadorCSV, ID_RETORNO_DEPOSITO, MINUTOS_POR_KM, LEITOR_SERVICOS_PADRAO)
+from planejamento_dias import planejar_dias, MAX_DIAS_PLANEJAMENTO
+from mapa_rotas import gerar_mapa_de_rotas, MODOS_MAPA, MODO_MAPA_PADRAO
+from instrumentacao import Instrumentacao, ARQUIVO_RELATORIO_JSON, ARQUIVO_RELATORIO_CSV
 
 # ==============================================================================
 # CONFIGURAÇÕES GLOBAIS
@@ -17,559 +25,319 @@ ARQUIVO_HISTORICO_ROTAS = "historico_rotas_k.csv"
 ARQUIVO_ANALISE_GERAL_K = "analise_fator_k_geral.csv"
 ARQUIVO_HISTORICO_TRECHOS = "historico_trechos_k.csv"
 ARQUIVO_ANALISE_GRANULAR_K = "analise_k_por_distancia.csv"
+NUM_PROCESSOS_PARALELOS = NUM_PROCESSOS_PADRAO # Grupos (polo + tipo de equipe) resolvidos ao mesmo tempo
+# Fonte das distâncias do otimizador: 'haversine' (linha reta x Fator K), 'faixas_k' (Fator K por faixa de
+# distância de ARQUIVO_ANALISE_GRANULAR_K), 'tabela' (distâncias reais já conhecidas em ARQUIVO_TABELA_DISTANCIAS)
+# ou 'osrm' (servidor /table em URL_OSRM, que alimenta a tabela)
+PROVEDOR_DISTANCIA = {'tipo': 'haversine', 'caminho_faixas': ARQUIVO_ANALISE_GRANULAR_K, 'url': URL_OSRM_PADRAO, 'caminho_tabela': ARQUIVO_TABELA_DISTANCIAS}
+# Grupos grandes: None (um modelo por grupo), 'varredura' (setores em torno do polo) ou 'kmeans', com
+# EQUIPES_POR_SUBPROBLEMA equipes por subproblema (ver decomposicao.py)
+DECOMPOSICAO = None
+INICIO_JORNADA = INICIO_JORNADA_PADRAO  # Saída das equipes (HH:MM): referência dos prazos do ANS e das janelas dos clientes
+# Mapa: 'rapido' (camadas GeoJSON por polo) ou 'marcadores' (um marcador com popup por serviço), com as
+# linhas das rotas simplificadas até esta tolerância em metros no modo rápido (0 = sem simplificar)
+MODO_MAPA = MODO_MAPA_PADRAO
+SIMPLIFICAR_ROTAS_MAPA_M = 0
+# Grava rotas_otimizadas.csv e servicos_nao_roteirizados.csv grupo a grupo, à medida que cada grupo é resolvido
+GRAVAR_CSV_POR_GRUPO = False
+ARQUIVO_ROTAS = "rotas_otimizadas.csv"
+ARQUIVO_NAO_ROTEIRIZADOS = "servicos_nao_roteirizados.csv"
+COLUNAS_ROTAS_CSV = [
+    'Polo', 'Equipe', 'Tipo_Equipe', 'Ordem_Visita', 'ID_Servico', 'Valor_Divida',
+    'Tempo_Execucao_Min', 'Chegada_Estimada', 'Prazo_ANS', 'Dentro_do_ANS', 'KM_Trecho_Estimado', 'Tempo_Trecho_Estimado_Min',
+    'KM_Trecho_Google', 'Tempo_Trecho_Google_Min', 'Link_Google_Maps'
+]
 # ==============================================================================
 
-def obter_distancia_real_google(origem_coords, destino_coords, waypoints_coords, chave_api):
-    if chave_api == "COLE_SUA_CHAVE_DE_API_AQUI": return None
-    base_url = "https://maps.googleapis.com/maps/api/directions/json"
-    origin_str, destination_str = f"{origem_coords[0]},{origem_coords[1]}", f"{destino_coords[0]},{destino_coords[1]}"
-    if len(waypoints_coords) > 25:
-        print(f"  - AVISO GOOGLE API: Rota com {len(waypoints_coords)} pontos excede o limite de 25.")
-        return None
-    waypoints_str = "|".join([f"{lat},{lon}" for lat, lon in waypoints_coords])
-    params = {"origin": origin_str, "destination": destination_str, "waypoints": f"optimize:true|{waypoints_str}", "key": chave_api}
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] == 'OK': return data['routes'][0]['legs']
-        else: print(f"  - AVISO GOOGLE API: {data.get('error_message', data['status'])}"); return None
-    except requests.exceptions.RequestException as e:
-        print(f"  - ERRO DE CONEXÃO COM GOOGLE API: {e}"); return None
-
-def analisar_k_geral_por_polo(df_historico, df_polos_info):
+def analisar_k_geral_por_polo(df_polos_info, agregados):
     print("\n--- ANÁLISE GERAL DE FATOR K (POR ROTA) ---")
-    dados_analise = []
-    for _, polo_info in df_polos_info.iterrows():
-        polo, fator_k_atual = polo_info['Centro Operativo'], polo_info['fator_k']
-        df_historico_polo = df_historico[df_historico['Polo'] == polo].copy()
-        qtd_rotas = len(df_historico_polo)
-        novo_k_sugerido_str, observacao, nivel_confianca = "N/A", "", ""
-        if qtd_rotas < 10:
-            nivel_confianca, observacao = "Dados Insuficientes", f"São necessárias no mínimo 10 rotas ({qtd_rotas} existentes)."
-        else:
-            if 10 <= qtd_rotas < 30: nivel_confianca = "Inicial"
-            elif 30 <= qtd_rotas < 100: nivel_confianca = "Confiável"
-            else: nivel_confianca = "Alta Precisão"
-            df_historico_polo['KM_Estimado_K'] = pd.to_numeric(df_historico_polo['KM_Estimado_K'], errors='coerce')
-            df_historico_polo['KM_Real_Google'] = pd.to_numeric(df_historico_polo['KM_Real_Google'], errors='coerce')
-            df_historico_polo.dropna(subset=['KM_Estimado_K', 'KM_Real_Google'], inplace=True)
-            df_valido = df_historico_polo[(df_historico_polo['Fator_K_Usado'] > 0) & (df_historico_polo['KM_Estimado_K'] > 0)]
-            if not df_valido.empty:
-                df_valido['Dist_Linha_Reta_km'] = df_valido['KM_Estimado_K'] / df_valido['Fator_K_Usado']
-                df_valido_sem_zero = df_valido[df_valido['Dist_Linha_Reta_km'] > 0]
-                if not df_valido_sem_zero.empty:
-                    df_valido_sem_zero['K_Real_Individual'] = df_valido_sem_zero['KM_Real_Google'] / df_valido_sem_zero['Dist_Linha_Reta_km']
-                    novo_k_sugerido = df_valido_sem_zero['K_Real_Individual'].mean()
-                    novo_k_sugerido_str = f"{novo_k_sugerido:.2f}"
-                    observacao = "Sugestão calculada"
-        dados_analise.append({'Polo': polo, 'Fator_K_Atual': f"{fator_k_atual:.2f}", 'Fator_K_Sugerido': novo_k_sugerido_str, 'Qtd_Rotas_Analisadas': qtd_rotas, 'Nivel_Confianca': nivel_confianca, 'Observacao': observacao})
-    if dados_analise:
+    df_analise = agregados.analise_geral(df_polos_info)
+    if not df_analise.empty:
         print(f"\nSalvando a análise geral do Fator K em '{ARQUIVO_ANALISE_GERAL_K}'...")
-        pd.DataFrame(dados_analise).to_csv(ARQUIVO_ANALISE_GERAL_K, index=False, sep=';', encoding='utf-8-sig')
+        df_analise.to_csv(ARQUIVO_ANALISE_GERAL_K, index=False, sep=';', encoding='utf-8-sig')
         print(">>> Arquivo de análise geral salvo com sucesso.")
 
-def analisar_k_por_distancia(df_historico_trechos):
+def analisar_k_por_distancia(agregados):
     print("\n--- ANÁLISE GRANULAR DE FATOR K (POR TRECHO) ---")
-    if df_historico_trechos.empty or len(df_historico_trechos) < 10: return
-    df_analise = df_historico_trechos.copy()
-    df_analise.dropna(subset=['Distancia_Reta_m', 'Distancia_Real_m'], inplace=True)
-    df_analise = df_analise[(df_analise['Distancia_Reta_m'] > 0) & (df_analise['Distancia_Real_m'] > 0)]
-    if df_analise.empty: return
-    df_analise['K_Individual'] = df_analise['Distancia_Real_m'] / df_analise['Distancia_Reta_m']
-    max_dist = df_analise['Distancia_Reta_m'].max()
-    bins = np.arange(0, max_dist + 500, 500)
-    labels = [f"{int(b)}-{int(b+500)} m" for b in bins[:-1]]
-    if not labels: return
-    df_analise['Faixa_Distancia'] = pd.cut(df_analise['Distancia_Reta_m'], bins=bins, labels=labels, right=False)
-    resultado_analise = df_analise.groupby(['Polo', 'Faixa_Distancia'], observed=False).agg(
-        K_Sugerido=('K_Individual', 'mean'), Qtd_Amostras=('K_Individual', 'count')
-    ).reset_index()
-    resultado_analise['K_Sugerido'] = resultado_analise['K_Sugerido'].round(2)
+    if sum(qtd for faixas in agregados.trechos.values() for qtd, _ in faixas.values()) < 10: return
     print(f"Salvando a análise granular do Fator K em '{ARQUIVO_ANALISE_GRANULAR_K}'...")
-    resultado_analise.to_csv(ARQUIVO_ANALISE_GRANULAR_K, index=False, sep=';', encoding='utf-8-sig')
+    agregados.analise_por_faixa().to_csv(ARQUIVO_ANALISE_GRANULAR_K, index=False, sep=';', encoding='utf-8-sig')
     print(">>> Arquivo de análise granular salvo com sucesso.")
 
-def gerar_mapa_de_rotas(df_rotas, df_polos_info, df_servicos_info, polos_processados):
-    if df_rotas.empty: return
-    polos_filtrados = df_polos_info[df_polos_info['Centro Operativo'].isin(polos_processados)]
-    if polos_filtrados.empty: return
-    mapa = folium.Map(location=[polos_filtrados['latitude'].mean(), polos_filtrados['longitude'].mean()], zoom_start=10)
-    df_rotas_com_coords = pd.merge(df_rotas, df_servicos_info[['ID_Servico', 'Latitude', 'Longitude']], on='ID_Servico')
-    df_rotas_com_coords.rename(columns={'Latitude': 'LATITUD', 'Longitude': 'LONGITUD'}, inplace=True)
-    cores = ['blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue', 'red', 'lightblue', 'lightgreen', 'gray', 'pink', 'lightgray']
-    mapa_cores_equipe = {}
-    df_rotas_com_coords['Equipe_Unica'] = df_rotas_com_coords['Polo'] + " - " + df_rotas_com_coords['Equipe']
-    equipes_unicas = df_rotas_com_coords['Equipe_Unica'].unique()
-    for i, equipe_unica in enumerate(equipes_unicas): mapa_cores_equipe[equipe_unica] = cores[i % len(cores)]
-    for _, polo in polos_filtrados.iterrows():
-        folium.Marker(location=[polo['latitude'], polo['longitude']], popup=f"<strong>Polo: {polo['Centro Operativo']}</strong>", icon=folium.Icon(color='black', icon='industry', prefix='fa')).add_to(mapa)
-    for equipe_unica in equipes_unicas:
-        rota_da_equipe = df_rotas_com_coords[df_rotas_com_coords['Equipe_Unica'] == equipe_unica].sort_values(by='Ordem_Visita')
-        polo_da_rota = rota_da_equipe['Polo'].iloc[0]
-        polo_coords = df_polos_info[df_polos_info['Centro Operativo'] == polo_da_rota][['latitude', 'longitude']].iloc[0]
-        pontos_da_rota = [tuple(polo_coords)] + list(zip(rota_da_equipe['LATITUD'], rota_da_equipe['LONGITUD'])) + [tuple(polo_coords)]
-        cor_da_rota = mapa_cores_equipe[equipe_unica]
-        folium.PolyLine(pontos_da_rota, color=cor_da_rota, weight=3, opacity=0.8, tooltip=f"<strong>{equipe_unica}</strong>").add_to(mapa)
-        for _, servico in rota_da_equipe.iterrows():
-            popup_html = (f"<strong>Equipe:</strong> {servico['Equipe']}<br><strong>Polo:</strong> {servico['Polo']}<br><strong>Ordem:</strong> {servico['Ordem_Visita']}<br>"
-                          f"<strong>ID Serviço:</strong> {servico['ID_Servico']}<br><strong>Dívida:</strong> R$ {servico['Valor_Divida']:.2f}")
-            folium.Marker(location=[servico['LATITUD'], servico['LONGITUD']], popup=folium.Popup(popup_html, max_width=300), icon=folium.Icon(color=cor_da_rota, icon='info-sign')).add_to(mapa)
+def atualizar_analises_fator_k(df_polos_info):
+    """Atualiza os agregados com as linhas novas dos históricos e regrava as duas análises de Fator K."""
+    agregados = AgregadosFatorK()
+    rotas_novas, trechos_novos = agregados.atualizar(ArmazemHistorico(), ARQUIVO_HISTORICO_ROTAS, ARQUIVO_HISTORICO_TRECHOS)
+    agregados.salvar()
+    print(f"\nHistórico do Fator K: {rotas_novas} rota(s) e {trechos_novos} trecho(s) novos incorporados.")
+    analisar_k_geral_por_polo(df_polos_info, agregados)
+    analisar_k_por_distancia(agregados)
+
+def salvar_mapa_de_rotas(df_rotas, df_polos_info, df_servicos_info, polos_processados, modo=MODO_MAPA, simplificar_m=SIMPLIFICAR_ROTAS_MAPA_M):
+    mapa, tempo_montagem = gerar_mapa_de_rotas(df_rotas, df_polos_info, df_servicos_info, polos_processados, modo, simplificar_m)
+    if mapa is None: return
     nome_arquivo = f"mapa_rotas.html"
     mapa.save(nome_arquivo)
     print(f"\n>>> Mapa interativo salvo com sucesso em '{nome_arquivo}'! <<<")
+    print(f"    Modo {modo}: montado em {tempo_montagem:.2f}s, {os.path.getsize(nome_arquivo) / 2 ** 20:.1f} MB de HTML.")
 
-def verificar_dia_restrito(data_atual, municipios_do_polo, df_feriados):
-    df_feriados.columns = [str(col).strip() for col in df_feriados.columns]
-    if data_atual.weekday() in [4, 5, 6]:
-        dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
-        return True, f"{dias_semana[data_atual.weekday()]}"
-    
-    feriados_gerais = set(df_feriados[df_feriados['COD_MUNICIPIO'] == 0]['FECHA'])
-    feriados_municipais = set(df_feriados[df_feriados['Municipio'].isin(municipios_do_polo)]['FECHA'])
-    todos_os_feriados = feriados_gerais.union(feriados_municipais)
-    datas_restritas = set()
-    for feriado in todos_os_feriados:
-        if pd.notna(feriado):
-            datas_restritas.add(feriado.date())
-            datas_restritas.add(feriado.date() - timedelta(days=1))
-    if data_atual in datas_restritas:
-        return True, "Feriado ou Véspera de Feriado"
-    return False, ""
-# Adicione esta constante no início do seu arquivo, junto com as outras configurações
-MINUTOS_POR_KM = 3 # Premissa: Velocidade média de 20 km/h (60 min / 20 km = 3 min/km)
-
-def main():
-    """
-    Roteirizador VRP v14.4 - API Google como pós-processamento para enriquecimento de dados
-    """
-    print("Carregando todos os dados...")
-    try:
-        # Leitura de cabeçalhos dinâmica
-        colunas_equipes = [
-            'Centro Operativo', 'Quantidade_equipes_Leves', 'Capacidade_maxima_Leves',
-            'Quantidades_equipes_Cesto', 'Capacidade_maxima_Cesto'
-        ]
-        colunas_servicos = [
-            'CODIGO_EXTERNO', 'TDC', 'FECHA_CREACION_ORDEN_SIS_EXT', 'FECHA_CREACION_TDC_EORDER', 'ESTADO',
-            'CODIGO_PROCESO', 'DESCRIPCION_PROCESO', 'CODIGO_ORDEN', 'DESCRIPCION_ORDEN', 'CICLO',
-            'FECHA_ACTUALIZACION', 'ETL_TIME', 'CODIGO_CENTRO_OPERATIVO', 'CENTRO_OPERATIVO_TDC',
-            'LONGITUD', 'LATITUD', 'CODIGO_CLIENTE', 'LOCALIDAD', 'CALLE', 'NUMERO_CALLE', 'MUNICIPIO',
-            'BARRIO', 'CODIGO_ZIP', 'COMPLEMENTO', 'MOTIVO_INSPECION', 'CODE_NOTA', 'DESCRIPCION_CODE_NOTA',
-            'MEDIDA', 'DESCIPCION_MEDIDA', 'TEXTO_DIRECCION_COMPLETA', 'ALOC_RECURSOS', 'RESIDUAL',
-            'TDC_FIM', 'ANS_LEGAL', 'ANS_LEGAL_CALCULADO', 'CODIGO_EXTERNO_SAP_CONCAT', 'TIPO_REMESSA',
-            'NUMERO_PROTOCOLO', 'valor_factura_sum', 'TIPO_CORTE', 'Trâmite_Solicitado',
-            'Executor_Solicitado', 'Polo', 'Centro Operativo', 'UT', 'tipo_servico'
-        ]
-
-        df_polos = pd.read_csv("polos.csv", encoding='utf-8', sep=';')
-        df_equipes = pd.read_csv("equipes.csv", encoding='utf-8', sep=';', header=None, names=colunas_equipes, skiprows=1, on_bad_lines='skip')
-        df_servicos_raw = pd.read_csv("servicos.csv", encoding='utf-8', sep=';', header=None, names=colunas_servicos, skiprows=1, low_memory=False, on_bad_lines='skip')
-        df_feriados = pd.read_excel("feriados.xlsx")
-        df_tempos = pd.read_csv("Tempos.csv", encoding='utf-8', sep=';')
-        df_fator_k = pd.read_csv("fator_k.csv", encoding='utf-8', sep=';')
 
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao ler os arquivos. Verifique os nomes/separadores dos arquivos e a ORDEM das colunas. Detalhe: {e}")
-        return
-
-    print("Preparando e padronizando os dados...")
-    try:
-        # Limpeza dos nomes de colunas lidos dos arquivos
-        df_polos.columns = [str(col).strip() for col in df_polos.columns]
-        df_fator_k.columns = [str(col).strip() for col in df_fator_k.columns]
-        df_fator_k.rename(columns={'Fator K Estimado': 'Fator_K_Estimado'}, inplace=True)
-
-        # Preparação dos dados de tempo
-        df_tempos_execucao = df_tempos[['Equipe', 'Serviço', 'Mix_solic', 'Tempo Execução']].copy().dropna()
-        df_tempos_execucao['Tempo_Execucao_Min'] = pd.to_timedelta(df_tempos_execucao['Tempo Execução']).dt.total_seconds() / 60
-        tempo_total_str = df_tempos.loc[0, 'Total']
-        tempo_total_timedelta = pd.to_timedelta(tempo_total_str + ':00' if len(tempo_total_str) <= 5 else tempo_total_str)
-        JORNADA_TRABALHO_MIN = tempo_total_timedelta.total_seconds() / 60
-        SERVICOS_EXTRAS_IMPRODUTIVIDADE = float(str(df_tempos.loc[0, 'Improdutividade_serviços_extras']).replace(',', '.'))
-
-        # Preparação dos dados de Fator K
-        df_fator_k['Centro Operativo'] = df_fator_k['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_fator_k['Fator_K_Estimado'] = pd.to_numeric(df_fator_k['Fator_K_Estimado'].astype(str).str.replace(',', '.'), errors='coerce')
-
-        # Preparação dos dados de Polos
-        df_polos['Centro Operativo'] = df_polos['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_polos = pd.merge(df_polos, df_fator_k[['Centro Operativo', 'Fator_K_Estimado']], on='Centro Operativo', how='left')
-        
-        polos_sem_k = df_polos[df_polos['Fator_K_Estimado'].isnull()]
-        if not polos_sem_k.empty:
-            print("\nAVISO: Os seguintes polos não foram encontrados em 'fator_k.csv' e usarão um Fator K padrão de 1.4:")
-            for polo_sem_k in polos_sem_k['Centro Operativo']:
-                print(f"  - {polo_sem_k}")
-            df_polos['Fator_K_Estimado'] = df_polos['Fator_K_Estimado'].fillna(1.4)
-
-        # Preparação dos dados de Serviços
-        colunas_necessarias = {
-            'TDC': 'ID_Servico', 'Centro Operativo': 'Polo', 'LATITUD': 'Latitude',
-            'LONGITUD': 'Longitude', 'valor_factura_sum': 'Valor_Divida',
-            'tipo_servico': 'Tipo_Servico', 'MUNICIPIO': 'Municipio',
-            'Executor_Solicitado': 'Tipo_Equipe_Requerida',
-            'Trâmite_Solicitado': 'Mix_Solic'
-        }
-        df_servicos = df_servicos_raw[list(colunas_necessarias.keys())].rename(columns=colunas_necessarias)
-
-        for col in ['Polo', 'Municipio', 'Tipo_Servico', 'Tipo_Equipe_Requerida', 'Mix_Solic']:
-            df_servicos[col] = df_servicos[col].astype(str).str.strip().str.upper()
-        for col_tempo in ['Equipe', 'Serviço', 'Mix_solic']:
-            df_tempos_execucao[col_tempo] = df_tempos_execucao[col_tempo].astype(str).str.strip().str.upper()
-        
-        df_servicos = df_servicos[df_servicos['Polo'] != 'NAN'].copy()
-
-        df_servicos = pd.merge(
-            df_servicos,
-            df_tempos_execucao[['Equipe', 'Serviço', 'Mix_solic', 'Tempo_Execucao_Min']],
-            left_on=['Tipo_Equipe_Requerida', 'Tipo_Servico', 'Mix_Solic'],
-            right_on=['Equipe', 'Serviço', 'Mix_solic'],
-            how='left'
-        )
-
-        servicos_sem_tempo = df_servicos[df_servicos['Tempo_Execucao_Min'].isnull()]
-        if not servicos_sem_tempo.empty:
-            print(f"\nAVISO: {len(servicos_sem_tempo)} serviços não encontraram tempo de execução em Tempos.csv e foram removidos da roteirização.")
-            print("Verifique as combinações de Equipe/Serviço/Mix_solic em ambos os arquivos.")
-            df_servicos.dropna(subset=['Tempo_Execucao_Min'], inplace=True)
-        
-        # Padronizações Finais
-        df_equipes['Centro Operativo'] = df_equipes['Centro Operativo'].astype(str).str.strip().str.upper()
-        df_feriados.columns = [str(col).strip() for col in df_feriados.columns]
-        df_feriados['Municipio'] = df_feriados['Municipio'].astype(str).str.strip().str.upper()
-        df_feriados['FECHA'] = pd.to_datetime(df_feriados['FECHA'], errors='coerce')
-        df_servicos.dropna(subset=['Polo', 'Municipio', 'Latitude', 'Longitude'], inplace=True)
-
-        df_polos['latitude'] = pd.to_numeric(df_polos['latitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_polos['longitude'] = pd.to_numeric(df_polos['longitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Latitude'] = pd.to_numeric(df_servicos['Latitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Longitude'] = pd.to_numeric(df_servicos['Longitude'].astype(str).str.replace(',', '.'), errors='coerce')
-        df_servicos['Valor_Divida'] = pd.to_numeric(df_servicos['Valor_Divida'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-
-    except KeyError as e:
-        print(f"\nERRO DE COLUNA: Uma coluna esperada não foi encontrada. Verifique se o nome da coluna '{e}' está correto nos seus arquivos CSV.")
-        return
-    except Exception as e:
-        print(f"ERRO ao preparar ou padronizar os dados: {e}")
-        return
+# ==============================================================================
+# ESCOLHA DAS OPÇÕES: MENUS INTERATIVOS OU LINHA DE COMANDO (EM LOTE)
+# ==============================================================================
+ESTRATEGIAS = {'curta': '1', 'valiosa': '2', 'eficiente': '3'}
+RESTRICOES = {'capacidade': '1', 'tempo': '2'}
+CONSULTAS_GOOGLE = {'sim': '1', 'nao': '2', 'cache': '3'}
+TIPOS_SERVICO_MENU = {'1': 'CORTE', '2': 'RECORTE', '3': 'TODOS'}
 
-    df_polos_completo = pd.merge(df_polos, df_equipes, on="Centro Operativo")
-    
-    # Lógica de Datas e Menus
-    hoje = date.today()
-    dia_semana = hoje.weekday()
-    if dia_semana in [0, 1, 2, 3]: data_despacho = hoje + timedelta(days=1)
-    elif dia_semana == 4: data_despacho = hoje + timedelta(days=3)
-    elif dia_semana == 5: data_despacho = hoje + timedelta(days=2)
-    else: data_despacho = hoje + timedelta(days=1)
-    
-    dias_pt = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
-    
-    polos_disponiveis = sorted(df_servicos['Polo'].unique())
-    
-    print("\n--- AGENDAMENTO DE ROTEIRIZAÇÃO ---")
-    print(f"  - Data de Hoje....: {hoje.strftime('%d/%m/%Y')} ({dias_pt[hoje.weekday()]})")
-    print(f"  - Despacho para...: {data_despacho.strftime('%d/%m/%Y')} ({dias_pt[data_despacho.weekday()]})")
-    
+def escolher_opcoes_menu(polos_disponiveis):
+    """Pergunta as opções da roteirização pelos menus. Retorna None se alguma escolha for inválida."""
     print("\n--- MENU DE ROTEIRIZAÇÃO ---")
     for i, polo in enumerate(polos_disponiveis): print(f"  {i+1}: {polo}")
     print("  T: Processar TODOS os polos")
     escolha_polo = input("\n> Digite o número do polo desejado (ou 'T' para todos): ").strip().upper()
-    
-    # (O restante do código dos menus continua igual)
-    # ...
-    # (O restante do código, incluindo o loop de otimização e a geração de arquivos, permanece idêntico à versão anterior)
-    
-    # ... (código dos menus e filtros) ...
-    polos_para_processar = []
-    if escolha_polo == 'T': polos_para_processar = polos_disponiveis
+    if escolha_polo == 'T': polos = polos_disponiveis
     else:
         try:
             indice_escolhido = int(escolha_polo) - 1
-            if 0 <= indice_escolhido < len(polos_disponiveis): polos_para_processar.append(polos_disponiveis[indice_escolhido])
-        except (ValueError, IndexError): print("Erro: Escolha de polo inválida."); return
-    if not polos_para_processar: print("Nenhum polo selecionado."); return
-
-    servicos_a_processar = df_servicos[df_servicos['Polo'].isin(polos_para_processar)]
-    municipios_a_processar = servicos_a_processar['Municipio'].unique()
-
-    restrito, motivo = verificar_dia_restrito(data_despacho, municipios_a_processar, df_feriados)
+            if not 0 <= indice_escolhido < len(polos_disponiveis): raise IndexError
+            polos = [polos_disponiveis[indice_escolhido]]
+        except (ValueError, IndexError): print("Erro: Escolha de polo inválida."); return None
 
     print("\n--- FILTRAR TIPO DE SERVIÇO ---")
     print("  1: Apenas Cortes")
     print("  2: Apenas Recortes")
     print("  3: Cortes + Recortes (Todos)")
     escolha_tipo = input("> Digite a opção desejada: ").strip()
-
-    if restrito and escolha_tipo in ['1', '3']:
-        print(f"\nERRO: Roteirização de CORTES não é permitida para o dia {data_despacho.strftime('%d/%m/%Y')} ({motivo}).")
-        print("Apenas 'Recortes' são permitidos. O programa será encerrado.")
-        return
-
-    df_servicos_filtrado = pd.DataFrame()
-    try:
-        if 'Tipo_Servico' not in servicos_a_processar.columns: raise ValueError("Coluna 'Tipo_Servico' não encontrada")
-        tipo_servico_upper = servicos_a_processar['Tipo_Servico'].astype(str).str.strip().str.upper()
-        if escolha_tipo == '1': df_servicos_filtrado = servicos_a_processar[tipo_servico_upper == 'CORTE'].copy()
-        elif escolha_tipo == '2': df_servicos_filtrado = servicos_a_processar[tipo_servico_upper == 'RECORTE'].copy()
-        elif escolha_tipo == '3':
-            if restrito:
-                print(f"AVISO: O dia {data_despacho.strftime('%d/%m/%Y')} é restrito. Roteirizando apenas 'Recortes'.")
-                df_servicos_filtrado = servicos_a_processar[tipo_servico_upper == 'RECORTE'].copy()
-            else:
-                df_servicos_filtrado = servicos_a_processar.copy()
-        else: print("Opção inválida."); return
-        if df_servicos_filtrado.empty: print("Nenhum serviço encontrado para o filtro."); return
-    except Exception as e: print(f"ERRO ao filtrar serviços: {e}"); return
+    if escolha_tipo not in TIPOS_SERVICO_MENU: print("Opção inválida."); return None
 
     print("\n--- ESCOLHA A ESTRATÉGIA DE ROTEIRIZAÇÃO ---")
     print("  1: Rota mais CURTA (maximizar serviços)")
     print("  2: Rota mais VALIOSA (maximizar valor, equilibrado pela distância)")
     print("  3: Rota mais EFICIENTE (equilíbrio)")
     escolha_estrategia = input("> Digite a estratégia desejada: ").strip()
-    if escolha_estrategia not in ['1', '2', '3']: print("Opção inválida."); return
+    if escolha_estrategia not in ESTRATEGIAS.values(): print("Opção inválida."); return None
 
     print("\n--- ESCOLHA O CRITÉRIO DE RESTRIÇÃO PRINCIPAL ---")
     print("  1: Por CAPACIDADE de serviços (otimiza a quantidade de visitas)")
     print("  2: Por TEMPO de trabalho (otimiza respeitando a jornada de 8h)")
     escolha_restricao = input("> Digite o critério desejado (1/2): ").strip()
-    if escolha_restricao not in ['1', '2']: print("Opção de restrição inválida."); return
+    if escolha_restricao not in RESTRICOES.values(): print("Opção de restrição inválida."); return None
 
     print("\n--- ENRIQUECER DADOS COM API GOOGLE MAPS? ---")
     print("  1: SIM (Calcula distância/tempo real para as rotas e gera link)")
     print("  2: NÃO (Usa apenas estimativas locais)")
-    consultar_google_api = input("> Deseja consultar a API do Google? (1/2): ").strip()
-
-    todas_as_rotas_df = pd.DataFrame()
-    servicos_nao_atendidos_df = pd.DataFrame()
-    dados_relatorio = []
-
-    for nome_polo_atual in polos_para_processar:
-        polo_filtrado = df_polos_completo[df_polos_completo['Centro Operativo'] == nome_polo_atual]
-        if polo_filtrado.empty:
-            servicos_do_polo = df_servicos_filtrado[df_servicos_filtrado['Polo'] == nome_polo_atual]
-            if not servicos_do_polo.empty:
-                servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, servicos_do_polo])
-            continue
-
-        info_polo = polo_filtrado.iloc[0]
-        fator_k_polo = info_polo['Fator_K_Estimado']
-        
-        for tipo_equipe in ["LEVE", "CESTO"]:
-            if tipo_equipe == "LEVE":
-                num_equipes = int(info_polo.get('Quantidade_equipes_Leves', 0))
-                capacidade_base = int(info_polo.get('Capacidade_maxima_Leves', 0))
-            else: # CESTO
-                num_equipes = int(info_polo.get('Quantidades_equipes_Cesto', 0))
-                capacidade_base = int(info_polo.get('Capacidade_maxima_Cesto', 0))
-
-            grupo_servicos = df_servicos_filtrado[
-                (df_servicos_filtrado['Polo'] == nome_polo_atual) &
-                (df_servicos_filtrado['Tipo_Equipe_Requerida'] == tipo_equipe)
-            ].copy()
-
-            if grupo_servicos.empty or num_equipes == 0:
-                if not grupo_servicos.empty:
-                     servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos])
-                continue
-
-            print(f"\n--- OTIMizando ROTAS PARA: {nome_polo_atual} - EQUIPES {tipo_equipe} (usando Fator K: {fator_k_polo:.2f}) ---")
-            
-            locations = [(info_polo['latitude'], info_polo['longitude'])] + list(zip(grupo_servicos['Latitude'], grupo_servicos['Longitude']))
-            manager = pywrapcp.RoutingIndexManager(len(locations), num_equipes, 0)
-            routing = pywrapcp.RoutingModel(manager)
-
-            def distance_callback(from_index, to_index):
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                distancia = int(haversine(locations[from_node], locations[to_node], unit=Unit.METERS) * fator_k_polo)
-                if escolha_estrategia == '2':
-                    return distancia * FATOR_CUSTO_DISTANCIA
-                return distancia
-
-            transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-            routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-            if escolha_restricao == '1':
-                print(f"  - Usando restrição por CAPACIDADE DE SERVIÇOS.")
-                capacidade_servicos_ajustada = int(capacidade_base + SERVICOS_EXTRAS_IMPRODUTIVIDADE)
-                routing.AddDimensionWithVehicleCapacity(
-                    routing.RegisterUnaryTransitCallback(lambda from_index: 1),
-                    0, [capacidade_servicos_ajustada] * num_equipes, True, 'Capacity'
-                )
-            elif escolha_restricao == '2':
-                print(f"  - Usando restrição por TEMPO DE TRABALHO ({int(JORNADA_TRABALHO_MIN)} min).")
-                def time_callback(from_index, to_index):
-                    from_node = manager.IndexToNode(from_index)
-                    to_node = manager.IndexToNode(to_index)
-                    dist_metros = haversine(locations[from_node], locations[to_node], unit=Unit.METERS) * fator_k_polo
-                    tempo_deslocamento = (dist_metros / 1000) * MINUTOS_POR_KM
-                    tempo_execucao = 0
-                    if from_node > 0:
-                        tempo_execucao = grupo_servicos.iloc[from_node - 1]['Tempo_Execucao_Min']
-                    return int(tempo_deslocamento + tempo_execucao)
-
-                time_callback_index = routing.RegisterTransitCallback(time_callback)
-                routing.AddDimension(
-                    time_callback_index, 0, int(JORNADA_TRABALHO_MIN), True, 'Time'
-                )
-            
-            for node_idx in range(1, len(locations)):
-                penalty = 0
-                valor_divida_atual = grupo_servicos.iloc[node_idx - 1]['Valor_Divida']
-                if escolha_estrategia == '1': penalty = 15000
-                elif escolha_estrategia == '2': penalty = int(valor_divida_atual * 100)
-                elif escolha_estrategia == '3':
-                    dist_do_polo = int(haversine(locations[0], locations[node_idx], unit=Unit.METERS) * fator_k_polo)
-                    if dist_do_polo == 0: dist_do_polo = 1
-                    penalty = int((valor_divida_atual * 10000) / dist_do_polo)
-                if penalty <= 0: penalty = 1
-                routing.AddDisjunction([manager.NodeToIndex(node_idx)], penalty)
-
-            search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-            search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-            search_parameters.local_search_metaheuristic = (routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-            search_parameters.time_limit.FromSeconds(30)
-            solution = routing.SolveWithParameters(search_parameters)
-
-            if solution:
-                polo_rotas_list, servicos_atendidos_indices = [], set()
-                valor_total_polo, equipes_usadas = 0, 0
-
-                for vehicle_id in range(num_equipes):
-                    index = routing.Start(vehicle_id)
-                    pontos_da_rota_indices = []
-                    while not routing.IsEnd(index):
-                        node_index = manager.IndexToNode(index)
-                        if node_index > 0:
-                            pontos_da_rota_indices.append(node_index - 1)
-                            servicos_atendidos_indices.add(node_index - 1)
-                        index = solution.Value(routing.NextVar(index))
-
-                    if pontos_da_rota_indices:
-                        equipes_usadas += 1
-                        
-                        # ATUALIZAÇÃO: Lógica de pós-processamento com a API Google
-                        gmaps_url = "N/A"
-                        legs_info = None
-
-                        if consultar_google_api == '1' and CHAVE_API_GOOGLE != "COLE_SUA_CHAVE_DE_API_AQUI":
-                            print(f"  - Consultando Google Maps para a rota da Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}...")
-                            pontos_coords = [locations[idx + 1] for idx in pontos_da_rota_indices]
-                            depot_coords = locations[0]
-                            legs_info = obter_distancia_real_google(depot_coords, depot_coords, pontos_coords, CHAVE_API_GOOGLE)
-                            if legs_info:
-                                origin_url = f"{depot_coords[0]},{depot_coords[1]}"
-                                waypoints_url = "/".join([f"{lat},{lon}" for lat,lon in pontos_coords])
-                                gmaps_url = f"https://www.google.com/maps/dir/{origin_url}/{waypoints_url}/{origin_url}"
-                            else:
-                                print(f"  - AVISO: Falha na consulta à API do Google para a Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}. Usando apenas estimativas locais.")
-                        
-                        # Processa os trechos da rota (serviço a serviço)
-                        ponto_anterior_loc = locations[0]
-                        for i, serv_idx in enumerate(pontos_da_rota_indices):
-                            servico_atual = grupo_servicos.iloc[serv_idx]
-                            ponto_atual_loc = locations[serv_idx + 1]
-                            
-                            dist_trecho_metros = haversine(ponto_anterior_loc, ponto_atual_loc, unit=Unit.METERS) * fator_k_polo
-                            km_trecho_estimado = dist_trecho_metros / 1000
-                            tempo_deslocamento_estimado = km_trecho_estimado * MINUTOS_POR_KM
-                            
-                            km_trecho_google, tempo_trecho_google = "N/A", "N/A"
-                            if legs_info and i < len(legs_info):
-                                leg = legs_info[i]
-                                km_trecho_google = round(leg['distance']['value'] / 1000, 2)
-                                tempo_trecho_google = round(leg['duration']['value'] / 60, 2)
-                            
-                            polo_rotas_list.append({
-                                'Polo': nome_polo_atual, 'Equipe': f"Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}",
-                                'Tipo_Equipe': tipo_equipe.capitalize(), 'Ordem_Visita': i + 1,
-                                'ID_Servico': servico_atual['ID_Servico'], 'Valor_Divida': servico_atual['Valor_Divida'],
-                                'Tempo_Execucao_Min': servico_atual['Tempo_Execucao_Min'],
-                                'KM_Trecho_Estimado': round(km_trecho_estimado, 2),
-                                'Tempo_Trecho_Estimado_Min': round(tempo_deslocamento_estimado, 2),
-                                'KM_Trecho_Google': km_trecho_google, 'Tempo_Trecho_Google_Min': tempo_trecho_google,
-                                'Link_Google_Maps': gmaps_url
-                            })
-                            ponto_anterior_loc = ponto_atual_loc
-                        
-                        # Processa o trecho de retorno ao depósito
-                        dist_retorno_metros = haversine(ponto_anterior_loc, locations[0], unit=Unit.METERS) * fator_k_polo
-                        km_retorno_estimado = dist_retorno_metros / 1000
-                        tempo_retorno_estimado = km_retorno_estimado * MINUTOS_POR_KM
-
-                        km_retorno_google, tempo_retorno_google = "N/A", "N/A"
-                        if legs_info and len(legs_info) == len(pontos_da_rota_indices) + 1:
-                            leg = legs_info[-1]
-                            km_retorno_google = round(leg['distance']['value'] / 1000, 2)
-                            tempo_retorno_google = round(leg['duration']['value'] / 60, 2)
-
-                        polo_rotas_list.append({
-                            'Polo': nome_polo_atual, 'Equipe': f"Equipe {tipo_equipe.capitalize()} {vehicle_id + 1}",
-                            'Tipo_Equipe': tipo_equipe.capitalize(), 'Ordem_Visita': len(pontos_da_rota_indices) + 1,
-                            'ID_Servico': 'RETORNO_AO_DEPOSITO', 'Valor_Divida': 0, 'Tempo_Execucao_Min': 0,
-                            'KM_Trecho_Estimado': round(km_retorno_estimado, 2),
-                            'Tempo_Trecho_Estimado_Min': round(tempo_retorno_estimado, 2),
-                            'KM_Trecho_Google': km_retorno_google, 'Tempo_Trecho_Google_Min': tempo_retorno_google,
-                            'Link_Google_Maps': gmaps_url
-                        })
-                # ... (resto da lógica de processamento da solução)
-                print(f"Solução encontrada! Serviços atendidos: {len(servicos_atendidos_indices)} de {len(grupo_servicos)}. Equipes usadas: {equipes_usadas} de {num_equipes}")
-                if polo_rotas_list:
-                    todas_as_rotas_df = pd.concat([todas_as_rotas_df, pd.DataFrame(polo_rotas_list)])
-                nao_atendidos_indices = set(range(len(grupo_servicos))) - servicos_atendidos_indices
-                if nao_atendidos_indices:
-                    servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos.iloc[list(nao_atendidos_indices)]])
-                dados_relatorio.append({'Polo': f"{nome_polo_atual} - {tipo_equipe}", 'Data': time.strftime("%Y-%m-%d"), 'Total_Servicos_Disponiveis': len(grupo_servicos), 'Servicos_Roteirizados': len(servicos_atendidos_indices), 'Servicos_Nao_Roteirizados': len(nao_atendidos_indices), 'Aproveitamento_%': f"{(len(servicos_atendidos_indices) / len(grupo_servicos) * 100):.2f}" if len(grupo_servicos) > 0 else "0.00", 'Valor_Total_Roteirizado_R$': valor_total_polo})
-
-            else:
-                print(f"NÃO FOI ENCONTRADA NENHUMA SOLUÇÃO VIÁVEL para {nome_polo_atual} - EQUIPES {tipo_equipe}.")
-                if not grupo_servicos.empty:
-                    servicos_nao_atendidos_df = pd.concat([servicos_nao_atendidos_df, grupo_servicos])
+    print("  3: SOMENTE CACHE (Usa consultas já feitas, sem custo e sem acessar a API)")
+    consultar_google_api = input("> Deseja consultar a API do Google? (1/2/3): ").strip()
+
+    return {'polos': polos, 'tipo_servico': TIPOS_SERVICO_MENU[escolha_tipo], 'estrategia': escolha_estrategia, 'restricao': escolha_restricao,
+            'google': consultar_google_api, 'num_processos': NUM_PROCESSOS_PARALELOS, 'provedor_distancia': PROVEDOR_DISTANCIA,
+            'decomposicao': DECOMPOSICAO, 'equipes_por_subproblema': EQUIPES_POR_SUBPROBLEMA, 'podar_candidatos': True, 'vizinhos_por_servico': None,
+            'inicio_jornada': INICIO_JORNADA, 'dias': 1, 'mapa': MODO_MAPA, 'simplificar_mapa_m': SIMPLIFICAR_ROTAS_MAPA_M,
+            'csv_por_grupo': GRAVAR_CSV_POR_GRUPO}
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Roteirizador em lote (sem menus). Sem argumentos, o roteirizador abre os menus interativos.",
+        epilog="Exemplo (rotina noturna): python roteirizador_com_regras.py --polos TODOS --estrategia curta --restricao tempo --google cache"
+    )
+    parser.add_argument('--lote', action='store_true', help="Roda sem menus mesmo sem outras opções (usa os valores padrão).")
+    parser.add_argument('--polos', nargs='+', default=['TODOS'], help="Polos a roteirizar, como em polos.csv, ou TODOS (padrão).")
+    parser.add_argument('--tipo-servico', choices=['corte', 'recorte', 'todos'], default='todos', help="Padrão: todos.")
+    parser.add_argument('--estrategia', choices=list(ESTRATEGIAS), default='curta', help="Padrão: curta.")
+    parser.add_argument('--restricao', choices=list(RESTRICOES), default='tempo', help="Padrão: tempo.")
+    parser.add_argument('--google', choices=list(CONSULTAS_GOOGLE), default='nao', help="Enriquecimento pela Google Directions: sim, nao (padrão) ou cache (somente consultas já feitas).")
+    parser.add_argument('--distancias', choices=['haversine', 'faixas_k', 'tabela', 'osrm'], default=PROVEDOR_DISTANCIA['tipo'], help=f"Fonte das distâncias do otimizador (padrão: {PROVEDOR_DISTANCIA['tipo']}).")
+    parser.add_argument('--url-osrm', default=PROVEDOR_DISTANCIA['url'], help=f"Servidor OSRM (padrão: {PROVEDOR_DISTANCIA['url']}).")
+    parser.add_argument('--processos', type=int, default=NUM_PROCESSOS_PARALELOS, help=f"Grupos resolvidos em paralelo (padrão: {NUM_PROCESSOS_PARALELOS}).")
+    parser.add_argument('--decomposicao', choices=['inteiro', *METODOS_DECOMPOSICAO], default=DECOMPOSICAO or 'inteiro', help="Grupos grandes: um modelo por grupo (inteiro, padrão) ou subproblemas por setores (varredura) ou por k-means, resolvidos em paralelo.")
+    parser.add_argument('--equipes-por-subproblema', type=int, default=EQUIPES_POR_SUBPROBLEMA, help=f"Equipes de cada subproblema na decomposição (padrão: {EQUIPES_POR_SUBPROBLEMA}).")
+    parser.add_argument('--vizinhos', type=int, metavar='K', help="Liga cada serviço só aos K vizinhos mais próximos e ao polo (memória O(N·K) em vez de NxN), para grupos muito grandes. Só com distâncias haversine ou faixas_k.")
+    parser.add_argument('--sem-poda', action='store_true', help="Leva todos os serviços ao otimizador, sem descartar antes os que não cabem na jornada ou excedem as vagas das equipes.")
+    parser.add_argument('--inicio-jornada', default=INICIO_JORNADA, metavar='HH:MM', help=f"Horário de saída das equipes, referência dos prazos do ANS e das janelas dos clientes (padrão: {INICIO_JORNADA}).")
+    parser.add_argument('--dias', type=int, default=1, help=f"Planeja a carteira nos próximos N dias de trabalho (até {MAX_DIAS_PLANEJAMENTO}): o que não couber em um dia passa para o seguinte e os cortes esperam os dias permitidos (padrão: 1).")
+    parser.add_argument('--mapa', choices=MODOS_MAPA, default=MODO_MAPA, help=f"Montagem do mapa_rotas.html: camadas GeoJSON por polo (rapido) ou um marcador por serviço (marcadores) (padrão: {MODO_MAPA}).")
+    parser.add_argument('--simplificar-mapa', type=float, default=SIMPLIFICAR_ROTAS_MAPA_M, metavar='METROS', help="Simplifica as linhas das rotas no mapa rápido até esta tolerância em metros (padrão: sem simplificar).")
+    parser.add_argument('--csv-por-grupo', action='store_true', default=GRAVAR_CSV_POR_GRUPO, help=f"Grava {ARQUIVO_ROTAS} e {ARQUIVO_NAO_ROTEIRIZADOS} à medida que cada grupo é resolvido, em vez de tudo no fim (planejamento de um dia).")
+    parser.add_argument('--data-despacho', type=date.fromisoformat, help="Data de despacho AAAA-MM-DD (padrão: próximo dia de despacho).")
+    parser.add_argument('--servicos', default="servicos.csv", help="Arquivo de serviços do dia (padrão: servicos.csv).")
+    parser.add_argument('--plano-anterior', metavar='ROTAS_CSV', help="Reotimiza a partir de um rotas_otimizadas.csv já gerado (novos pedidos, equipes canceladas).")
+    parser.add_argument('--leitor', choices=['pyarrow', 'c'], default=LEITOR_SERVICOS_PADRAO, help=f"Leitor do arquivo de serviços (padrão: {LEITOR_SERVICOS_PADRAO}).")
+    return parser
+
+def ler_opcoes_linha_comando(args, polos_disponiveis):
+    """Opções da roteirização a partir dos argumentos. Retorna None se algum polo não existir."""
+    if [polo.upper() for polo in args.polos] == ['TODOS']: polos = polos_disponiveis
+    else:
+        polos = [polo.strip().upper() for polo in args.polos]
+        desconhecidos = [polo for polo in polos if polo not in polos_disponiveis]
+        if desconhecidos:
+            print(f"ERRO: Polo(s) sem serviços no arquivo: {', '.join(desconhecidos)}. Disponíveis: {', '.join(polos_disponiveis)}."); return None
+    return {'polos': polos, 'tipo_servico': args.tipo_servico.upper(), 'estrategia': ESTRATEGIAS[args.estrategia], 'restricao': RESTRICOES[args.restricao],
+            'google': CONSULTAS_GOOGLE[args.google], 'num_processos': max(1, args.processos),
+            'provedor_distancia': {**PROVEDOR_DISTANCIA, 'tipo': args.distancias, 'url': args.url_osrm}, 'plano_anterior': args.plano_anterior,
+            'decomposicao': None if args.decomposicao == 'inteiro' else args.decomposicao, 'equipes_por_subproblema': max(1, args.equipes_por_subproblema),
+            'podar_candidatos': not args.sem_poda, 'vizinhos_por_servico': args.vizinhos if args.vizinhos and args.vizinhos > 0 else None,
+            'inicio_jornada': args.inicio_jornada, 'dias': max(1, args.dias),
+            'mapa': args.mapa, 'simplificar_mapa_m': max(0.0, args.simplificar_mapa), 'csv_por_grupo': args.csv_por_grupo}
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
 
+def gravar_registro_do_grupo(registro, gravador_rotas, gravador_nao_atendidos):
+    """Acrescenta aos CSVs as rotas (sem o retorno ao depósito) e os não roteirizados de um grupo recém-resolvido."""
+    if registro['linhas_rotas']:
+        rotas = pd.DataFrame(registro['linhas_rotas'])
+        gravador_rotas.acrescentar(rotas[rotas['ID_Servico'] != ID_RETORNO_DEPOSITO])
+    gravador_nao_atendidos.acrescentar(registro['nao_atendidos'])
+
+def salvar_resultados(todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df, df_polos_completo, df_servicos, polos_para_processar, modo_mapa=MODO_MAPA, simplificar_mapa_m=SIMPLIFICAR_ROTAS_MAPA_M, csv_ja_gravados=False):
+    """Grava as saídas e o mapa. Com 'csv_ja_gravados', as rotas e os não roteirizados já foram gravados grupo a grupo."""
     if not todas_as_rotas_df.empty:
-        print("\nSalvando o resultado em 'rotas_otimizadas.csv'...")
-        rotas_sem_retorno = todas_as_rotas_df[todas_as_rotas_df['ID_Servico'] != 'RETORNO_AO_DEPOSITO'].copy()
-        
-        colunas_saida = [
-            'Polo', 'Equipe', 'Tipo_Equipe', 'Ordem_Visita', 'ID_Servico', 'Valor_Divida',
-            'Tempo_Execucao_Min', 'KM_Trecho_Estimado', 'Tempo_Trecho_Estimado_Min',
-            'KM_Trecho_Google', 'Tempo_Trecho_Google_Min', 'Link_Google_Maps'
-        ]
-        rotas_sem_retorno.to_csv("rotas_otimizadas.csv", columns=colunas_saida, index=False, sep=';', encoding='utf-8-sig')
+        rotas_sem_retorno = todas_as_rotas_df[todas_as_rotas_df['ID_Servico'] != ID_RETORNO_DEPOSITO].copy()
+        por_dia = ['Data_Despacho'] if 'Data_Despacho' in todas_as_rotas_df.columns else []  # Planejamento de vários dias
+        if not csv_ja_gravados:
+            print(f"\nSalvando o resultado em '{ARQUIVO_ROTAS}'...")
+            rotas_sem_retorno.to_csv(ARQUIVO_ROTAS, columns=por_dia + COLUNAS_ROTAS_CSV, index=False, sep=';', encoding='utf-8-sig')
 
         print("Criando o resumo por equipes em 'resumo_equipes.csv'...")
-        
-        df_resumo = todas_as_rotas_df.groupby('Equipe').agg(
-            Quantidade_servicos_alocados=('ID_Servico', lambda x: (x != 'RETORNO_AO_DEPOSITO').sum()),
-            KM_percorridos=('KM_Trecho_Estimado', 'sum'),
-            Tempo_total_deslocamento=('Tempo_Trecho_Estimado_Min', 'sum'),
-            Tempo_total_servicos=('Tempo_Execucao_Min', 'sum')
-        ).reset_index()
-
-        df_resumo['Tempo_total_rota'] = df_resumo['Tempo_total_deslocamento'] + df_resumo['Tempo_total_servicos']
-        df_resumo = df_resumo.round(2)
-        
-        colunas_resumo = [
+        colunas_resumo = por_dia + [
             'Equipe', 'Quantidade_servicos_alocados', 'KM_percorridos',
             'Tempo_total_deslocamento', 'Tempo_total_servicos', 'Tempo_total_rota'
         ]
-        df_resumo.to_csv("resumo_equipes.csv", columns=colunas_resumo, index=False, sep=';', encoding='utf-8-sig')
+        resumo_equipes_df.round(2).to_csv("resumo_equipes.csv", columns=colunas_resumo, index=False, sep=';', encoding='utf-8-sig')
 
-        gerar_mapa_de_rotas(rotas_sem_retorno, df_polos_completo, df_servicos, polos_para_processar)
+        if por_dia:
+            print(f"O mapa mostra as rotas do primeiro dia ({rotas_sem_retorno['Data_Despacho'].min()}).")
+            rotas_sem_retorno = rotas_sem_retorno[rotas_sem_retorno['Data_Despacho'] == rotas_sem_retorno['Data_Despacho'].min()]
+        salvar_mapa_de_rotas(rotas_sem_retorno, df_polos_completo, df_servicos, polos_para_processar, modo_mapa, simplificar_mapa_m)
     else:
         print("\nNenhuma rota foi gerada.")
 
-    if not servicos_nao_atendidos_df.empty:
-        print("Salvando a lista de serviços não roteirizados em 'servicos_nao_roteirizados.csv'...")
-        servicos_nao_atendidos_df.to_csv("servicos_nao_roteirizados.csv", index=False, sep=';', encoding='utf-8-sig')
-    if dados_relatorio:
+    if not servicos_nao_atendidos_df.empty and not csv_ja_gravados:
+        print(f"Salvando a lista de serviços não roteirizados em '{ARQUIVO_NAO_ROTEIRIZADOS}'...")
+        servicos_nao_atendidos_df.to_csv(ARQUIVO_NAO_ROTEIRIZADOS, index=False, sep=';', encoding='utf-8-sig')
+    if not resumo_dia_df.empty:
         print("Salvando o relatório gerencial em 'resumo_do_dia.csv'...")
-        df_relatorio = pd.DataFrame(dados_relatorio)
-        df_relatorio.to_csv("resumo_do_dia.csv", index=False, sep=';', encoding='utf-8-sig')
+        resumo_dia_df.to_csv("resumo_do_dia.csv", index=False, sep=';', encoding='utf-8-sig')
+
+def salvar_relatorio_execucao(instrumentacao):
+    """Grava o relatório de instrumentação (JSON completo e CSV por grupo) e mostra onde o tempo foi gasto."""
+    instrumentacao.concluir()
+    print(f"Salvando o relatório de instrumentação em '{ARQUIVO_RELATORIO_JSON}' e '{ARQUIVO_RELATORIO_CSV}'...")
+    instrumentacao.salvar(ARQUIVO_RELATORIO_JSON, ARQUIVO_RELATORIO_CSV)
+    for linha in instrumentacao.tabela_etapas().itertuples(index=False):
+        print(f"  - {linha.Etapa:<22} ({linha.Escopo}): {linha.parede_s:8.2f}s de parede, {linha.cpu_s:8.2f}s de CPU")
+
+def main(argv=None):
+    """
+    Roteirizador VRP v14.4 - API Google como pós-processamento para enriquecimento de dados.
+    Sem argumentos abre os menus interativos; com argumentos (ou --lote) roda sem interação.
+    Retorna o código de saída (0 em caso de sucesso).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = criar_parser().parse_args(argv) if argv else None
+
+    instrumentacao = Instrumentacao()
+    print("Carregando todos os dados...")
+    try:
+        with instrumentacao.etapa('leitura_dados'):
+            df_polos, df_equipes, df_feriados, df_tempos, df_fator_k = carregar_dados_config()
+            df_servicos_raw = carregar_dados_servicos(args.servicos if args else "servicos.csv", args.leitor if args else LEITOR_SERVICOS_PADRAO, registrar=lambda mensagem: print(f"  - {mensagem}"))
+    except Exception as e:
+        print(f"ERRO CRÍTICO ao ler os arquivos. Verifique os nomes/separadores dos arquivos e a ORDEM das colunas. Detalhe: {e}")
+        return 1
+
+    print("Preparando e padronizando os dados...")
+    try:
+        with instrumentacao.etapa('preparacao_dados'):
+            df_servicos, df_polos_completo, df_feriados, JORNADA_TRABALHO_MIN, SERVICOS_EXTRAS_IMPRODUTIVIDADE = preparar_dados(
+                df_polos, df_equipes, df_servicos_raw, df_feriados, df_tempos, df_fator_k, avisar=lambda aviso: print(f"\n{aviso}"))
+    except KeyError as e:
+        print(f"\nERRO DE COLUNA: Uma coluna esperada não foi encontrada. Verifique se o nome da coluna '{e}' está correto nos seus arquivos CSV.")
+        return 1
+    except Exception as e:
+        print(f"ERRO ao preparar ou padronizar os dados: {e}")
+        return 1
+
+    hoje = date.today()
+    data_despacho = args.data_despacho if args and args.data_despacho else calcular_data_despacho(hoje)
+    dias_pt = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
+    print("\n--- AGENDAMENTO DE ROTEIRIZAÇÃO ---")
+    print(f"  - Data de Hoje....: {hoje.strftime('%d/%m/%Y')} ({dias_pt[hoje.weekday()]})")
+    print(f"  - Despacho para...: {data_despacho.strftime('%d/%m/%Y')} ({dias_pt[data_despacho.weekday()]})")
+
+    polos_disponiveis = sorted(df_servicos['Polo'].unique())
+    opcoes = ler_opcoes_linha_comando(args, polos_disponiveis) if args else escolher_opcoes_menu(polos_disponiveis)
+    if opcoes is None: return 1
+
+    plano_anterior = None
+    if opcoes.get('plano_anterior'):
+        try:
+            plano_anterior = carregar_plano_anterior(opcoes['plano_anterior'])
+        except Exception as e:
+            print(f"ERRO ao ler o plano anterior '{opcoes['plano_anterior']}': {e}")
+            return 1
+        print(f"\nReotimizando a partir de '{opcoes['plano_anterior']}' ({len(plano_anterior)} grupo(s) com rotas).")
+
+    try:
+        if opcoes['dias'] > 1:  # Cortes retidos nos dias restritos pelo próprio planejamento
+            df_servicos_filtrado = servicos_dos_polos(df_servicos, opcoes['polos'], opcoes['tipo_servico'])
+        else:
+            df_servicos_filtrado = filtrar_servicos(df_servicos, opcoes['polos'], opcoes['tipo_servico'], data_despacho, df_feriados)
+    except ValueError as e:
+        print(f"\nERRO: {e}")
+        print("Apenas 'Recortes' são permitidos. O programa será encerrado.")
+        return 1
+    if df_servicos_filtrado.empty: print("Nenhum serviço encontrado para o filtro."); return 1
+
+    consultar_google_api = opcoes['google']
+    cache_directions = CacheDirections(modo_offline=consultar_google_api == '3') if consultar_google_api in ['1', '3'] else None
+    if cache_directions is not None and not cache_directions.modo_offline:
+        print(f"\nAs rotas serão enriquecidas pela API do Google (até {MAX_CONSULTAS_SIMULTANEAS} consultas simultâneas).")
+
+    parametros = {
+        'estrategia': opcoes['estrategia'], 'restricao': opcoes['restricao'],
+        'JORNADA_TRABALHO_MIN': JORNADA_TRABALHO_MIN, 'SERVICOS_EXTRAS_IMPRODUTIVIDADE': SERVICOS_EXTRAS_IMPRODUTIVIDADE,
+        'MINUTOS_POR_KM': MINUTOS_POR_KM, 'FATOR_CUSTO_DISTANCIA': FATOR_CUSTO_DISTANCIA,
+        'num_processos': opcoes['num_processos'], 'provedor_distancia': opcoes['provedor_distancia'],
+        'decomposicao': opcoes['decomposicao'], 'equipes_por_subproblema': opcoes['equipes_por_subproblema'],
+        'podar_candidatos': opcoes['podar_candidatos'], 'vizinhos_por_servico': opcoes['vizinhos_por_servico'],
+        'data_despacho': data_despacho, 'INICIO_JORNADA': opcoes['inicio_jornada']
+    }
+    chave_api = CHAVE_API_GOOGLE if CHAVE_API_GOOGLE != "COLE_SUA_CHAVE_DE_API_AQUI" else ""
+    with instrumentacao.etapa('roteirizacao'):
+        if opcoes['dias'] > 1:
+            todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df = planejar_dias(
+                df_servicos_filtrado, df_polos_completo, parametros, data_despacho, opcoes['dias'], df_feriados, registrar=print, chave_api=chave_api, cache_directions=cache_directions,
+                instrumentacao=instrumentacao)
+        elif opcoes['csv_por_grupo']:
+            with GravadorCSV(ARQUIVO_ROTAS, COLUNAS_ROTAS_CSV) as gravador_rotas, GravadorCSV(ARQUIVO_NAO_ROTEIRIZADOS) as gravador_nao_atendidos:
+                todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df = executar_roteirizacao(
+                    df_servicos_filtrado, df_polos_completo, parametros, chave_api=chave_api, cache_directions=cache_directions, plano_anterior=plano_anterior, registrar=print,
+                    ao_concluir_grupo=lambda registro: gravar_registro_do_grupo(registro, gravador_rotas, gravador_nao_atendidos), instrumentacao=instrumentacao)
+            print(f"\nGravados grupo a grupo: {gravador_rotas.linhas} linha(s) em '{ARQUIVO_ROTAS}' e {gravador_nao_atendidos.linhas} em '{ARQUIVO_NAO_ROTEIRIZADOS}'.")
+        else:
+            todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df = executar_roteirizacao(
+                df_servicos_filtrado, df_polos_completo, parametros, chave_api=chave_api, cache_directions=cache_directions, plano_anterior=plano_anterior, registrar=print,
+                instrumentacao=instrumentacao)
+
+    if cache_directions is not None:
+        estatisticas_cache = cache_directions.estatisticas()
+        print(f"\nCache Google Directions: {estatisticas_cache['acertos']} acertos, {estatisticas_cache['falhas']} falhas ({estatisticas_cache['taxa_acerto_%']}% de acerto), {estatisticas_cache['entradas']} rotas armazenadas.")
+        cache_directions.fechar()
+
+    with instrumentacao.etapa('gravacao_saidas'):
+        salvar_resultados(todas_as_rotas_df, servicos_nao_atendidos_df, resumo_equipes_df, resumo_dia_df, df_polos_completo, df_servicos, opcoes['polos'], opcoes['mapa'], opcoes['simplificar_mapa_m'], csv_ja_gravados=opcoes['csv_por_grupo'] and opcoes['dias'] == 1)
+    salvar_relatorio_execucao(instrumentacao)
+
+    if os.path.exists(ARQUIVO_HISTORICO_ROTAS) or os.path.exists(ARQUIVO_HISTORICO_TRECHOS) or os.path.isdir(DIRETORIO_HISTORICO):
+        atualizar_analises_fator_k(df_polos_completo)
 
     print("\nProcesso concluído!")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    sys.exit(main())
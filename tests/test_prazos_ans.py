@@ -0,0 +1,109 @@
+"""
+Testes das funções puras de prazos_ans.py: janelas da dimensão Time, fatores de urgência, horários das rotas
+(com os mesmos arredondamentos das matrizes inteiras do modelo) e contagem dentro do ANS.
+
+Uso: python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from prazos_ans import (FATOR_URGENCIA_MAXIMO, MINUTOS_POR_DIA, HORIZONTE_URGENCIA_DIAS, data_hora, inicio_da_jornada, minutos_no_dia,
+                        fatores_urgencia, janelas_de_atendimento, horarios_da_rota, dentro_do_ans)
+
+HORIZONTE_MIN = 480
+NAN = np.nan
+
+
+def dados_grupo(prazos_min, tempos_execucao, janelas_inicio_min=None, janelas_fim_min=None):
+    """Só os campos de dados_grupo que janelas_de_atendimento usa (um serviço por posição, sem o depósito)."""
+    quantidade = len(prazos_min)
+    sem_janela = [NAN] * quantidade
+    return {'prazos_min': np.array(prazos_min, dtype=np.float64), 'tempos_execucao': np.array(tempos_execucao, dtype=np.float64),
+            'janelas_inicio_min': np.array(janelas_inicio_min or sem_janela, dtype=np.float64),
+            'janelas_fim_min': np.array(janelas_fim_min or sem_janela, dtype=np.float64)}
+
+
+def test_sem_prazo_nem_janela_ocupa_o_horizonte():
+    abertura, fechamento = janelas_de_atendimento(dados_grupo([NAN], [30]), HORIZONTE_MIN)
+    assert abertura.tolist() == [0] and fechamento.tolist() == [HORIZONTE_MIN]
+
+
+def test_ans_do_dia_fecha_no_ultimo_inicio_que_termina_no_prazo():
+    abertura, fechamento = janelas_de_atendimento(dados_grupo([200.9], [30]), HORIZONTE_MIN)
+    assert fechamento.tolist() == [170]  # 200,9 - 30 truncado para o minuto inteiro
+    assert abertura.dtype == fechamento.dtype == np.int64
+
+
+def test_ans_vencido_nao_limita_a_chegada_e_tem_urgencia_maxima():
+    _, fechamento = janelas_de_atendimento(dados_grupo([-90], [30]), HORIZONTE_MIN)
+    assert fechamento.tolist() == [HORIZONTE_MIN]
+    assert fatores_urgencia([-90]).tolist() == [FATOR_URGENCIA_MAXIMO]
+    assert not dentro_do_ans([0], [30], [-90])[0]
+
+
+def test_ans_que_nao_cabe_mais_na_execucao_nao_limita_a_chegada():
+    # Prazo daqui a 20 minutos para um serviço de 30: nenhuma chegada cumpre, o serviço não fica inviável
+    _, fechamento = janelas_de_atendimento(dados_grupo([20], [30]), HORIZONTE_MIN)
+    assert fechamento.tolist() == [HORIZONTE_MIN]
+    assert not dentro_do_ans([0], [30], [20])[0]
+
+
+def test_ans_alem_do_horizonte_fica_no_horizonte():
+    _, fechamento = janelas_de_atendimento(dados_grupo([3 * MINUTOS_POR_DIA], [30]), HORIZONTE_MIN)
+    assert fechamento.tolist() == [HORIZONTE_MIN]
+
+
+def test_janela_do_cliente_abre_depois_do_inicio_da_jornada():
+    abertura, fechamento = janelas_de_atendimento(dados_grupo([NAN, NAN], [30, 30], [90.2, -60], [240.7, 120]), HORIZONTE_MIN)
+    assert abertura.tolist() == [91, 0]  # Abertura arredondada para cima; janela aberta antes da jornada começa em 0
+    assert fechamento.tolist() == [240, 120]
+
+
+def test_janela_e_ans_fecham_no_menor_dos_dois():
+    _, fechamento = janelas_de_atendimento(dados_grupo([150, 400], [30, 30], None, [200, 200]), HORIZONTE_MIN)
+    assert fechamento.tolist() == [120, 200]
+
+
+def test_fatores_de_urgencia():
+    horizonte = MINUTOS_POR_DIA * HORIZONTE_URGENCIA_DIAS
+    fatores = fatores_urgencia([0, horizonte / 2, horizonte, 2 * horizonte, NAN])
+    assert np.allclose(fatores, [FATOR_URGENCIA_MAXIMO, (FATOR_URGENCIA_MAXIMO + 1) / 2, 1, 1, 1])
+
+
+def test_data_hora_iso_e_dia_primeiro_com_dia_ate_12():
+    datas = data_hora(pd.Series(['2026-11-03 18:00:00', '03/11/2026 18:00', ' 2026-02-01 08:30:00 ', '01/02/2026', '31/12/2026 08:00', None, 'invalido']))
+    assert datas.iloc[:5].tolist() == [pd.Timestamp('2026-11-03 18:00'), pd.Timestamp('2026-11-03 18:00'), pd.Timestamp('2026-02-01 08:30'),
+                                       pd.Timestamp('2026-02-01'), pd.Timestamp('2026-12-31 08:00')]
+    assert datas.iloc[5:].isna().all()
+
+
+def test_minutos_no_dia_le_horarios_hh_mm_e_hh_mm_ss():
+    df = pd.DataFrame({'Prazo_ANS': pd.to_datetime(['2026-10-20 18:00', '2026-10-19 08:00', None]),
+                       'Janela_Inicio': ['09:30', ' 10:15:30 ', None], 'Janela_Fim': ['12:00', 'invalido', '17:00']})
+    df = minutos_no_dia(df, inicio_da_jornada(pd.Timestamp('2026-10-20').date(), '08:00'))
+    assert df['Prazo_ANS_Min'].iloc[:2].tolist() == [600, -MINUTOS_POR_DIA] and np.isnan(df['Prazo_ANS_Min'].iloc[2])
+    assert df['Janela_Inicio_Min'].iloc[:2].tolist() == [90, 135.5] and np.isnan(df['Janela_Inicio_Min'].iloc[2])
+    assert df['Janela_Fim_Min'].iloc[[0, 2]].tolist() == [240, 540] and np.isnan(df['Janela_Fim_Min'].iloc[1])
+
+
+def test_minutos_no_dia_sem_as_colunas():
+    df = minutos_no_dia(pd.DataFrame({'TDC': ['1']}), inicio_da_jornada(pd.Timestamp('2026-10-20').date()))
+    assert df[['Prazo_ANS_Min', 'Janela_Inicio_Min', 'Janela_Fim_Min']].isna().all().all()
+
+
+def test_horarios_da_rota_encadeados_e_truncados_como_no_modelo():
+    # Depósito -> 1 km -> serviço A (10,5 min) -> 2 km -> serviço B (20 min) -> 0,5 km -> depósito, a 3 min/km
+    chegadas = horarios_da_rota([1000, 2000, 500], [10.5, 20], [NAN, NAN], 3)
+    assert chegadas == [3, 3 + int(6 + 10.5), 19 + int(1.5 + 20)]
+    assert dentro_do_ans(chegadas[:-1], [10.5, 20], [13.5, 38.9]).tolist() == [True, False]
+
+
+def test_horarios_da_rota_esperam_a_abertura_da_janela():
+    chegadas = horarios_da_rota([1000, 2000, 500], [10.5, 20], [NAN, 29.2], 3)
+    assert chegadas == [3, 30, 30 + 21]  # Chegaria em 19: espera a abertura (arredondada para cima) de B
+    assert dentro_do_ans(chegadas[:-1], [10.5, 20], [NAN, 50]).tolist() == [True, True]
+    assert dentro_do_ans(chegadas[:-1], [10.5, 20], [NAN, 49.9]).tolist() == [True, False]